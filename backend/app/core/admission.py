@@ -0,0 +1,187 @@
+import asyncio
+import math
+import re
+import time
+from collections import deque
+from starlette.responses import JSONResponse
+from app.core.config import settings
+from app.core.log_config import main_logger as logger
+
+# Admission control. Requests are sorted into route classes, each with its own concurrency limit, so
+# slow uploads and chats cannot hold up cheap reads; health checks are never limited. A request over
+# the limit waits in its class's queue for at most ADMISSION_QUEUE_SECONDS, and is rejected at once
+# with 503 and Retry-After when the expected wait is longer. Limits adapt to the observed latency
+# (AIMD): each request finishing within the class's target latency raises the limit a little, a slower
+# one cuts it in proportion to the overshoot, so the service keeps answering the requests it admits
+# instead of timing out all of them. Like TCP, limits start low and grow by one per fast request until
+# the first slow one (slow start), so a cold worker does not admit a backlog it cannot serve.
+
+# Limit of a class before its first request
+INITIAL_LIMIT = 4
+
+# Share of the limit kept after a request slower than the target: target / latency, within these bounds
+MAX_BACKOFF = 0.9
+MIN_BACKOFF = 0.5
+# Weight of the newest latency in the moving average used to estimate waits
+LATENCY_WEIGHT = 0.2
+# Queued requests per slot of the limit, beyond which requests are rejected without waiting
+MAX_QUEUE_PER_SLOT = 4
+
+_HEALTH = re.compile(r"^/(health|ready)$")
+_ROUTE_CLASSES = [
+    ("upload", "POST", re.compile(r"^/v1/pdf$")),
+    ("chat", "POST", re.compile(r"^/v1/chat/")),
+]
+
+
+def route_class(method: str, path: str):
+    # None for routes that are never limited
+    if _HEALTH.match(path):
+        return None
+    for name, route_method, pattern in _ROUTE_CLASSES:
+        if method == route_method and pattern.match(path):
+            return name
+    return "read"
+
+
+class AdaptiveLimit:
+    """Concurrency limit of one route class, adjusted by additive increase, multiplicative decrease."""
+
+    def __init__(self, name: str, max_limit: int, target_seconds: float, min_limit: int = 1, clock=time.monotonic):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.target_seconds = target_seconds
+        self.clock = clock
+        self.limit = float(min(INITIAL_LIMIT, self.max_limit))
+        self.slow_start = True
+        self.in_flight = 0
+        self.latency = None
+        self.admitted = 0
+        self.shed = 0
+        self._last_decrease = None
+        self._waiters = deque()
+
+    def current(self) -> int:
+        return int(self.limit)
+
+    def expected_wait(self) -> float:
+        # Time before a request queued now would start, from the queue length and the average latency;
+        # until a request has finished there is no estimate, and requests wait up to the queue time
+        if self.latency is None:
+            return 0.0
+        return (len(self._waiters) + 1) * self.latency / self.current()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.expected_wait()))
+
+    async def acquire(self, max_wait: float) -> bool:
+        if not self._waiters and self.in_flight < self.current():
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= MAX_QUEUE_PER_SLOT * self.current() or self.expected_wait() > max_wait:
+            self.shed += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, max_wait)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self.admitted += 1
+        return True
+
+    def _abandon(self, waiter):
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just before the wait ended: pass it on
+            self.in_flight -= 1
+            self._wake()
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, latency: float):
+        self.in_flight -= 1
+        self.observe(latency)
+        self._wake()
+
+    def observe(self, latency: float):
+        self.latency = latency if self.latency is None else self.latency + LATENCY_WEIGHT * (latency - self.latency)
+        if latency <= self.target_seconds:
+            self.limit = min(self.max_limit, self.limit + (1 if self.slow_start else 1 / self.limit))
+            return
+        self.slow_start = False
+        # Requests in flight together are slow together: cut once per target period, not once per request
+        now = self.clock()
+        if self._last_decrease is None or now - self._last_decrease >= self.target_seconds:
+            backoff = min(MAX_BACKOFF, max(MIN_BACKOFF, self.target_seconds / latency))
+            self.limit = max(self.min_limit, self.limit * backoff)
+            self._last_decrease = now
+
+    def _wake(self):
+        # Slots go to the longest waiting requests first
+        while self._waiters and self.in_flight < self.current():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+def default_limits() -> dict:
+    return {
+        "read": AdaptiveLimit("read", settings.ADMISSION_READ_MAX_CONCURRENCY, settings.ADMISSION_READ_TARGET_SECONDS),
+        "upload": AdaptiveLimit("upload", settings.ADMISSION_UPLOAD_MAX_CONCURRENCY, settings.ADMISSION_UPLOAD_TARGET_SECONDS),
+        "chat": AdaptiveLimit("chat", settings.ADMISSION_CHAT_MAX_CONCURRENCY, settings.ADMISSION_CHAT_TARGET_SECONDS),
+    }
+
+
+admission_limits = default_limits()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the route class limits; rejected requests get 503 with Retry-After."""
+
+    def __init__(self, app, limits: dict = None, queue_seconds: float = None):
+        self.app = app
+        self.limits = admission_limits if limits is None else limits
+        self.queue_seconds = settings.ADMISSION_QUEUE_SECONDS if queue_seconds is None else queue_seconds
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(route_class(scope["method"], scope["path"])) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limit.acquire(self.queue_seconds):
+            retry_after = limit.retry_after()
+            logger.warning(f"Shed {scope['method']} {scope['path']}: {limit.name} requests at their limit of {limit.current()}")
+            response = JSONResponse(status_code=503, content={"detail": "Server is busy, please retry later"},
+                                    headers={"Retry-After": str(retry_after)})
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release(time.perf_counter() - started)
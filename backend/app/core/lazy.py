@@ -0,0 +1,63 @@
+import importlib
+import threading
+
+# One proxy per module name, so every importer shares the same object (and the same patches in tests)
+_lazy_modules = {}
+_lazy_lock = threading.RLock()
+
+
+class LazyModule:
+    """Proxy that imports the wrapped module on first attribute access."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _lazy_lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+class LazyAttribute:
+    """Callable proxy for a single attribute of a lazily imported module (e.g. a class)."""
+
+    def __init__(self, module: LazyModule, attr: str):
+        self._module = module
+        self._attr = attr
+
+    def _resolve(self):
+        return getattr(self._module, self._attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._resolve(), attr)
+
+    def __repr__(self):
+        return f"<LazyAttribute {self._module._name}.{self._attr}>"
+
+
+def lazy_import(name: str, attr: str = None):
+    """Return a lazy proxy for module `name`, or for `name.attr` when attr is given."""
+    with _lazy_lock:
+        module = _lazy_modules.get(name)
+        if module is None:
+            module = _lazy_modules[name] = LazyModule(name)
+    if attr is not None:
+        return LazyAttribute(module, attr)
+    return module
@@ -32,4 +32,9 @@ data_logger = setup_logger('data_utils', 'data_utils.log')
 main_logger = setup_logger('main', 'main.log')
 pdf_logger = setup_logger('pdf_utils', 'pdf_utils.log')
 gemini_logger = setup_logger('gemini_utils', 'gemini_utils.log')
-mongodb_logger = setup_logger('mongodb', 'mongodb.log')
\ No newline at end of file
+mongodb_logger = setup_logger('mongodb', 'mongodb.log')
+session_logger = setup_logger('sessions', 'sessions.log')
+summary_logger = setup_logger('summary_utils', 'summary_utils.log')
+storage_logger = setup_logger('storage', 'storage.log')
+ocr_logger = setup_logger('ocr_utils', 'ocr_utils.log')
+profiling_logger = setup_logger('profiling', 'profiling.log')
@@ -0,0 +1,159 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.log_config import profiling_logger as logger
+
+# pyinstrument is optional; without it requests are profiled with cProfile
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+# Per-request profiling. A request is profiled when it carries the admin token (X-Profile-Token header
+# or profile_token query parameter) or is picked by PROFILE_SAMPLE_RATE. The profile is stored under
+# PROFILE_DIR, named after the request ID, which is returned in the X-Profile-Id response header.
+# Only the event loop thread is profiled: work moved to the threadpool shows up as the wait for it.
+# cProfile records everything the loop runs while the request is in flight, so other requests handled
+# meanwhile are in its profile too; pyinstrument (async_mode="enabled") keeps to the request's own task.
+
+PROFILE_HEADER = b"x-profile-token"
+PROFILE_QUERY = "profile_token"
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+_EXTENSIONS = {"cprofile": ".prof", "pyinstrument": ".html"}
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.PROFILE_ADMIN_TOKEN) or settings.PROFILE_SAMPLE_RATE > 0
+
+
+def is_admin_token(token: str) -> bool:
+    return bool(settings.PROFILE_ADMIN_TOKEN) and hmac.compare_digest(token.encode(), settings.PROFILE_ADMIN_TOKEN.encode())
+
+
+def resolve_profiler(name: str) -> str:
+    if name not in _EXTENSIONS:
+        raise ValueError(f"Unknown profiler: {name}")
+    if name == "pyinstrument" and SamplingProfiler is None:
+        logger.warning("pyinstrument is not installed, falling back to cProfile")
+        return "cprofile"
+    return name
+
+
+def find_profile(profile_id: str):
+    # Path of the stored profile of a request, or None; the ID never reaches the filesystem unchecked
+    if not _REQUEST_ID.match(profile_id):
+        return None
+    for extension in _EXTENSIONS.values():
+        path = os.path.join(settings.PROFILE_DIR, profile_id + extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def get_profile_path(profile_id: str, token: str) -> str:
+    if not is_admin_token(token or ""):
+        logger.warning(f"Rejected download of profile {profile_id}: missing or wrong admin token")
+        raise HTTPException(status_code=403, detail="Profile downloads require the admin token")
+    path = find_profile(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return path
+
+
+def prune_profiles(directory: str, max_files: int):
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    if len(paths) <= max_files:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[:len(paths) - max_files]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling opted-in requests. It is only installed when profiling is enabled,
+    so requests pay nothing for it otherwise.
+    """
+
+    def __init__(self, app, sample_rate: float = None, profiler: str = None, directory: str = None,
+                 max_files: int = None, rng: random.Random = None):
+        self.app = app
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.profiler = resolve_profiler(profiler or settings.PROFILER)
+        self.directory = directory or settings.PROFILE_DIR
+        self.max_files = max_files or settings.PROFILE_MAX_FILES
+        self.rng = rng or random.Random()
+        # Profilers hook the whole thread, so one request is profiled at a time. This keeps profiles from
+        # nesting, it does not isolate them: with cProfile, requests running meanwhile are recorded too
+        self._active = threading.Lock()
+
+    def wants_profile(self, scope) -> bool:
+        headers = dict(scope.get("headers") or [])
+        token = headers.get(PROFILE_HEADER, b"").decode("latin-1")
+        if not token:
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            token = query.get(PROFILE_QUERY, [""])[0]
+        if token:
+            return is_admin_token(token)
+        return self.sample_rate > 0 and self.rng.random() < self.sample_rate
+
+    def request_id(self, scope) -> str:
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id", b"").decode("latin-1")
+        return incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.wants_profile(scope) or not self._active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = self.request_id(scope)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", request_id.encode())]
+            await send(message)
+
+        if self.profiler == "pyinstrument":
+            profiler = SamplingProfiler(async_mode="enabled")
+            start, stop = profiler.start, profiler.stop
+        else:
+            profiler = cProfile.Profile()
+            start, stop = profiler.enable, profiler.disable
+        started = time.perf_counter()
+        try:
+            start()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                stop()
+        finally:
+            self._active.release()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            path = await run_in_threadpool(self.save, profiler, request_id)
+            logger.info(f"Profiled {scope['method']} {scope['path']} ({elapsed_ms:.0f} ms) into {path}")
+        except Exception as e:
+            logger.error(f"Could not store the profile of request {request_id}: {str(e)}")
+
+    def save(self, profiler, request_id: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, request_id + _EXTENSIONS[self.profiler])
+        if self.profiler == "pyinstrument":
+            with open(path, "w") as output:
+                output.write(profiler.output_html())
+        else:
+            profiler.dump_stats(path)
+        prune_profiles(self.directory, self.max_files)
+        return path
@@ -0,0 +1,164 @@
+import time
+from typing import Optional
+from limits import parse_many
+from limits.storage import Storage, storage_from_string
+from slowapi.util import get_remote_address
+from app.core.config import settings
+from app.core.log_config import main_logger as logger
+
+# Rate limiting shared by all workers. Counters live in RATE_LIMIT_STORAGE_URI (MongoDB or Redis, any
+# storage of the limits package); with memory:// every worker counts on its own. Clients sending a
+# known X-API-Key are counted per key, with their limits scaled by the key's multiplier, others per IP.
+
+API_KEY_HEADER = "X-API-Key"
+LEASE_SCHEME = "leased+"
+# Leases of windows that ended are dropped at most this often, so keys that never return do not pile up
+LEASE_SWEEP_SECONDS = 60
+
+
+def parse_api_keys(value: str) -> dict:
+    # "key:name:multiplier,..." -> {key: (name, multiplier)}
+    keys = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        try:
+            key, name, multiplier = entry.rsplit(":", 2)
+            keys[key] = (name, float(multiplier))
+        except ValueError:
+            logger.error(f"Ignoring malformed RATE_LIMIT_API_KEYS entry for '{entry.split(':')[0][:4]}...'")
+    return keys
+
+
+API_KEYS = parse_api_keys(settings.RATE_LIMIT_API_KEYS)
+_MULTIPLIERS = {f"key:{name}": multiplier for name, multiplier in API_KEYS.values()}
+
+
+def rate_limit_key(request) -> str:
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key and api_key in API_KEYS:
+        return f"key:{API_KEYS[api_key][0]}"
+    return get_remote_address(request)
+
+
+def scale_limits(value: str, multiplier: float) -> str:
+    return ";".join(f"{max(1, int(item.amount * multiplier))}/{item.multiples} {item.GRANULARITY.name}"
+                    for item in parse_many(value))
+
+
+def route_limit(value: str):
+    """
+    Limit provider for @limiter.limit: the configured limit of a route for IP clients, scaled by the
+    multiplier of API key clients. slowapi passes the key returned by rate_limit_key.
+    """
+    def limit_for(key: str) -> str:
+        multiplier = _MULTIPLIERS.get(key)
+        return value if multiplier is None else scale_limits(value, multiplier)
+    return limit_for
+
+
+def storage_uri() -> str:
+    uri = settings.RATE_LIMIT_STORAGE_URI
+    if settings.RATE_LIMIT_LEASE_FRACTION > 0 and not uri.startswith("memory://"):
+        return LEASE_SCHEME + uri
+    return uri
+
+
+class _Lease:
+    __slots__ = ("next", "last", "expires_at")
+
+    def __init__(self, next: int, last: int, expires_at: float):
+        self.next = next
+        self.last = last
+        self.expires_at = expires_at
+
+
+class LeasedStorage(Storage):
+    """
+    Shared counters without a round trip per request. A worker reserves a block of hits of a limit
+    (RATE_LIMIT_LEASE_FRACTION of it) with a single increment of the shared counter, then answers
+    from the block locally. Hits are never over-admitted; a block reserved but not used by one worker
+    is unavailable to the others until the window ends. Once a limit is exhausted, the worker rejects
+    locally until the window ends.
+    """
+
+    STORAGE_SCHEME = [LEASE_SCHEME + scheme for scheme in ("memory", "mongodb", "mongodb+srv", "redis", "rediss", "redis+sentinel")]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, lease_fraction: float = None,
+                 backing: Optional[Storage] = None, clock=time.time, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.backing = backing or storage_from_string(uri[len(LEASE_SCHEME):], **options)
+        self.lease_fraction = settings.RATE_LIMIT_LEASE_FRACTION if lease_fraction is None else lease_fraction
+        self.clock = clock
+        self._leases = {}
+        self._next_sweep = clock() + LEASE_SWEEP_SECONDS
+
+    @property
+    def base_exceptions(self):
+        return self.backing.base_exceptions
+
+    def limit_of(self, key: str) -> Optional[int]:
+        # Keys end with the limit: ".../<amount>/<multiples>/<granularity>"
+        try:
+            return int(key.rsplit("/", 3)[1])
+        except (IndexError, ValueError):
+            return None
+
+    def lease_size(self, key: str) -> int:
+        limit = self.limit_of(key)
+        return 1 if limit is None else max(1, int(limit * self.lease_fraction))
+
+    def incr(self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1) -> int:
+        with self.lock:
+            now = self.clock()
+            if now >= self._next_sweep:
+                self._sweep(now)
+            lease = self._leases.get(key)
+            if lease is not None and lease.expires_at > now:
+                limit = self.limit_of(key)
+                if limit is not None and lease.next > limit:
+                    # The limit is spent for this window, no need to ask the shared counter
+                    return lease.next
+                if lease.next + amount - 1 <= lease.last:
+                    lease.next += amount
+                    return lease.next - 1
+
+            size = max(amount, self.lease_size(key))
+            count = self.backing.incr(key, expiry, elastic_expiry, amount=size)
+            # The first lease of a window created the counter; the end of the window is otherwise known
+            # from this worker's previous lease, or read from the shared storage
+            if count == size:
+                expires_at = now + expiry
+            elif lease is not None and lease.expires_at > now and not elastic_expiry:
+                expires_at = lease.expires_at
+            else:
+                expires_at = self.backing.get_expiry(key)
+            first = count - size + 1
+            self._leases[key] = _Lease(first + amount, count, expires_at)
+            return first + amount - 1
+
+    def _sweep(self, now: float):
+        # Called with the lock held
+        for key in [key for key, lease in self._leases.items() if lease.expires_at <= now]:
+            del self._leases[key]
+        self._next_sweep = now + LEASE_SWEEP_SECONDS
+
+    def get(self, key: str) -> int:
+        return self.backing.get(key)
+
+    def get_expiry(self, key: str) -> int:
+        lease = self._leases.get(key)
+        if lease is not None and lease.expires_at > self.clock():
+            return int(lease.expires_at)
+        return self.backing.get_expiry(key)
+
+    def check(self) -> bool:
+        return self.backing.check()
+
+    def reset(self) -> Optional[int]:
+        with self.lock:
+            self._leases.clear()
+        return self.backing.reset()
+
+    def clear(self, key: str) -> None:
+        with self.lock:
+            self._leases.pop(key, None)
+        self.backing.clear(key)
@@ -0,0 +1,76 @@
+import threading
+import time
+from app.core.log_config import main_logger as logger
+
+
+# Delay before the first retry of failed components, doubled after every failed round
+RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 60.0
+
+
+# Deferred initialization of heavy components (SDKs, NLP models) after the server starts accepting requests
+class WarmupRegistry:
+    def __init__(self, retry_seconds: float = RETRY_SECONDS, max_retry_seconds: float = MAX_RETRY_SECONDS, sleep=time.sleep):
+        self._components = {}
+        self._status = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self._sleep = sleep
+
+    def register(self, name: str, initializer):
+        with self._lock:
+            self._components[name] = initializer
+            self._status.setdefault(name, {"state": "pending"})
+
+    def start(self):
+        # Warm every registered component in a background thread, retrying failed ones until all are ready
+        with self._lock:
+            if self._thread is not None:
+                return self._thread
+            self._thread = threading.Thread(target=self.run_until_ready, name="warmup", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def run_until_ready(self):
+        # A dependency that is down at startup (e.g. MongoDB) must not keep the worker unready for good
+        delay = self.retry_seconds
+        while not self.run():
+            logger.warning(f"Retrying failed warmup components in {delay:.0f}s")
+            self._sleep(delay)
+            delay = min(self.max_retry_seconds, delay * 2)
+
+    def run(self) -> bool:
+        # One attempt at every component that is not ready yet; True when all of them are
+        with self._lock:
+            pending = [(name, initializer) for name, initializer in self._components.items()
+                       if self._status[name]["state"] != "ready"]
+        for name, initializer in pending:
+            self._set_state(name, "warming")
+            started = time.perf_counter()
+            try:
+                initializer()
+            except Exception as e:
+                logger.error(f"Warmup of {name} failed: {e}")
+                self._set_state(name, "failed", error=str(e))
+                continue
+            elapsed = time.perf_counter() - started
+            logger.info(f"Warmed up {name} in {elapsed:.2f}s")
+            self._set_state(name, "ready", seconds=round(elapsed, 3))
+        return self.is_ready()
+
+    def _set_state(self, name: str, state: str, **details):
+        with self._lock:
+            self._status[name] = {"state": state, **details}
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(status["state"] == "ready" for status in self._status.values())
+
+    def status(self) -> dict:
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
+
+
+warmup = WarmupRegistry()
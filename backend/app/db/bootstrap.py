@@ -0,0 +1,128 @@
+import typing
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.core.config import settings
+from app.core.log_config import mongodb_logger as logger
+from app.db.mongodb import get_database
+from app.models.pdf import PDFMetadata
+
+CURRENT_SCHEMA_VERSION = 1
+
+# Indexes required by the service, per collection. Index names are explicit so that
+# create_indexes is a no-op when they already exist.
+INDEXES = {
+    "pdfs": [
+        IndexModel([("filename", ASCENDING)], name="filename"),
+        IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="status_created_at"),
+        # Retention: documents expire at their own expires_at, documents without one are kept
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "chat_sessions": [
+        IndexModel([("pdf_id", ASCENDING)], name="pdf_id"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=settings.SESSION_TTL_SECONDS),
+    ],
+    # OCR output is looked up by _id (the page hash); old entries expire
+    "ocr_cache": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=settings.OCR_CACHE_TTL_SECONDS),
+    ],
+}
+
+# Queries on the request path; every one must be served by an index (see tests/test_bootstrap.py)
+HOT_QUERIES = [
+    ("pdfs", {"filename": "example.pdf"}, None),
+    ("pdfs", {"content_hash": "0" * 64}, None),
+    ("pdfs", {"status": "ready"}, [("created_at", DESCENDING)]),
+    ("pdfs", {"filename": {"$in": ["example.pdf"]}}, None),
+    ("chat_sessions", {"pdf_id": "000000000000000000000000"}, None),
+]
+
+# Fields whose stored type differs from the model: compressed text is stored as binary
+_BSON_OVERRIDES = {
+    "extracted_text": ["string", "binData"],
+}
+
+_BSON_TYPES = {
+    str: "string",
+    int: ["int", "long"],
+    float: ["double", "int", "long"],
+    datetime: "date",
+}
+
+
+def pdf_json_schema() -> dict:
+    # MongoDB $jsonSchema validator derived from the PDFMetadata model
+    properties = {}
+    required = []
+    for name, field in PDFMetadata.model_fields.items():
+        annotation = field.annotation
+        optional = type(None) in typing.get_args(annotation)
+        if optional:
+            annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+        if typing.get_origin(annotation) is list:
+            bson_type = "array"
+        else:
+            bson_type = _BSON_OVERRIDES.get(name, _BSON_TYPES[annotation])
+        if optional:
+            bson_type = (bson_type if isinstance(bson_type, list) else [bson_type]) + ["null"]
+        properties[name] = {"bsonType": bson_type}
+        if field.is_required():
+            required.append(name)
+    return {"$jsonSchema": {"bsonType": "object", "required": required, "properties": properties}}
+
+
+def _backfill_pdf_fields(db):
+    # Records written before schema version 1 get a status, a creation date (from the ObjectId) and a version
+    db.pdfs.update_many(
+        {"schema_version": {"$exists": False}},
+        [{"$set": {"status": "ready", "created_at": {"$toDate": "$_id"}, "schema_version": 1}}],
+    )
+
+
+def _apply_pdf_validator(db):
+    # validationLevel "moderate" leaves existing invalid documents alone until they are updated
+    if "pdfs" not in db.list_collection_names():
+        db.create_collection("pdfs")
+    db.command({"collMod": "pdfs", "validator": pdf_json_schema(), "validationLevel": "moderate"})
+
+
+# Versioned migrations, applied in order. Each one must be idempotent: workers starting
+# at the same time may run the same migration concurrently.
+MIGRATIONS = [
+    (1, "Backfill status, created_at and schema_version on pdfs", _backfill_pdf_fields),
+    (2, "Validate pdfs documents against PDFMetadata", _apply_pdf_validator),
+    (3, "Allow compressed extracted_text in the pdfs validator", _apply_pdf_validator),
+    (4, "Add extraction_mode and layout chunks to the pdfs validator", _apply_pdf_validator),
+    (5, "Add the record version to the pdfs validator", _apply_pdf_validator),
+    (6, "Add the detected language to the pdfs validator", _apply_pdf_validator),
+]
+
+
+def ensure_indexes(db):
+    for collection, indexes in INDEXES.items():
+        names = db[collection].create_indexes(indexes)
+        logger.info(f"Ensured indexes on {collection}: {names}")
+
+
+def run_migrations(db) -> list[int]:
+    applied = {migration["_id"] for migration in db.schema_migrations.find({}, {"_id": 1})}
+    ran = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info(f"Applying migration {version}: {description}")
+        migrate(db)
+        db.schema_migrations.update_one(
+            {"_id": version},
+            {"$setOnInsert": {"description": description, "applied_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        ran.append(version)
+    return ran
+
+
+def bootstrap_database(db=None):
+    db = db if db is not None else get_database()
+    ensure_indexes(db)
+    ran = run_migrations(db)
+    logger.info(f"Database bootstrap complete, applied migrations: {ran}")
@@ -1,13 +1,22 @@
+import threading
 from pymongo import MongoClient
 from app.core.config import settings
 from app.core.log_config import mongodb_logger as logger
 
+_client = None
+_client_lock = threading.Lock()
+
+# MongoClient keeps its own connection pool, so one client is shared by the whole process
 def get_mongodb_client():
-    MONGODB_URI = f"mongodb://{settings.MONGODB_USER}:{settings.MONGODB_PASSWORD}@{settings.MONGODB_HOST}:{settings.MONGODB_PORT}/{settings.MONGODB_DB}?authSource=admin"
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                MONGODB_URI = f"mongodb://{settings.MONGODB_USER}:{settings.MONGODB_PASSWORD}@{settings.MONGODB_HOST}:{settings.MONGODB_PORT}/{settings.MONGODB_DB}?authSource=admin"
 
-    client = MongoClient(MONGODB_URI)
-    logger.info(f"Connected to MongoDB:")
-    return client
+                _client = MongoClient(MONGODB_URI)
+                logger.info(f"Connected to MongoDB:")
+    return _client
 
 def get_database():
     client = get_mongodb_client()
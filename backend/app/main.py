@@ -1,24 +1,56 @@
-from fastapi import FastAPI, Request, File, UploadFile, Body
+import os
+from fastapi import FastAPI, Request, File, UploadFile, Body, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from app.utils.pdf_utils import upload_pdf
+from app.utils.pdf_utils import upload_pdf, delete_pdf
 from app.utils.gemini_utils import chat_with_pdf
-from fastapi.responses import JSONResponse
+from app.utils.batch_utils import chat_batch
+from app.utils.session_utils import create_session
+from fastapi.responses import JSONResponse, FileResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.concurrency import run_in_threadpool
 from app.core.log_config import main_logger as logger
 from app.core.config import settings
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from fastapi import Path
+from typing import List, Optional
+from fastapi import Path, Query, Header
+from app.utils.data_utils import list_pdfs, get_pdf_metadata
+from app.utils.pdf_cache import pdf_cache
+from app.utils.nlp_pool import nlp_pool
+from app.utils.chunk_store import chunk_stores
+from contextlib import asynccontextmanager
+from app.core.warmup import warmup
+from app.db.bootstrap import bootstrap_database
+from app.utils.storage_gc import storage_collector
+from app.utils.ocr_utils import shutdown_ocr_pool
+from app.core.profiling import ProfilingMiddleware, profiling_enabled, get_profile_path
+from app.core.rate_limiting import rate_limit_key, route_limit, storage_uri
+from app.core.admission import AdmissionMiddleware, admission_limits
 
 # Load environment variables
 load_dotenv()
 
+# Application lifespan: start accepting requests immediately, warm heavy components in the background
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.MONGODB_BOOTSTRAP_ENABLED:
+        warmup.register("mongodb", bootstrap_database)
+    warmup.start()
+    if settings.STORAGE_GC_INTERVAL_SECONDS > 0:
+        storage_collector.start()
+    yield
+    storage_collector.stop()
+    shutdown_ocr_pool()
+
 # FastAPI application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+# Admission control, added before CORS so that 503 responses still carry the CORS headers
+if settings.ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
 
 # CORS configuration
 app.add_middleware(
@@ -29,8 +61,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Rate limiting
-limiter = Limiter(key_func=get_remote_address)
+# Per-request profiling, only installed when enabled so other deployments pay nothing for it
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
+# Rate limiting, per API key or client IP; counters are shared between workers through RATE_LIMIT_STORAGE_URI.
+# If the shared storage fails, each worker falls back to its own in-memory counters until it recovers.
+limiter = Limiter(key_func=rate_limit_key, storage_uri=storage_uri(), in_memory_fallback_enabled=True,
+                  enabled=settings.RATE_LIMIT_ENABLED)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler) # Add exception handler for rate limiting
 
@@ -47,11 +85,41 @@ app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler) # Add
                 }
             }
          })
-@limiter.limit("60/minute") # 60 requests per minute
+@limiter.limit(route_limit(settings.RATE_LIMIT_READ))
 async def health_check(request: Request):
     logger.info(f"Health check requested from {request.client.host}") # Log health check request
     return {"status": "healthy"}
 
+# Readiness endpoint: reports whether the heavy components have finished warming up
+@app.get("/ready",
+         response_model=dict,
+         responses={
+            200: {
+                "description": "All components are warmed up",
+                "content": {
+                    "application/json": {
+                        "example": {"status": "ready", "components": {"spacy": {"state": "ready", "seconds": 0.8}}}
+                    }
+                }
+            },
+            503: {
+                "description": "Components are still warming up",
+                "content": {
+                    "application/json": {
+                        "example": {"status": "warming_up", "components": {"spacy": {"state": "warming"}}}
+                    }
+                }
+            }
+         })
+@limiter.limit(route_limit(settings.RATE_LIMIT_READ))
+async def readiness_check(request: Request):
+    components = warmup.status()
+    if not warmup.is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming_up", "components": components})
+    return {"status": "ready", "components": components, "pdf_cache": pdf_cache.stats(), "nlp_pool": nlp_pool.stats(),
+            "chunk_stores": chunk_stores.stats(),
+            "admission": {name: limit.stats() for name, limit in admission_limits.items()}}
+
 # PDF upload endpoint
 @app.post("/v1/pdf", response_model=dict,
           responses={
@@ -80,14 +148,134 @@ async def health_check(request: Request):
                   }
               }
           })
-@limiter.limit("5/minute") # 5 requests per minute
-async def rate_limited_upload_pdf(request: Request, file: UploadFile = File(...)):
+@limiter.limit(route_limit(settings.RATE_LIMIT_UPLOAD))
+async def rate_limited_upload_pdf(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    extraction_mode: Optional[str] = Query(None, description="plain (default) or layout: keeps headings and tables as Markdown")
+):
     logger.info(f"PDF upload requested from {request.client.host}") # Log PDF upload request
-    return await upload_pdf(file)
+    return await upload_pdf(file, background_tasks, extraction_mode)
+
+# List PDFs endpoint
+@app.get("/v1/pdfs", response_model=dict,
+         responses={
+             200: {
+                 "description": "Successful response",
+                 "content": {
+                     "application/json": {
+                         "example": {
+                             "items": [{
+                                 "pdf_id": "66fb5a5ce4fbfd451be353d2",
+                                 "filename": "report.pdf",
+                                 "original_filename": "report.pdf",
+                                 "page_count": 12,
+                                 "size_kb": 245.3,
+                                 "status": "ready",
+                                 "created_at": "2024-10-01T10:15:00"
+                             }],
+                             "next_cursor": "66fb5a5ce4fbfd451be353d2"
+                         }
+                     }
+                 }
+             },
+             400: {
+                 "description": "Bad Request",
+                 "content": {
+                     "application/json": {
+                         "example": {"detail": "Invalid cursor: abc"}
+                     }
+                 }
+             }
+         })
+@limiter.limit(route_limit(settings.RATE_LIMIT_READ))
+async def rate_limited_list_pdfs(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100, description="Page size")
+):
+    """
+    List uploaded PDFs, oldest first, without their text. Pass `next_cursor` as `cursor` to get the next page.
+    """
+    logger.info(f"PDF list requested from {request.client.host}")
+    return list_pdfs(cursor, limit)
+
+# PDF metadata endpoint
+@app.get("/v1/pdf/{pdf_id}", response_model=dict,
+         responses={
+             200: {
+                 "description": "Successful response",
+                 "content": {
+                     "application/json": {
+                         "example": {
+                             "pdf_id": "66fb5a5ce4fbfd451be353d2",
+                             "filename": "report.pdf",
+                             "original_filename": "report.pdf",
+                             "page_count": 12,
+                             "size_kb": 245.3,
+                             "status": "ready",
+                             "created_at": "2024-10-01T10:15:00"
+                         }
+                     }
+                 }
+             },
+             404: {
+                 "description": "PDF not found",
+                 "content": {
+                     "application/json": {
+                         "example": {"detail": "PDF with ID 123456789 not found"}
+                     }
+                 }
+             }
+         })
+@limiter.limit(route_limit(settings.RATE_LIMIT_READ))
+async def rate_limited_get_pdf(
+    request: Request,
+    pdf_id: str = Path(..., description="The ID of the PDF")
+):
+    """
+    Get the metadata of a PDF, without its extracted text.
+    """
+    logger.info(f"PDF metadata for {pdf_id} requested from {request.client.host}")
+    return get_pdf_metadata(pdf_id)
+
+# Delete PDF endpoint
+@app.delete("/v1/pdf/{pdf_id}", response_model=dict,
+            responses={
+                200: {
+                    "description": "Successful response",
+                    "content": {
+                        "application/json": {
+                            "example": {"pdf_id": "66fb5a5ce4fbfd451be353d2", "deleted": True}
+                        }
+                    }
+                },
+                404: {
+                    "description": "PDF not found",
+                    "content": {
+                        "application/json": {
+                            "example": {"detail": "PDF with ID 123456789 not found"}
+                        }
+                    }
+                }
+            })
+@limiter.limit(route_limit(settings.RATE_LIMIT_DELETE))
+async def rate_limited_delete_pdf(
+    request: Request,
+    pdf_id: str = Path(..., description="The ID of the PDF to delete")
+):
+    """
+    Delete a PDF: its record, its file and its chat sessions.
+    """
+    logger.info(f"Deletion of PDF {pdf_id} requested from {request.client.host}")
+    # MongoDB and storage calls block, keep them off the event loop
+    return await run_in_threadpool(delete_pdf, pdf_id)
 
 # Define request model for chat
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
     
     class Config:
         json_schema_extra = {
@@ -96,6 +284,40 @@ class ChatRequest(BaseModel):
             }
         }
 
+# Start a chat session endpoint
+@app.post("/v1/chat/{pdf_id}/session",
+    response_model=dict,
+    responses={
+        200: {
+            "description": "Successful response",
+            "content": {
+                "application/json": {
+                    "example": {"session_id": "66fb5b0be4fbfd451be353d3"}
+                }
+            }
+        },
+        404: {
+            "description": "PDF not found",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "PDF with ID 123456789 not found"}
+                }
+            }
+        }
+    }
+)
+@limiter.limit(route_limit(settings.RATE_LIMIT_CHAT))
+async def rate_limited_create_session(
+    request: Request,
+    pdf_id: str = Path(..., description="The ID of the PDF to chat with")
+):
+    """
+    Start a conversation about a PDF. Pass the returned `session_id` in chat requests
+    to keep a compact rolling history between turns.
+    """
+    logger.info(f"Chat session for PDF {pdf_id} requested from {request.client.host}")
+    return {"session_id": create_session(pdf_id)}
+
 # Chat with PDF endpoint
 @app.post("/v1/chat/{pdf_id}", 
     response_model=dict,
@@ -132,7 +354,7 @@ class ChatRequest(BaseModel):
         }
     }
 )
-@limiter.limit("10/minute") # 10 requests per minute
+@limiter.limit(route_limit(settings.RATE_LIMIT_CHAT))
 async def rate_limited_chat_with_pdf(
     request: Request,
     pdf_id: str = Path(..., description="The ID of the PDF to chat with"),
@@ -143,11 +365,115 @@ async def rate_limited_chat_with_pdf(
     
     - **pdf_id**: The unique identifier of the uploaded PDF
     - **message**: The question or message to ask about the PDF content
+    - **session_id**: Optional session from `/v1/chat/{pdf_id}/session` to keep conversation history
     
     Returns the AI-generated response based on the PDF content.
     """
     logger.info(f"Chat with PDF {pdf_id} requested from {request.client.host}")
-    return await chat_with_pdf(pdf_id, chat_request.message)
+    return await chat_with_pdf(pdf_id, chat_request.message, chat_request.session_id)
+
+# Define request model for batch chat
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "questions": [
+                    "What is the main topic of this document?",
+                    "Who are the authors?"
+                ]
+            }
+        }
+
+# Batch chat with PDF endpoint
+@app.post("/v1/chat/{pdf_id}/batch",
+    response_model=dict,
+    responses={
+        200: {
+            "description": "Successful response",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "answers": [
+                            {"question": "What is the main topic of this document?", "answer": "The document is about document analysis."},
+                            {"question": "Who are the authors?", "error": {"status_code": 504, "detail": "The model did not answer in time"}}
+                        ],
+                        "groups": 2
+                    }
+                }
+            }
+        },
+        400: {
+            "description": "Invalid batch",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "A batch can hold at most 50 questions"}
+                }
+            }
+        },
+        404: {
+            "description": "PDF not found",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "PDF with ID 123456789 not found"}
+                }
+            }
+        }
+    }
+)
+@limiter.limit(route_limit(settings.RATE_LIMIT_BATCH))
+async def rate_limited_chat_batch(
+    request: Request,
+    pdf_id: str = Path(..., description="The ID of the PDF to ask about"),
+    batch_request: BatchChatRequest = Body(..., description="Questions to answer")
+):
+    """
+    Answer several independent questions about a PDF in one request.
+
+    The document is loaded once and questions drawing on the same parts of it are answered
+    by a single prompt. Answers are returned in the order of the questions; a question whose
+    group failed carries an `error` instead of an `answer`.
+    """
+    logger.info(f"Batch chat of {len(batch_request.questions)} questions with PDF {pdf_id} requested from {request.client.host}")
+    return await chat_batch(pdf_id, batch_request.questions)
+
+
+# Download a request profile endpoint
+@app.get("/v1/profiles/{profile_id}",
+    responses={
+        200: {"description": "The profile: pstats data (.prof) for cProfile, an HTML report for pyinstrument"},
+        403: {
+            "description": "Forbidden",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Profile downloads require the admin token"}
+                }
+            }
+        },
+        404: {
+            "description": "Profile not found",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Profile 3f2a9c1e not found"}
+                }
+            }
+        }
+    }
+)
+@limiter.limit("30/minute") # 30 requests per minute
+async def rate_limited_get_profile(
+    request: Request,
+    profile_id: str = Path(..., description="The request ID returned in the X-Profile-Id header"),
+    x_profile_token: Optional[str] = Header(None, description="The admin token (PROFILE_ADMIN_TOKEN)")
+):
+    """
+    Download the profile of a profiled request. Send the admin token in `X-Profile-Token`
+    (or `profile_token` in the query) with any request to profile it.
+    """
+    logger.info(f"Profile {profile_id} requested from {request.client.host}")
+    path = get_profile_path(profile_id, x_profile_token)
+    return FileResponse(path, filename=os.path.basename(path))
 
 
 # Exception handlers
@@ -157,7 +483,8 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     logger.error(f"HTTP {exc.status_code} error for {request.url}: {exc.detail}")
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": str(exc.detail)}
+        content={"detail": str(exc.detail)},
+        headers=getattr(exc, "headers", None)
     )
     
 # Validation exception handler
@@ -1,3 +1,5 @@
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel
 
 class PDFMetadata(BaseModel):
@@ -6,4 +8,15 @@ class PDFMetadata(BaseModel):
     file_path: str
     page_count: int
     size_kb: float
-    extracted_text: str
\ No newline at end of file
+    extracted_text: str
+    content_hash: Optional[str] = None
+    status: Optional[str] = None
+    created_at: Optional[datetime] = None
+    schema_version: Optional[int] = None
+    expires_at: Optional[datetime] = None
+    extraction_mode: Optional[str] = None
+    chunks: Optional[List[str]] = None
+    # Page each of the chunks starts on
+    chunk_pages: Optional[List[int]] = None
+    version: Optional[int] = None
+    language: Optional[str] = None
@@ -0,0 +1,172 @@
+import asyncio
+import re
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.core.log_config import gemini_logger as logger
+from app.utils.context_packing import pack_context, prompt_token_budget, SEGMENT_SEPARATOR
+from app.utils.gemini_utils import load_pdf, generate_text, chat_with_gemini, overview_answer
+from app.utils.resilience import Deadline
+from app.utils.chunk_store import ChunkStore, chunk_store_for
+from app.utils.retrieval import is_overview_question, RETRIEVAL_TOP_K
+from app.utils.text_processing import count_tokens
+
+BATCH_MAX_QUESTIONS = settings.BATCH_MAX_QUESTIONS
+BATCH_GROUP_MAX_QUESTIONS = settings.BATCH_GROUP_MAX_QUESTIONS
+BATCH_GROUP_OVERLAP = settings.BATCH_GROUP_OVERLAP
+BATCH_CONCURRENCY = settings.BATCH_CONCURRENCY
+
+# Prompt for a group of questions answered from the same retrieved context
+BATCH_PROMPT_TEMPLATE = """
+    PDF Content: {context}
+
+    Questions:
+    {questions}
+
+    Instructions:
+    1. Answer every question separately, using the PDF content provided above.
+    2. Start each answer on a new line with its label, for example "Answer 2:", keeping the numbers of the questions.
+    3. If the answer is directly stated in the PDF, quote the relevant part.
+    4. If the PDF doesn't contain enough information to answer a question, state this clearly in its answer.
+    5. Keep each answer concise but informative.
+
+    Please provide your answers based on these instructions:
+    """
+
+# "Answer 2:", also with the markdown emphasis models like to add ("**Answer 2:**")
+_ANSWER_LABEL = re.compile(r"^[\s*#]*Answer\s+(\d+)\s*[*]*\s*[:.)\-][*\s]*", re.IGNORECASE | re.MULTILINE)
+
+
+def retrieve(store: ChunkStore, question: str, top_k: int = RETRIEVAL_TOP_K) -> set:
+    # Indexes of the chunks a single chat in a session would use for the question
+    ranked = [index for index, score in store.rank(question) if score > 0][:top_k]
+    return set(ranked) if ranked else set(range(min(top_k, len(store))))
+
+
+def group_questions(retrieved: list[set], max_questions: int = BATCH_GROUP_MAX_QUESTIONS,
+                    min_overlap: float = BATCH_GROUP_OVERLAP) -> list[list[int]]:
+    """
+    Greedy grouping of questions whose retrieved chunks overlap: a question joins the group holding
+    the largest share of its chunks, if that share is at least min_overlap and the group is not full.
+    Returns lists of question indexes.
+    """
+    groups = []
+    for question, chunk_ids in enumerate(retrieved):
+        best, best_overlap = None, 0.0
+        for group in groups:
+            if len(group["questions"]) >= max_questions:
+                continue
+            overlap = len(chunk_ids & group["chunks"]) / len(chunk_ids) if chunk_ids else 1.0
+            if overlap > best_overlap:
+                best, best_overlap = group, overlap
+        if best is not None and best_overlap >= min_overlap:
+            best["questions"].append(question)
+            best["chunks"] |= chunk_ids
+        else:
+            groups.append({"questions": [question], "chunks": set(chunk_ids)})
+    return [group["questions"] for group in groups]
+
+
+def split_answers(response: str, count: int) -> dict:
+    # Maps question numbers (1-based) to their answer; questions without a labeled answer are left out
+    labels = list(_ANSWER_LABEL.finditer(response))
+    answers = {}
+    for position, label in enumerate(labels):
+        number = int(label.group(1))
+        end = labels[position + 1].start() if position + 1 < len(labels) else len(response)
+        answer = response[label.end():end].strip()
+        if 1 <= number <= count and answer and number not in answers:
+            answers[number] = answer
+    if not answers and count == 1 and response.strip():
+        answers[1] = response.strip()
+    return answers
+
+
+def document_fits(extracted_text: str, questions: list[str], max_questions: int = BATCH_GROUP_MAX_QUESTIONS) -> bool:
+    # Whether the whole document fits in a prompt next to the longest possible group of questions
+    longest = sorted((count_tokens(question) for question in questions), reverse=True)[:max_questions]
+    fixed = count_tokens(BATCH_PROMPT_TEMPLATE) + sum(longest) + 5 * len(longest)
+    return count_tokens(extracted_text) + fixed <= prompt_token_budget()
+
+
+def build_context(chunks: list[str], chunk_ids: set, summary: str = None) -> str:
+    context = SEGMENT_SEPARATOR.join(chunks[index] for index in sorted(chunk_ids))
+    # The summary covers questions the retrieved chunks only partly answer
+    if summary:
+        context = f"Document Summary: {summary}\n\n{context}"
+    return context
+
+
+def answer_group(questions: list[str], context: str, deadline: Deadline) -> list[str]:
+    numbered = "\n    ".join(f"Question {number}: {question}" for number, question in enumerate(questions, start=1))
+    context = pack_context(context, " ".join(questions), [BATCH_PROMPT_TEMPLATE, numbered]).text
+    response = generate_text(BATCH_PROMPT_TEMPLATE.format(context=context, questions=numbered), deadline)
+    answers = split_answers(response, len(questions))
+    # A question the model skipped or mislabeled is asked again on its own
+    missing = [number for number in range(1, len(questions) + 1) if number not in answers]
+    if missing:
+        logger.warning(f"Batch answer missed {len(missing)} of {len(questions)} questions, asking them separately")
+    for number in missing:
+        answers[number] = chat_with_gemini(questions[number - 1], context, deadline=deadline)
+    return [answers[number] for number in range(1, len(questions) + 1)]
+
+
+async def chat_batch(pdf_id: str, questions: list[str]) -> dict:
+    logger.info(f"Batch of {len(questions)} questions for PDF {pdf_id}")
+    if not questions:
+        raise HTTPException(status_code=400, detail="At least one question is required")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {BATCH_MAX_QUESTIONS} questions")
+    if any(not isinstance(question, str) or not question.strip() for question in questions):
+        raise HTTPException(status_code=400, detail="Questions must not be empty")
+
+    deadline = Deadline(settings.LLM_DEADLINE_SECONDS)
+    pdf_data = await load_pdf(pdf_id)
+    if pdf_data is None:
+        raise HTTPException(status_code=404, detail=f"PDF with ID {pdf_id} not found")
+    extracted_text = pdf_data.get("extracted_text")
+    if not extracted_text or len(extracted_text.strip()) == 0:
+        logger.error("Extracted text is empty for the given PDF")
+        raise HTTPException(status_code=400, detail="Extracted text is empty for the given PDF")
+
+    results = [None] * len(questions)
+    # Overview questions are answered from the precomputed summary, as in single chats
+    overview = overview_answer(pdf_data)
+    pending = []
+    for index, question in enumerate(questions):
+        if overview and is_overview_question(question):
+            results[index] = {"question": question, "answer": overview}
+        else:
+            pending.append(index)
+
+    # A document that fits in a prompt is sent whole, as for single chats, so every question shares it.
+    # Larger documents are cut to the chunks each question retrieves, and questions retrieving mostly
+    # the same chunks share a prompt.
+    if document_fits(extracted_text, [questions[index] for index in pending]):
+        groups = [pending[start:start + BATCH_GROUP_MAX_QUESTIONS] for start in range(0, len(pending), BATCH_GROUP_MAX_QUESTIONS)]
+        contexts = [extracted_text] * len(groups)
+    else:
+        chunks = await run_in_threadpool(chunk_store_for, pdf_data)
+        retrieved = [retrieve(chunks, questions[index]) for index in pending]
+        groups, contexts = [], []
+        for group in group_questions(retrieved):
+            groups.append([pending[position] for position in group])
+            contexts.append(build_context(chunks, set().union(*(retrieved[position] for position in group)), pdf_data.get("summary")))
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run_group(group: list[int], context: str):
+        group_questions_text = [questions[index] for index in group]
+        async with semaphore:
+            try:
+                answers = await run_in_threadpool(answer_group, group_questions_text, context, deadline)
+            except HTTPException as e:
+                logger.error(f"Batch group of {len(group)} questions failed: {e.detail}")
+                for index in group:
+                    results[index] = {"question": questions[index], "error": {"status_code": e.status_code, "detail": e.detail}}
+                return
+        for index, answer in zip(group, answers):
+            results[index] = {"question": questions[index], "answer": answer}
+
+    await asyncio.gather(*(run_group(group, context) for group, context in zip(groups, contexts)))
+    logger.info(f"Answered {len(questions)} questions for PDF {pdf_id} in {len(groups)} groups")
+    return {"answers": results, "groups": len(groups)}
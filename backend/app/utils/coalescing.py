@@ -0,0 +1,43 @@
+import asyncio
+from app.core.log_config import gemini_logger as logger
+
+
+def normalize_message(message) -> str:
+    # Questions differing only in case or spacing get the same answer
+    return " ".join(str(message).casefold().split())
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the call, callers arriving
+    while it is in flight wait for the same result (or exception). Nothing is cached once it finishes.
+    The call runs as its own task, so a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key, call):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Coalesced {self.name} call with one in flight")
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception even if every caller went away, so it is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.log_config import gemini_logger as logger
+from app.utils.chunk_store import ChunkStore
+from app.utils.retrieval import chunk_text, rank_chunks
+from app.utils.text_processing import count_tokens
+
+MODEL_CONTEXT_TOKENS = settings.MODEL_CONTEXT_TOKENS
+OUTPUT_TOKEN_RESERVE = settings.OUTPUT_TOKEN_RESERVE
+PROMPT_TOKEN_BUDGET = settings.PROMPT_TOKEN_BUDGET
+
+SEGMENT_SEPARATOR = "\n...\n"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    truncated: bool
+
+
+def prompt_token_budget() -> int:
+    # Tokens available for the whole prompt: the context window minus the output reserve, optionally capped
+    budget = MODEL_CONTEXT_TOKENS - OUTPUT_TOKEN_RESERVE
+    if PROMPT_TOKEN_BUDGET > 0:
+        budget = min(budget, PROMPT_TOKEN_BUDGET)
+    return budget
+
+
+def pack_context(document_text: str, message: str, fixed_parts: list[str], summary: str = None,
+                 budget: int = None, chunks=None) -> PackedContext:
+    """
+    Fit the document into what is left of the budget after the fixed parts of the prompt
+    (instructions, question, history). When the document overflows, the summary and the
+    chunks most relevant to the question are kept, in document order. Documents extracted
+    in layout mode pass their stored chunks, so tables are never split. Chunks may be a list,
+    the document's ChunkStore, whose index ranks them without tokenizing the document again, or
+    a function returning either, only called when the document overflows.
+    """
+    budget = prompt_token_budget() if budget is None else budget
+    available = budget - sum(count_tokens(part) for part in fixed_parts if part)
+    if available <= 0:
+        logger.warning(f"Prompt without document needs more than the budget of {budget} tokens")
+        raise HTTPException(status_code=400, detail="Message and history exceed the model's context window")
+
+    document_tokens = count_tokens(document_text)
+    if document_tokens <= available:
+        return PackedContext(document_text, document_tokens, False)
+
+    selected = {}
+    used = 0
+    separator_tokens = count_tokens(SEGMENT_SEPARATOR)
+    if summary:
+        summary_text = f"Document Summary: {summary}"
+        summary_tokens = count_tokens(summary_text)
+        if summary_tokens <= available:
+            selected[-1] = summary_text
+            used += summary_tokens
+
+    if callable(chunks):
+        chunks = chunks()
+    if chunks is None:
+        chunks = chunk_text(document_text)
+    ranking = chunks.rank(str(message)) if isinstance(chunks, ChunkStore) else rank_chunks(chunks, str(message))
+    ranked = [index for index, _ in ranking] or list(range(len(chunks)))
+    for index in ranked:
+        chunk_tokens = count_tokens(chunks[index]) + separator_tokens
+        if used + chunk_tokens > available:
+            continue
+        selected[index] = chunks[index]
+        used += chunk_tokens
+
+    packed = SEGMENT_SEPARATOR.join(selected[index] for index in sorted(selected))
+    logger.warning(f"Document of {document_tokens} tokens packed into {used} of {available} available tokens")
+    return PackedContext(packed, used, True)
@@ -8,14 +8,20 @@ from fastapi import HTTPException
 from app.core.log_config import data_logger as logger
 from bson.errors import InvalidId
 from app.core.config import settings
+from app.models.pdf import PDFMetadata
+from pydantic import ValidationError
+from app.utils.storage_codec import encode_text, decode_text
+from app.utils.pdf_cache import pdf_cache, document_size
 
 load_dotenv()
 
-def generate_unique_filename(directory, filename):
+def generate_unique_filename(directory, filename, exists=None):
+    # exists(name) lets storage backends other than the local disk be checked
+    exists = exists or (lambda name: os.path.exists(os.path.join(directory, name)))
     base, extension = os.path.splitext(filename)
     counter = 1
     unique_filename = filename
-    while os.path.exists(os.path.join(directory, unique_filename)):
+    while exists(unique_filename):
         unique_filename = f"{base}_{counter}{extension}"
         counter += 1
     return unique_filename
@@ -33,7 +39,19 @@ def save_to_mongodb(data):
         "size_kb": data["size_kb"],
         "extracted_text": data["extracted_text"],
     }
+    for field in ("content_hash", "status", "created_at", "schema_version", "expires_at", "extraction_mode", "chunks",
+                  "chunk_pages", "language"):
+        if field in data:
+            metadata[field] = data[field]
 
+    # Reject documents that do not match the PDFMetadata schema before they reach the database
+    try:
+        PDFMetadata.model_validate(metadata)
+    except ValidationError as e:
+        logger.error(f"Invalid PDF metadata: {e}")
+        raise HTTPException(status_code=500, detail="Invalid PDF metadata")
+
+    metadata["extracted_text"] = encode_text(metadata["extracted_text"])
     result = pdfs_collection.insert_one(metadata)
     logger.info(f"Saved PDF to MongoDB with ID: {result.inserted_id}")
     return str(result.inserted_id)
@@ -44,8 +62,19 @@ def load_from_mongodb(pdf_id=None):
     
     if not pdf_id:
         raise HTTPException(status_code=404, detail="Page Not Found")
+    # Hot documents are served from the cache; callers get their own copy of the cached dict
+    cached, fresh = pdf_cache.get(pdf_id)
+    if fresh:
+        return dict(cached)
     try:
-        return db.pdfs.find_one({"_id": ObjectId(pdf_id)})
+        if cached is not None:
+            stored = db.pdfs.find_one({"_id": ObjectId(pdf_id)}, {"version": 1})
+            if stored is not None and stored.get("version", 0) == pdf_cache.version(pdf_id):
+                pdf_cache.revalidated(pdf_id)
+                return dict(cached)
+            pdf_cache.expired(pdf_id)
+        generation = pdf_cache.generation
+        document = db.pdfs.find_one({"_id": ObjectId(pdf_id)})
     except InvalidId:
         logger.error(f"Invalid PDF ID: {pdf_id}")
         raise HTTPException(status_code=404, detail=f"PDF with ID {pdf_id} not found")
@@ -53,9 +82,102 @@ def load_from_mongodb(pdf_id=None):
         logger.error(f"Error loading PDF from MongoDB: {e}")
         raise HTTPException(status_code=500, detail=f"Error loading PDF from MongoDB: {e}")
 
+    # Compressed text is decoded here, so callers always see a str
+    if document and document.get("extracted_text") is not None:
+        document["extracted_text"] = decode_text(document["extracted_text"])
+    if document is not None:
+        pdf_cache.put(pdf_id, document, document.get("version", 0), document_size(document), generation)
+        document = dict(document)
+    return document
+
 
 def update_mongodb(pdf_id, data):
     db = get_database()
     pdfs_collection = db.pdfs
-    result = pdfs_collection.update_one({"_id": ObjectId(pdf_id)}, {"$set": data})
-    return result.modified_count > 0
\ No newline at end of file
+    # The version lets cached copies of the document, in this and other workers, notice the change
+    result = pdfs_collection.update_one({"_id": ObjectId(pdf_id)}, {"$set": data, "$inc": {"version": 1}})
+    pdf_cache.invalidate(pdf_id)
+    return result.modified_count > 0
+
+def delete_from_mongodb(pdf_id):
+    # Returns the deleted document (without its text) so the caller can remove the file, or None
+    db = get_database()
+    try:
+        document = db.pdfs.find_one_and_delete({"_id": ObjectId(pdf_id)}, projection={"file_path": 1, "filename": 1})
+        pdf_cache.invalidate(pdf_id)
+        return document
+    except (InvalidId, TypeError):
+        logger.error(f"Invalid PDF ID: {pdf_id}")
+        return None
+
+
+def find_stored_filenames(filenames):
+    # Which of the given file names still belong to a PDF record (served by the filename index)
+    db = get_database()
+    documents = db.pdfs.find({"filename": {"$in": list(filenames)}}, {"filename": 1, "_id": 0})
+    return {document["filename"] for document in documents}
+
+
+def find_stored_ids(pdf_ids):
+    # Which of the given PDF ids still have a record
+    db = get_database()
+    object_ids = [ObjectId(pdf_id) for pdf_id in pdf_ids if ObjectId.is_valid(pdf_id)]
+    documents = db.pdfs.find({"_id": {"$in": object_ids}}, {"_id": 1})
+    return {str(document["_id"]) for document in documents}
+
+
+# Fields returned by the listing endpoint: small, fixed-size metadata only
+PDF_LIST_PROJECTION = {
+    "filename": 1,
+    "original_filename": 1,
+    "page_count": 1,
+    "size_kb": 1,
+    "status": 1,
+    "created_at": 1,
+}
+
+# Fields never returned by the metadata endpoint: the document text and server-side paths
+PDF_METADATA_PROJECTION = {
+    "extracted_text": 0,
+    "file_path": 0,
+    "chunks": 0,
+}
+
+
+def serialize_pdf(document):
+    document = dict(document)
+    document["pdf_id"] = str(document.pop("_id"))
+    for key, value in document.items():
+        if isinstance(value, datetime):
+            document[key] = value.isoformat()
+    return document
+
+
+def list_pdfs(cursor=None, limit=20):
+    # Keyset pagination on _id: every page is an index range scan, whatever its depth
+    db = get_database()
+    query = {}
+    if cursor:
+        try:
+            query["_id"] = {"$gt": ObjectId(cursor)}
+        except (InvalidId, TypeError):
+            logger.error(f"Invalid cursor: {cursor}")
+            raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+    # Fetch one extra document to know whether another page exists
+    documents = list(db.pdfs.find(query, PDF_LIST_PROJECTION).sort("_id", 1).limit(limit + 1))
+    has_more = len(documents) > limit
+    items = [serialize_pdf(document) for document in documents[:limit]]
+    return {"items": items, "next_cursor": items[-1]["pdf_id"] if has_more else None}
+
+
+def get_pdf_metadata(pdf_id):
+    db = get_database()
+    try:
+        document = db.pdfs.find_one({"_id": ObjectId(pdf_id)}, PDF_METADATA_PROJECTION)
+    except (InvalidId, TypeError):
+        logger.error(f"Invalid PDF ID: {pdf_id}")
+        raise HTTPException(status_code=404, detail=f"PDF with ID {pdf_id} not found")
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"PDF with ID {pdf_id} not found")
+    return serialize_pdf(document)
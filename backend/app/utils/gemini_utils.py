@@ -1,24 +1,51 @@
-import google.generativeai as genai
 from fastapi import HTTPException, Request
 import json
 import logging
+import threading
 from app.utils.data_utils import load_from_mongodb
+from app.utils.retrieval import is_overview_question
+from app.utils.chunk_store import chunk_store_for
+from app.utils.session_utils import load_session, format_history, append_turn
+from app.utils.context_packing import pack_context, SEGMENT_SEPARATOR
+from app.utils.coalescing import SingleFlight, normalize_message
+from app.utils.llm_providers import LLMProvider, LLMResponse, register_provider, get_llm_provider
+from app.utils.resilience import ResilientCaller, CircuitBreaker, Deadline, DeadlineExceeded, CircuitOpenError, TransientError
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 import time
 from fastapi.responses import JSONResponse
 from app.core.log_config import gemini_logger as logger
 from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.utils.text_processing import count_tokens
+from app.core.warmup import warmup
 
 import os
 
+# The Gemini SDK is slow to import, so it is loaded on first use (or by the background warmup)
+genai = lazy_import("google.generativeai")
+google_exceptions = lazy_import("google.api_core.exceptions")
+
 # Load environment variables
 load_dotenv()
 
 # Google Gemini API key
 GEMINI_API_KEY = settings.GEMINI_API_KEY
 
-# Initialize the Google Generative AI Client with the API key
-genai.configure(api_key=GEMINI_API_KEY)
+_gemini_configured = False
+_gemini_lock = threading.Lock()
+
+# Initialize the Google Generative AI Client with the API key (once per process)
+def configure_gemini():
+    global _gemini_configured
+    if _gemini_configured:
+        return
+    with _gemini_lock:
+        if not _gemini_configured:
+            genai.configure(api_key=GEMINI_API_KEY)
+            _gemini_configured = True
+
+warmup.register("gemini", configure_gemini)
 
 TOKEN_LIMIT_PER_MINUTE = settings.TOKEN_LIMIT_PER_MINUTE
 TOKEN_LIMIT_PER_DAY = settings.TOKEN_LIMIT_PER_DAY
@@ -46,88 +73,191 @@ class TokenBucket:
 
 token_bucket = TokenBucket(TOKEN_LIMIT_PER_MINUTE, TOKEN_LIMIT_PER_DAY)
 
-# Chat with Gemini
-def chat_with_gemini(message, extracted_text):
-    if not GEMINI_API_KEY:
-        logger.error("Gemini API anahtarı ayarlanmadı")
-        raise HTTPException(status_code=500, detail="Gemini API anahtarı ayarlanmadı")
-    try:
-        # Define model parameters
-        generation_config = genai.GenerationConfig(
-            temperature=0.7, 
-            top_p=0.9,
-            top_k=40,
-            max_output_tokens=8192
+# Build the Gemini model with the service's generation and safety settings
+def get_generative_model():
+    configure_gemini()
+    # Define model parameters
+    generation_config = genai.GenerationConfig(
+        temperature=0.7, 
+        top_p=0.9,
+        top_k=40,
+        max_output_tokens=8192
+    )
+    logger.info(f"Generation config: {generation_config}")
+    # Define safety settings
+    safety_settings = [
+        {
+            "category": genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT,
+            "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+        },
+        {
+            "category": genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+            "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+        },
+        {
+            "category": genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+            "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+        },
+        {
+            "category": genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+            "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+        }
+    ]
+    logger.info(f"Safety settings: {safety_settings}")
+    # Initialize the model with the defined parameters
+    model = genai.GenerativeModel(
+        model_name="gemini-1.5-flash",
+        generation_config=generation_config,
+        safety_settings=safety_settings
+    )
+    logger.info(f"Model initialized: {model}")
+    return model
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    requires_api_key = True
+
+    def generate(self, prompt: str, timeout: float = None) -> LLMResponse:
+        model = get_generative_model()
+        request_options = {"timeout": timeout} if timeout else None
+        try:
+            response = model.generate_content([prompt], request_options=request_options)
+        except Exception as e:
+            if isinstance(e, self.transient_errors()):
+                raise TransientError(str(e)) from e
+            raise
+        logger.info(f"ResponseXXX: {response}")
+        text = response.text
+        # Prefer the usage reported by the API over the local estimate
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None)
+        output_tokens = getattr(usage, "candidates_token_count", None)
+        return LLMResponse(
+            text=text,
+            prompt_tokens=prompt_tokens if isinstance(prompt_tokens, int) else count_tokens(prompt),
+            output_tokens=output_tokens if isinstance(output_tokens, int) else len(text.split()),
         )
-        logger.info(f"Generation config: {generation_config}")
-        # Define safety settings
-        safety_settings = [
-            {
-                "category": genai.types.HarmCategory.HARM_CATEGORY_HARASSMENT,
-                "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
-            },
-            {
-                "category": genai.types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
-            },
-            {
-                "category": genai.types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
-            },
-            {
-                "category": genai.types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                "threshold": genai.types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
-            }
-        ]
-        logger.info(f"Safety settings: {safety_settings}")
-        # Initialize the model with the defined parameters
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            generation_config=generation_config,
-            safety_settings=safety_settings
+
+    @staticmethod
+    def transient_errors():
+        return (
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.TooManyRequests,
         )
 
-        logger.info(f"Model initialized: {model}")
-        # Construct the user prompt
-        # Construct a more detailed prompt for better answers
-        prompt = f"""
-        PDF Content: {extracted_text}
+    def stream(self, prompt: str):
+        model = get_generative_model()
+        for chunk in model.generate_content([prompt], stream=True):
+            yield chunk.text
 
-        User Question: {message}
+register_provider("gemini", GeminiProvider)
 
-        Instructions:
-        1. Carefully analyze the PDF content provided above.
-        2. Focus on answering the user's question accurately and comprehensively.
-        3. If the answer is directly stated in the PDF, quote the relevant part.
-        4. If the answer requires interpretation, explain your reasoning clearly.
-        5. If the PDF doesn't contain enough information to answer the question, state this clearly.
-        6. Provide context and additional information when relevant.
-        7. Keep your response concise but informative.
-        8. If appropriate, suggest follow-up questions the user might find helpful.
+# Deadlines, retries, hedging and the circuit breaker for every upstream call
+resilient_caller = ResilientCaller(
+    max_attempts=settings.LLM_MAX_ATTEMPTS,
+    backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+    backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+    hedging=settings.LLM_HEDGING_ENABLED,
+    hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+    breaker=CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS),
+    max_workers=settings.LLM_MAX_CONCURRENCY,
+)
 
-        Please provide your response based on these instructions:
-        """
 
-        response = model.generate_content([prompt])
-        logger.info(f"ResponseXXX: {response}")
-        tokens_used = len(response.text.split())  # Simple estimation of tokens used
+# Send a prompt to the configured LLM backend and charge the generated tokens to the token bucket
+def generate_text(prompt, deadline: Deadline = None, bucket: TokenBucket = None):
+    # Output tokens are charged to the chat token bucket unless another bucket is given
+    provider = get_llm_provider()
+    if provider.requires_api_key and not GEMINI_API_KEY:
+        logger.error("Gemini API anahtarı ayarlanmadı")
+        raise HTTPException(status_code=500, detail="Gemini API anahtarı ayarlanmadı")
+    deadline = deadline or Deadline(settings.LLM_DEADLINE_SECONDS)
+    try:
+        response = resilient_caller.call(lambda attempt_deadline: provider.generate(prompt, timeout=attempt_deadline.remaining()), deadline)
+        tokens_used = response.output_tokens
 
-        if not token_bucket.consume(tokens_used):
+        if not (bucket or token_bucket).consume(tokens_used):
             logger.error("Token limit exceeded")
             raise HTTPException(status_code=429, detail="Token limit exceeded")
         return response.text.strip()
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        logger.error(f"Upstream circuit open: {e}")
+        raise HTTPException(status_code=503, detail="Upstream model is unavailable, try again later",
+                            headers={"Retry-After": str(int(e.retry_after))})
+    except DeadlineExceeded:
+        logger.error("Upstream model call exceeded its deadline")
+        raise HTTPException(status_code=504, detail="Upstream model timed out")
+    except TransientError as e:
+        logger.error(f"Upstream model failed after retries: {e}")
+        raise HTTPException(status_code=503, detail="Upstream model is temporarily unavailable")
     except Exception as e:
         error_message = str(e)
         raise HTTPException(status_code=500, detail=f"Unexpected error in chat_with_gemini: {error_message}")
 
 
-async def chat_with_pdf(pdf_id: str, message: str):
+# Prompt sent for every chat question
+CHAT_PROMPT_TEMPLATE = """
+    PDF Content: {extracted_text}
+
+    {history_section}User Question: {message}
+
+    Instructions:
+    1. Carefully analyze the PDF content provided above.
+    2. Focus on answering the user's question accurately and comprehensively.
+    3. If the answer is directly stated in the PDF, quote the relevant part.
+    4. If the answer requires interpretation, explain your reasoning clearly.
+    5. If the PDF doesn't contain enough information to answer the question, state this clearly.
+    6. Provide context and additional information when relevant.
+    7. Keep your response concise but informative.
+    8. If appropriate, suggest follow-up questions the user might find helpful.
+
+    Please provide your response based on these instructions:
+    """
+
+
+# Chat with Gemini
+def chat_with_gemini(message, extracted_text, history=None, deadline: Deadline = None):
+    # Construct a more detailed prompt for better answers
+    history_section = f"Conversation History: {history}\n\n" if history else ""
+    prompt = CHAT_PROMPT_TEMPLATE.format(extracted_text=extracted_text, history_section=history_section, message=message)
+    return generate_text(prompt, deadline)
+
+
+# Concurrent loads of the same PDF, and identical questions about it, share one call
+pdf_loads = SingleFlight("PDF load")
+chat_calls = SingleFlight("chat")
+
+
+async def load_pdf(pdf_id: str):
+    if not settings.CHAT_COALESCING_ENABLED:
+        return await run_in_threadpool(load_from_mongodb, pdf_id=pdf_id)
+    return await pdf_loads.do(pdf_id, lambda: run_in_threadpool(load_from_mongodb, pdf_id=pdf_id))
+
+
+async def chat_with_pdf(pdf_id: str, message: str, session_id: str = None):
     logger.info(f"Chat request for PDF {pdf_id}")
+    # One deadline for the whole request, shared by every retry and hedge
+    deadline = Deadline(settings.LLM_DEADLINE_SECONDS)
     try:
-        pdf_data = load_from_mongodb(pdf_id=pdf_id)
+        pdf_data = await load_pdf(pdf_id)
         
         if pdf_data is None:
             raise HTTPException(status_code=404, detail=f"PDF with ID {pdf_id} not found")
+
+        if session_id:
+            return await run_in_threadpool(chat_in_session, pdf_id, session_id, message, pdf_data, deadline)
+
+        # Overview questions are answered from the summary precomputed at ingest, without calling Gemini
+        if is_overview_question(message):
+            response = overview_answer(pdf_data)
+            if response:
+                logger.info(f"Answered overview question for PDF {pdf_id} from precomputed summary")
+                return JSONResponse(content={"response": response})
         
         logger.info(f"PDF data retrieved from MongoDB: {pdf_data}")
         
@@ -148,13 +278,20 @@ async def chat_with_pdf(pdf_id: str, message: str):
             logger.error("Extracted text is empty for the given PDF")
             raise HTTPException(status_code=400, detail="Extracted text is empty for the given PDF")
         
-        # TODO make more efficient by using a more efficient tokenization method
-        max_length = 10000000000000 # Set max length for extracted text
-        if len(extracted_text) > max_length: # Check if extracted text is too long
-            extracted_text = extracted_text[:max_length] + "..." # Truncate extracted text
-            logger.warning(f"Extracted text was truncated from {len(extracted_text)} to {max_length} characters")
+        async def answer():
+            # Fit the document into the context window next to the instructions and the question. Counting
+            # tokens and building the retrieval index (only for documents that overflow) block the event loop
+            packed = await run_in_threadpool(pack_context, extracted_text, message, [CHAT_PROMPT_TEMPLATE, str(message)],
+                                             summary=pdf_data.get("summary"), chunks=lambda: chunk_store_for(pdf_data))
+            if packed.truncated:
+                logger.warning(f"Extracted text was packed from {len(extracted_text)} to {len(packed.text)} characters")
+            # Upstream calls block, so they run off the event loop
+            return await run_in_threadpool(chat_with_gemini, message, packed.text, deadline=deadline) # Chat with Gemini
 
-        response = chat_with_gemini(message, extracted_text) # Chat with Gemini
+        if settings.CHAT_COALESCING_ENABLED:
+            response = await chat_calls.do((pdf_id, normalize_message(message)), answer)
+        else:
+            response = await answer()
         logger.info(f"Successfully processed chat request for PDF {pdf_id}")
         return JSONResponse(content={"response": response})
 
@@ -166,4 +303,42 @@ async def chat_with_pdf(pdf_id: str, message: str):
         raise HTTPException(status_code=400, detail="Invalid JSON in request body")
     except Exception as e: # Exception
         logger.error(f"Unexpected error in chat_with_pdf: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Unexpected error occurred: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Unexpected error occurred: {str(e)}")
+
+
+def overview_answer(pdf_data: dict):
+    # Build an answer from the precomputed summary and keyword outline, if they exist
+    summary = pdf_data.get("summary") if isinstance(pdf_data, dict) else None
+    if not summary:
+        return None
+    keywords = []
+    for section in pdf_data.get("outline") or []:
+        keywords.extend(keyword for keyword in section["keywords"][:3] if keyword not in keywords)
+    if keywords:
+        return f"{summary}\n\nKey topics: {', '.join(keywords)}"
+    return summary
+
+
+def chat_in_session(pdf_id: str, session_id: str, message: str, pdf_data: dict, deadline: Deadline = None):
+    # Follow-up turns send the compacted history and only the chunks relevant to the question
+    if not message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    extracted_text = pdf_data.get("extracted_text") if isinstance(pdf_data, dict) else None
+    if not extracted_text or len(extracted_text.strip()) == 0:
+        logger.error("Extracted text is empty for the given PDF")
+        raise HTTPException(status_code=400, detail="Extracted text is empty for the given PDF")
+
+    session = load_session(session_id, pdf_id)
+    history = format_history(session)
+    # Include the previous question so short follow-ups ("and the second one?") still retrieve the right chunks
+    query = " ".join([turn["question"] for turn in session.get("turns", [])[-1:]] + [message])
+    context = SEGMENT_SEPARATOR.join(chunk_store_for(pdf_data).select(query))
+    # The precomputed summary is compact context for questions the retrieved chunks only partly cover
+    if pdf_data.get("summary"):
+        context = f"Document Summary: {pdf_data['summary']}\n\n{context}"
+    context = pack_context(context, message, [CHAT_PROMPT_TEMPLATE, message, history]).text
+
+    response = chat_with_gemini(message, context, history, deadline=deadline)
+    append_turn(session, message, response)
+    logger.info(f"Successfully processed chat request for PDF {pdf_id} in session {session_id}")
+    return JSONResponse(content={"response": response, "session_id": session_id})
\ No newline at end of file
@@ -0,0 +1,86 @@
+import importlib
+import re
+import threading
+from collections import Counter
+from app.core.config import settings
+from app.core.log_config import pdf_logger as logger
+
+DEFAULT_LANGUAGE = settings.DEFAULT_LANGUAGE
+DETECT_LANGUAGES = [language.strip() for language in settings.DETECT_LANGUAGES.split(",") if language.strip()]
+
+# Detection looks at the start of the text only
+SAMPLE_CHARS = 20000
+SAMPLE_WORDS = 5000
+# Fewer stop words than this in the sample is too little to tell languages apart
+MIN_STOP_WORDS = 3
+
+# Scripts written without spaces between words (Thai, Lao, Myanmar, Khmer, kana, CJK ideographs)
+NO_SPACE_SCRIPTS = "\u0e00-\u0eff\u1000-\u109f\u1780-\u17ff\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+
+# Scripts and the languages written in them; None stands for DETECT_LANGUAGES. Languages sharing
+# a script are told apart by their stop words.
+_SCRIPTS = [
+    ("latin", re.compile(r"[A-Za-z\u00c0-\u024f]"), None),
+    ("cyrillic", re.compile(r"[\u0400-\u04ff]"), ["ru", "uk", "bg"]),
+    ("greek", re.compile(r"[\u0370-\u03ff]"), ["el"]),
+    ("arabic", re.compile(r"[\u0600-\u06ff]"), ["ar", "fa"]),
+    ("hebrew", re.compile(r"[\u0590-\u05ff]"), ["he"]),
+    ("devanagari", re.compile(r"[\u0900-\u097f]"), ["hi"]),
+    ("thai", re.compile(r"[\u0e00-\u0e7f]"), ["th"]),
+    ("hangul", re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af]"), ["ko"]),
+    ("kana", re.compile(r"[\u3040-\u30ff]"), ["ja"]),
+    ("han", re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff]"), ["zh"]),
+]
+NON_LATIN_LANGUAGES = {language for _, _, languages in _SCRIPTS if languages for language in languages}
+
+_WORD_PATTERN = re.compile(r"\w+")
+_stop_words = {}
+_stop_words_lock = threading.Lock()
+
+
+def stop_words(language: str) -> frozenset:
+    # spaCy ships stop word lists for most languages; they are imported once per language
+    with _stop_words_lock:
+        if language not in _stop_words:
+            try:
+                module = importlib.import_module(f"spacy.lang.{language}.stop_words")
+                _stop_words[language] = frozenset(module.STOP_WORDS)
+            except ImportError:
+                logger.warning(f"No stop words for language '{language}', it cannot be detected")
+                _stop_words[language] = frozenset()
+        return _stop_words[language]
+
+
+def _by_stop_words(sample: str, candidates: list[str], default: str) -> str:
+    counts = Counter(_WORD_PATTERN.findall(sample.lower())[:SAMPLE_WORDS])
+    scores = {language: sum(count for word, count in counts.items() if word in stop_words(language))
+              for language in candidates}
+    # On a tie the default language wins, then the earlier candidate
+    best = max(candidates, key=lambda language: (scores[language], language == default))
+    if scores[best] < MIN_STOP_WORDS:
+        return default if default in candidates else candidates[0]
+    return best
+
+
+def detect_language(text: str, default: str = DEFAULT_LANGUAGE) -> str:
+    """
+    ISO 639-1 code of the main language of the text. The dominant script narrows the candidates
+    (Japanese is recognized by kana mixed with ideographs), stop words pick among languages sharing
+    a script. Short or inconclusive text gets the default language.
+    """
+    sample = (text or "")[:SAMPLE_CHARS]
+    counts = {script: len(pattern.findall(sample)) for script, pattern, _ in _SCRIPTS}
+    if counts["kana"] and counts["kana"] >= 0.1 * (counts["kana"] + counts["han"]):
+        counts["han"] = 0
+    script = max(counts, key=counts.get)
+    if not counts[script]:
+        return default
+    candidates = next(languages for name, _, languages in _SCRIPTS if name == script) or DETECT_LANGUAGES
+    if len(candidates) == 1:
+        return candidates[0]
+    return _by_stop_words(sample, candidates, default)
+
+
+def folds_accents(language: str) -> bool:
+    # Accents are dropped for Latin script languages only: in other scripts the marks are part of the letters
+    return language not in NON_LATIN_LANGUAGES and language != "xx"
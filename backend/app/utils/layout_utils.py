@@ -0,0 +1,128 @@
+import re
+from app.core.config import settings
+from app.utils.retrieval import chunk_text, chunk_pages
+
+# Parsing of pypdf's layout-mode output (extract_text(extraction_mode="layout")), which keeps the
+# reading order and the horizontal position of text. Lines are grouped into records: headings,
+# paragraphs and tables. Tables are rendered as Markdown so rows and numbers keep their structure.
+
+PAGE_BREAK = "\f"
+TABLE_ROWS_PER_CHUNK = settings.TABLE_ROWS_PER_CHUNK
+
+# Columns in layout output are separated by runs of spaces
+_COLUMN_GAP = re.compile(r"\s{2,}")
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+\S")
+_HEADING_MAX_WORDS = 10
+
+
+def split_columns(line: str) -> list[str]:
+    return _COLUMN_GAP.split(line.strip())
+
+
+def is_heading(line: str) -> bool:
+    text = line.strip()
+    words = text.split()
+    if not words or len(words) > _HEADING_MAX_WORDS or text[-1] in ".,;:" or len(split_columns(text)) > 1:
+        return False
+    if _NUMBERED_HEADING.match(text) or text.isupper():
+        return True
+    capitalized = sum(1 for word in words if word[0].isupper())
+    return len(words) > 1 and capitalized / len(words) >= 0.6
+
+
+def markdown_table(rows: list[list[str]]) -> str:
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = ["| " + " | ".join(cell.replace("|", "\\|") for cell in row) + " |" for row in rows]
+    lines.insert(1, "| " + " | ".join(["---"] * width) + " |")
+    return "\n".join(lines)
+
+
+def parse_layout(text: str) -> list[dict]:
+    # Pages are separated by PAGE_BREAK; returns records of type heading, text or table
+    records = []
+    for page_number, page in enumerate(text.split(PAGE_BREAK), start=1):
+        paragraph = []
+        table = []
+
+        def flush_paragraph():
+            if paragraph:
+                records.append({"type": "text", "page": page_number, "text": " ".join(paragraph)})
+                paragraph.clear()
+
+        def flush_table():
+            # A single columnar line is more likely a line of text with wide spacing than a table
+            if len(table) >= 2:
+                records.append({"type": "table", "page": page_number, "text": markdown_table(table)})
+            else:
+                paragraph.extend(" ".join(row) for row in table)
+            table.clear()
+
+        for line in page.split("\n"):
+            if not line.strip():
+                flush_table()
+                flush_paragraph()
+                continue
+            cells = split_columns(line)
+            if len(cells) >= 2:
+                # A different number of columns starts a new table
+                if table and len(cells) != len(table[0]):
+                    flush_table()
+                flush_paragraph()
+                table.append(cells)
+                continue
+            flush_table()
+            if is_heading(line):
+                flush_paragraph()
+                records.append({"type": "heading", "page": page_number, "text": " ".join(line.split())})
+            else:
+                paragraph.append(" ".join(line.split()))
+        flush_table()
+        flush_paragraph()
+    return records
+
+
+def records_to_markdown(records: list[dict]) -> str:
+    blocks = [f"## {record['text']}" if record["type"] == "heading" else record["text"] for record in records]
+    return "\n\n".join(blocks)
+
+
+def layout_chunks(records: list[dict], rows_per_chunk: int = TABLE_ROWS_PER_CHUNK) -> list[str]:
+    """
+    Chunks for retrieval: the text of each section is chunked on its own, and every table is
+    indexed separately (split by rows, with its header repeated) so rows are never cut in half.
+    Each chunk starts with its section heading.
+    """
+    return layout_chunks_and_pages(records, rows_per_chunk)[0]
+
+
+def layout_chunks_and_pages(records: list[dict], rows_per_chunk: int = TABLE_ROWS_PER_CHUNK) -> tuple[list[str], list[int]]:
+    # layout_chunks with the page each chunk starts on
+    chunks, pages = [], []
+    heading = ""
+    section = []
+
+    def flush_section():
+        texts = [record["text"] for record in section]
+        section_chunks = chunk_text(" ".join(texts))
+        pages.extend(chunk_pages(texts, [record["page"] for record in section], len(section_chunks)))
+        for chunk in section_chunks:
+            chunks.append(f"{heading}\n{chunk}" if heading else chunk)
+        section.clear()
+
+    for record in records:
+        if record["type"] == "heading":
+            flush_section()
+            heading = f"## {record['text']}"
+        elif record["type"] == "table":
+            flush_section()
+            lines = record["text"].split("\n")
+            header, rows = lines[:2], lines[2:]
+            for start in range(0, len(rows), rows_per_chunk):
+                table = "\n".join(header + rows[start:start + rows_per_chunk])
+                chunks.append(f"{heading}\n{table}" if heading else table)
+                pages.append(record["page"])
+        else:
+            section.append(record)
+    flush_section()
+    return chunks, pages
@@ -0,0 +1,123 @@
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterator
+from app.core.config import settings
+from app.utils.text_processing import count_tokens
+from app.utils.resilience import TransientError
+
+# Numbered questions of a batch prompt
+_QUESTION_NUMBER = re.compile(r"^\s*Question (\d+):", re.MULTILINE)
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    prompt_tokens: int
+    output_tokens: int
+
+
+class LLMProvider:
+    """Interface of an LLM backend used by the chat and summary paths."""
+
+    name = "base"
+    requires_api_key = False
+
+    def generate(self, prompt: str, timeout: float = None) -> LLMResponse:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        # Providers without native streaming return the whole answer as one chunk
+        yield self.generate(prompt).text
+
+
+class FakeProvider(LLMProvider):
+    """
+    Local deterministic stand-in for load testing and benchmarks. Latency is log-normal around
+    latency_ms, and the answer length is log-normal around output_tokens. A seed makes the
+    sequence of latencies and answers reproducible.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms: float = settings.FAKE_LLM_LATENCY_MS,
+                 latency_sigma: float = settings.FAKE_LLM_LATENCY_SIGMA,
+                 output_tokens: int = settings.FAKE_LLM_OUTPUT_TOKENS,
+                 output_tokens_sigma: float = settings.FAKE_LLM_OUTPUT_TOKENS_SIGMA,
+                 stream_chunk_tokens: int = 20,
+                 error_rate: float = settings.FAKE_LLM_ERROR_RATE,
+                 seed: int = settings.FAKE_LLM_SEED,
+                 sleep=time.sleep):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.output_tokens = output_tokens
+        self.output_tokens_sigma = output_tokens_sigma
+        self.stream_chunk_tokens = stream_chunk_tokens
+        self.error_rate = error_rate
+        self.sleep = sleep
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _sample(self) -> tuple[float, int, bool]:
+        with self._lock:
+            self.calls += 1
+            latency = self.latency_ms * self._random.lognormvariate(0, self.latency_sigma) / 1000 if self.latency_ms > 0 else 0.0
+            tokens = max(1, round(self.output_tokens * self._random.lognormvariate(0, self.output_tokens_sigma)))
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+        return latency, tokens, failed
+
+    def _answer(self, prompt: str, tokens: int) -> list[str]:
+        # The same prompt and length always produce the same words
+        seed_words = prompt.split()[-8:] or ["answer"]
+        return [seed_words[i % len(seed_words)] for i in range(tokens)]
+
+    def _text(self, prompt: str, tokens: int) -> str:
+        # Prompts with numbered questions (batches) get one labeled answer per question
+        numbers = _QUESTION_NUMBER.findall(prompt)
+        if not numbers:
+            return " ".join(self._answer(prompt, tokens))
+        per_question = max(1, tokens // len(numbers))
+        return "\n".join(f"Answer {number}: " + " ".join(self._answer(f"{prompt} {number}", per_question)) for number in numbers)
+
+    def generate(self, prompt: str, timeout: float = None) -> LLMResponse:
+        latency, tokens, failed = self._sample()
+        self.sleep(latency)
+        if failed:
+            raise TransientError("Injected upstream failure")
+        return LLMResponse(self._text(prompt, tokens), count_tokens(prompt), tokens)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        latency, tokens, _ = self._sample()
+        words = self._answer(prompt, tokens)
+        chunks = [words[i:i + self.stream_chunk_tokens] for i in range(0, len(words), self.stream_chunk_tokens)]
+        # Half of the latency is time to first token, the rest is spread over the chunks
+        self.sleep(latency / 2)
+        for chunk in chunks:
+            yield " ".join(chunk) + " "
+            self.sleep(latency / 2 / len(chunks))
+
+
+_provider_factories = {"fake": FakeProvider}
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def register_provider(name: str, factory):
+    _provider_factories[name] = factory
+
+
+def get_llm_provider(name: str = None) -> LLMProvider:
+    # One provider instance per process and backend name
+    name = name or settings.LLM_PROVIDER
+    provider = _providers.get(name)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(name)
+            if provider is None:
+                if name not in _provider_factories:
+                    raise ValueError(f"Unknown LLM provider: {name}")
+                provider = _providers[name] = _provider_factories[name]()
+    return provider
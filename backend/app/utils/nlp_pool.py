@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import OrderedDict
+from app.core.config import settings
+from app.core.lazy import lazy_import
+from app.core.log_config import pdf_logger as logger
+
+spacy = lazy_import("spacy")
+
+# Tokenizer-only pipelines hold their vocabulary and rules: a few MB
+BLANK_PIPELINE_BYTES = 8 * 1024 * 1024
+# spaCy's multi-language tokenizer, for languages whose own tokenizer needs missing dependencies
+MULTI_LANGUAGE = "xx"
+
+
+def parse_models(value: str) -> dict:
+    # "language:package,..." -> {language: package}
+    models = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        language, _, package = entry.partition(":")
+        if language and package:
+            models[language.strip()] = package.strip()
+        else:
+            logger.error(f"Ignoring malformed SPACY_MODELS entry: {entry}")
+    return models
+
+
+def package_size(package: str) -> int:
+    # A trained pipeline takes about as much memory as its files on disk
+    try:
+        path = spacy.util.get_package_path(package)
+    except Exception:
+        return BLANK_PIPELINE_BYTES
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+class PipelinePool:
+    """
+    spaCy pipelines per language, loaded on first use. Languages with a package in SPACY_MODELS
+    get the trained pipeline, others a tokenizer-only (blank) pipeline. The least recently used
+    pipelines are unloaded when there are more than max_pipelines or their estimated memory
+    exceeds max_bytes; the pipeline just requested is always kept, even if it alone exceeds the cap.
+    """
+
+    def __init__(self, models: dict, max_pipelines: int, max_bytes: int):
+        self.models = models
+        self.max_pipelines = max(1, max_pipelines)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self._pipelines = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per language: loading a model does not hold up requests for loaded languages
+        self._load_locks = {}
+
+    def get(self, language: str):
+        with self._lock:
+            nlp = self._lookup(language)
+            if nlp is not None:
+                return nlp
+            load_lock = self._load_locks.setdefault(language, threading.Lock())
+        with load_lock:
+            with self._lock:
+                nlp = self._lookup(language)
+                if nlp is not None:
+                    return nlp
+            nlp, size = self._load(language)
+            with self._lock:
+                self._pipelines[language] = (nlp, size)
+                self.bytes += size
+                self.loads += 1
+                self._evict(keep=language)
+            return nlp
+
+    def _lookup(self, language: str):
+        entry = self._pipelines.get(language)
+        if entry is None:
+            return None
+        self._pipelines.move_to_end(language)
+        return entry[0]
+
+    def _load(self, language: str):
+        package = self.models.get(language)
+        if package:
+            try:
+                nlp = spacy.load(package)
+                logger.info(f"Loaded spaCy model {package} for language '{language}'")
+                return nlp, package_size(package)
+            except OSError as e:
+                # Preprocessing only needs the tokenizer, which the blank pipeline provides
+                logger.error(f"Could not load spaCy model {package}, using a blank '{language}' pipeline: {str(e)}")
+        try:
+            nlp = spacy.blank(language)
+        except ImportError as e:
+            logger.warning(f"No spaCy tokenizer for language '{language}', using the multi-language one: {str(e)}")
+            nlp = spacy.blank(MULTI_LANGUAGE)
+        logger.info(f"Loaded blank spaCy pipeline for language '{language}'")
+        return nlp, BLANK_PIPELINE_BYTES
+
+    def _evict(self, keep: str):
+        while len(self._pipelines) > 1 and (len(self._pipelines) > self.max_pipelines or self.bytes > self.max_bytes):
+            language = next(language for language in self._pipelines if language != keep)
+            _, size = self._pipelines.pop(language)
+            self.bytes -= size
+            self.evictions += 1
+            logger.info(f"Unloaded spaCy pipeline for language '{language}'")
+
+    def clear(self):
+        with self._lock:
+            self._pipelines.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "languages": list(self._pipelines),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+nlp_pool = PipelinePool(parse_models(settings.SPACY_MODELS), settings.NLP_POOL_MAX_PIPELINES, settings.NLP_POOL_MAX_BYTES)
@@ -0,0 +1,120 @@
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from app.core.config import settings
+from app.core.log_config import ocr_logger as logger
+from app.db.mongodb import get_database
+
+# OCR of image-only pages. Tesseract runs in a separate, bounded process pool so it never holds the
+# GIL of the API workers, and a page budget sheds OCR work instead of letting it queue behind uploads.
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.OCR_MAX_QUEUED_PAGES)
+
+
+def ocr_images(images: list[bytes], language: str) -> str:
+    # Runs in a pool process. pytesseract and Pillow are optional and only needed when OCR is enabled.
+    import io
+    import pytesseract
+    from PIL import Image
+
+    texts = []
+    for data in images:
+        with Image.open(io.BytesIO(data)) as image:
+            texts.append(pytesseract.image_to_string(image, lang=language))
+    return "\n".join(text.strip() for text in texts if text.strip())
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forked children would inherit the MongoDB client and other threads' locks
+                _pool = ProcessPoolExecutor(max_workers=settings.OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                logger.info(f"Started OCR pool with {settings.OCR_WORKERS} workers")
+    return _pool
+
+
+def shutdown_ocr_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def page_images(page) -> list[bytes]:
+    # Scanned pages embed the scan as one or more images; pypdf decodes them without rasterizing
+    return [image.data for image in page.images]
+
+
+def page_hash(images: list[bytes], language: str) -> str:
+    digest = hashlib.sha256(language.encode())
+    for data in images:
+        digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+
+def load_cached_pages(hashes: list[str]) -> dict:
+    db = get_database()
+    return {document["_id"]: document["text"] for document in db.ocr_cache.find({"_id": {"$in": hashes}}, {"text": 1})}
+
+
+def cache_page(digest: str, text: str):
+    db = get_database()
+    db.ocr_cache.update_one(
+        {"_id": digest},
+        {"$setOnInsert": {"text": text, "created_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def ocr_pages(pages: dict, filename: str, language: str = settings.OCR_LANGUAGE) -> dict:
+    # pages maps page numbers to their images; returns page numbers to recognized text
+    hashes = {number: page_hash(images, language) for number, images in pages.items() if images}
+    cached = load_cached_pages(list(set(hashes.values())))
+    results = {number: cached[digest] for number, digest in hashes.items() if digest in cached}
+    missing = [number for number in hashes if number not in results]
+    if not missing:
+        return results
+
+    # Take every page slot up front: a document is either OCRed completely or rejected
+    acquired = 0
+    while acquired < len(missing) and _slots.acquire(blocking=False):
+        acquired += 1
+    if acquired < len(missing):
+        for _ in range(acquired):
+            _slots.release()
+        logger.warning(f"OCR capacity exhausted, rejecting '{filename}'")
+        raise HTTPException(status_code=503, detail="OCR capacity exhausted, please retry later",
+                            headers={"Retry-After": str(settings.OCR_RETRY_AFTER_SECONDS)})
+
+    # A slot is released when its page finishes, even if this request stopped waiting for it
+    pool = get_ocr_pool()
+    futures = {}
+    try:
+        for number in missing:
+            futures[number] = pool.submit(ocr_images, pages[number], language)
+            futures[number].add_done_callback(lambda future: _slots.release())
+    finally:
+        for _ in range(len(missing) - len(futures)):
+            _slots.release()
+
+    try:
+        for number, future in futures.items():
+            results[number] = future.result(timeout=settings.OCR_PAGE_TIMEOUT_SECONDS)
+            cache_page(hashes[number], results[number])
+    except FutureTimeoutError:
+        # Pages not started yet are dropped; a page still running keeps its slot until it finishes
+        for future in futures.values():
+            future.cancel()
+        logger.warning(f"OCR of '{filename}' timed out after {settings.OCR_PAGE_TIMEOUT_SECONDS} seconds on a page")
+        raise HTTPException(status_code=504, detail="OCR of the scanned pages timed out")
+
+    logger.info(f"OCR of '{filename}': {len(missing)} pages recognized, {len(hashes) - len(missing)} from cache")
+    return results
@@ -0,0 +1,131 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from app.core.config import settings
+
+# Per-process cache of decoded PDF documents (text, chunks, summary), so chats on a hot document skip
+# the MongoDB round trip and the decoding. It is bounded by the size of the cached text, not by the
+# number of documents. Every update of a record increments its version: updates made by this process
+# drop the entry at once, and entries older than PDF_CACHE_REVALIDATE_SECONDS are checked against the
+# stored version (a small indexed read) to pick up updates made by other workers.
+
+_ENTRY_OVERHEAD = 512
+
+
+def document_size(document: dict) -> int:
+    # Approximate memory held by a document: its strings dominate
+    size = _ENTRY_OVERHEAD
+    for value in document.values():
+        if isinstance(value, (str, bytes)):
+            size += sys.getsizeof(value)
+        elif isinstance(value, list):
+            size += sum(sys.getsizeof(item) for item in value if isinstance(item, (str, bytes)))
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "version", "size", "checked_at")
+
+    def __init__(self, value, version: int, size: int, checked_at: float):
+        self.value = value
+        self.version = version
+        self.size = size
+        self.checked_at = checked_at
+
+
+class ByteLRUCache:
+    def __init__(self, max_bytes: int, revalidate_seconds: float, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.clock = clock
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        # Incremented by every invalidation: a value read before one may already be outdated
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (value, fresh): a stale value must be revalidated before use, None if not cached
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            if self.clock() - entry.checked_at < self.revalidate_seconds:
+                self.hits += 1
+                return entry.value, True
+            return entry.value, False
+
+    def version(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry.version
+
+    def revalidated(self, key):
+        # The stored version still matches: the entry is good for another period
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.checked_at = self.clock()
+                self.revalidations += 1
+                self.hits += 1
+
+    def expired(self, key):
+        # The stored version changed: the entry is dropped and the lookup counts as a miss
+        self.invalidate(key)
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key, value, version: int, size: int, generation: int = None):
+        # generation is the value read before loading; the value is not cached if an invalidation came since
+        if size > self.max_bytes:
+            self.invalidate(key)
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self._entries[key] = _Entry(value, version, size, self.clock())
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes -= entry.size
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "revalidations": self.revalidations,
+                "evictions": self.evictions,
+            }
+
+
+pdf_cache = ByteLRUCache(settings.PDF_CACHE_MAX_BYTES, settings.PDF_CACHE_REVALIDATE_SECONDS)
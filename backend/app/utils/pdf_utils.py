@@ -1,20 +1,39 @@
+import io
 import os
 import uuid
-from fastapi import UploadFile, HTTPException
-#from PyPDF2 import PdfReader
-from pypdf import PdfReader
-import spacy
-from app.utils.data_utils import generate_unique_filename, save_to_mongodb
+import hashlib
+from datetime import datetime, timedelta, timezone
+from fastapi import UploadFile, HTTPException, BackgroundTasks
+from starlette.concurrency import run_in_threadpool
+from app.utils.data_utils import generate_unique_filename, save_to_mongodb, delete_from_mongodb
+from app.utils.session_utils import delete_sessions
 from app.utils.text_processing import preprocess_text
+from app.utils.language import detect_language, DEFAULT_LANGUAGE
+from app.utils.nlp_pool import nlp_pool
+from app.utils.chunk_store import chunk_stores
+from app.utils.summary_utils import precompute_summary
 from dotenv import load_dotenv
 from app.core.log_config import pdf_logger as logger
 from app.core.config import settings
+from app.db.bootstrap import CURRENT_SCHEMA_VERSION
+from app.core.lazy import lazy_import
+from app.core.warmup import warmup
+from app.utils.storage_codec import MAGIC, encode_file, decompress
+from app.utils.storage import get_storage
+from app.utils.ocr_utils import ocr_pages, page_images
+from app.utils.layout_utils import PAGE_BREAK, parse_layout, records_to_markdown, layout_chunks_and_pages
+from app.utils.pdf_validation import PdfInfo, PdfValidationError, inspect_pdf
 
 load_dotenv()
 
+# pypdf and spaCy are imported on first use (or by the background warmup) to keep worker startup fast
+PdfReader = lazy_import("pypdf", "PdfReader")
+
 
 PDF_UPLOAD_PATH = settings.PDF_UPLOAD_PATH
 MAX_PDF_SIZE = settings.MAX_PDF_SIZE
+MAX_PDF_PAGES = settings.MAX_PDF_PAGES
+EXTRACTION_MODES = ("plain", "layout")
 
 
 # Create folder for uploading PDF if not exists
@@ -23,37 +42,99 @@ if not os.path.exists(PDF_UPLOAD_PATH):
     logger.info(f"Created PDF upload directory: {PDF_UPLOAD_PATH}")
 
 
-async def upload_pdf(file: UploadFile):
+# spaCy pipelines are loaded once per process and language instead of once per upload
+def get_nlp(language: str = None):
+    return nlp_pool.get(language or DEFAULT_LANGUAGE)
+
+
+warmup.register("pypdf", lambda: PdfReader.__name__)
+warmup.register("spacy", get_nlp)
+
+
+async def upload_pdf(file: UploadFile, background_tasks: BackgroundTasks = None, extraction_mode: str = None):
     logger.info(f"Attempting to upload file: {file.filename}")
+    extraction_mode = extraction_mode or settings.EXTRACTION_MODE
+    validate_extraction_mode(extraction_mode)
     validate_pdf_file(file)
     content = await file.read()
     validate_pdf_size(content, file.filename)
+    # Malformed, encrypted and oversized documents are rejected before anything is saved or parsed
+    prevalidate_pdf(content, file.filename)
 
+    file_path = None
+    pdf_id = None
     try:
-        file_path = save_pdf_file(content, file.filename)
-        extracted_text, page_count = extract_text_from_pdf(file_path, file.filename)
-        processed_text = preprocess_extracted_text(extracted_text, file.filename)
+        # Storage (an S3 upload), parsing (and OCR), spaCy and MongoDB all block: keep them off the event loop
+        file_path = await run_in_threadpool(save_pdf_file, content, file.filename)
+        extracted_text, page_count = await run_in_threadpool(extract_text_from_pdf, file_path, file.filename, extraction_mode)
+        chunks = chunk_pages = None
+        language = await run_in_threadpool(detect_language, extracted_text)
+        if extraction_mode == "layout":
+            # Layout text keeps numbers and table structure, so it skips the word-only preprocessing
+            records = await run_in_threadpool(parse_layout, extracted_text)
+            processed_text = records_to_markdown(records)
+            chunks, chunk_pages = layout_chunks_and_pages(records)
+        else:
+            processed_text = await run_in_threadpool(preprocess_extracted_text, extracted_text, file.filename, language)
 
         # Check if the processed text exceeds the maximum character length
         if len(processed_text) > settings.MAX_CHAR_LENGTH:
-            # Delete the file if processed text length exceeds the maximum
-            os.remove(file_path)
-            logger.info(f"Deleted file {file_path} due to exceeding maximum character length")
             logger.warning(f"Processed text exceeds maximum character length: {len(processed_text)}")
             raise HTTPException(status_code=400, detail=f"Processed text exceeds maximum character length of {settings.MAX_CHAR_LENGTH}")
         else:
-            pdf_id = store_pdf_data(file, file_path, content, page_count, processed_text)
+            pdf_id = await run_in_threadpool(store_pdf_data, file, file_path, content, page_count, processed_text, chunks,
+                                             language=language, chunk_pages=chunk_pages)
+
+        # Precompute the summary after the response is sent, so upload latency is unaffected
+        if settings.SUMMARY_PRECOMPUTE_ENABLED and background_tasks is not None:
+            background_tasks.add_task(precompute_summary, pdf_id, processed_text, language)
 
         logger.info(f"Successfully uploaded and processed PDF: {file.filename}")
         return {"pdf_id": pdf_id}
     except HTTPException as http_error:
         logger.error(f"HTTP error processing PDF: {str(http_error)}")
+        if pdf_id is None:
+            await run_in_threadpool(remove_pdf_file, file_path)
         raise http_error
     except Exception as e:
         logger.error(f"Unexpected error processing PDF: {str(e)}")
+        if pdf_id is None:
+            await run_in_threadpool(remove_pdf_file, file_path)
         raise HTTPException(status_code=500, detail=f"Unexpected error processing PDF: {str(e)}")
 
 
+def remove_pdf_file(file_path: str) -> bool:
+    # A file that is already gone is fine: the garbage collector may have removed it first
+    if not file_path:
+        return False
+    try:
+        deleted = get_storage().delete(file_path)
+        if deleted:
+            logger.info(f"Deleted file {file_path}")
+        return deleted
+    except Exception as e:
+        logger.error(f"Could not delete file {file_path}: {str(e)}")
+        return False
+
+
+def delete_pdf(pdf_id: str) -> dict:
+    # The record goes first: if removing the file fails, the garbage collector reclaims it later
+    document = delete_from_mongodb(pdf_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"PDF with ID {pdf_id} not found")
+    remove_pdf_file(document.get("file_path"))
+    chunk_stores.remove(pdf_id)
+    sessions = delete_sessions(pdf_id)
+    logger.info(f"Deleted PDF {pdf_id} and {sessions} chat sessions")
+    return {"pdf_id": pdf_id, "deleted": True}
+
+
+def validate_extraction_mode(extraction_mode: str):
+    if extraction_mode not in EXTRACTION_MODES:
+        logger.warning(f"Rejected unknown extraction mode: {extraction_mode}")
+        raise HTTPException(status_code=400, detail=f"Extraction mode must be one of: {', '.join(EXTRACTION_MODES)}")
+
+
 def validate_pdf_file(file: UploadFile):
     if not file.filename.endswith(".pdf"):
         logger.warning(f"Rejected non-PDF file: {file.filename}")
@@ -66,29 +147,67 @@ def validate_pdf_size(content: bytes, filename: str):
         raise HTTPException(status_code=400, detail=f"PDF file size exceeds the maximum allowed size of {MAX_PDF_SIZE / 1024 / 1024} MB")
 
 
+def prevalidate_pdf(content: bytes, filename: str) -> PdfInfo:
+    try:
+        info = inspect_pdf(content)
+    except PdfValidationError as e:
+        logger.warning(f"Rejected malformed PDF {filename}: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    if info.encrypted:
+        logger.warning(f"Rejected encrypted PDF: {filename}")
+        raise HTTPException(status_code=400, detail="Encrypted PDFs are not supported")
+    if info.page_count == 0:
+        logger.warning(f"Rejected PDF without pages: {filename}")
+        raise HTTPException(status_code=400, detail="The PDF file has no pages")
+    if info.page_count is not None:
+        validate_page_count(info.page_count, filename)
+    return info
+
+
+def validate_page_count(page_count: int, filename: str):
+    if MAX_PDF_PAGES and page_count > MAX_PDF_PAGES:
+        logger.warning(f"Rejected PDF with too many pages: {filename} ({page_count} pages)")
+        raise HTTPException(status_code=400, detail=f"The PDF has {page_count} pages, more than the maximum of {MAX_PDF_PAGES}")
+
+
 def save_pdf_file(content: bytes, filename: str) -> str:
-    unique_filename = generate_unique_filename(PDF_UPLOAD_PATH, filename)
-    file_path = os.path.join(PDF_UPLOAD_PATH, unique_filename)
-    logger.info(f"Writing PDF to file path: {file_path}")
-    with open(file_path, "wb") as pdf_file:
-        pdf_file.write(content)
-    return file_path
+    storage = get_storage()
+    unique_filename = generate_unique_filename(storage.root, filename, exists=storage.exists)
+    logger.info(f"Writing PDF {unique_filename} to {storage.root}")
+    return storage.save(unique_filename, encode_file(content))
+
 
+def open_pdf_file(file_path: str):
+    # Compressed PDFs are decompressed into memory; plain ones are read into memory too, as pypdf does
+    # with a path, so the copy cannot go away while pages are extracted
+    with get_storage().open(file_path) as pdf_file:
+        header = pdf_file.read(len(MAGIC))
+        if header != MAGIC:
+            return io.BytesIO(header + pdf_file.read())
+        return io.BytesIO(decompress(header + pdf_file.read()))
 
-def extract_text_from_pdf(file_path: str, filename: str) -> tuple[str, int]:
+
+def extract_text_from_pdf(file_path: str, filename: str, extraction_mode: str = "plain") -> tuple[str, int]:
     try:
-        reader = PdfReader(file_path)
+        reader = PdfReader(open_pdf_file(file_path))
         page_count = len(reader.pages)
         
         if page_count == 0:
             logger.error(f"PDF file '{filename}' has no pages")
             raise HTTPException(status_code=400, detail="The PDF file has no pages")
+        # Pre-validation cannot always find the page count
+        validate_page_count(page_count, filename)
+
+        if extraction_mode == "layout":
+            page_texts = [page.extract_text(extraction_mode="layout") for page in reader.pages]
+        else:
+            page_texts = [page.extract_text() for page in reader.pages]
+        if settings.OCR_ENABLED:
+            page_texts = ocr_empty_pages(reader.pages, page_texts, filename)
+        # Page boundaries are kept for the layout parser and the page numbers of retrieval chunks
+        extracted_text = PAGE_BREAK.join(page_texts)
         
-        extracted_text = ""
-        for page in reader.pages:
-            extracted_text += page.extract_text()
-        
-        if not extracted_text:
+        if not extracted_text.strip(PAGE_BREAK):
             logger.error(f"No text could be extracted from '{filename}'")
             raise HTTPException(status_code=400, detail="No text could be extracted from the PDF")
         
@@ -110,16 +229,28 @@ def extract_text_from_pdf(file_path: str, filename: str) -> tuple[str, int]:
         raise HTTPException(status_code=500, detail=f"Error processing PDF file '{filename}'")
 
 
-def preprocess_extracted_text(extracted_text: str, filename: str) -> str:
+def ocr_empty_pages(pages, page_texts: list[str], filename: str) -> list[str]:
+    # Pages without a text layer are usually scans: recognize their images instead
+    empty = [number for number, text in enumerate(page_texts) if not text.strip()][:settings.OCR_MAX_PAGES]
+    if not empty:
+        return page_texts
+    recognized = ocr_pages({number: page_images(pages[number]) for number in empty}, filename)
+    return [recognized.get(number, text) for number, text in enumerate(page_texts)]
+
+
+def preprocess_extracted_text(extracted_text: str, filename: str, language: str = None) -> str:
     try:
-        nlp = spacy.load("en_core_web_sm")
-        return preprocess_text(extracted_text, nlp)
+        nlp = get_nlp(language or detect_language(extracted_text))
+        # Page by page, so the page breaks survive
+        return PAGE_BREAK.join(preprocess_text(page, nlp) for page in extracted_text.split(PAGE_BREAK))
     except Exception as nlp_error:
         logger.error(f"Error preprocessing text: {str(nlp_error)}")
         raise HTTPException(status_code=500, detail=f"Error preprocessing text: {str(nlp_error)}")
 
 
-def store_pdf_data(file: UploadFile, file_path: str, content: bytes, page_count: int, processed_text: str) -> str:
+def store_pdf_data(file: UploadFile, file_path: str, content: bytes, page_count: int, processed_text: str,
+                   chunks: list[str] = None, language: str = None, chunk_pages: list[int] = None) -> str:
+    created_at = datetime.now(timezone.utc)
     data_store = {
         "filename": os.path.basename(file_path),
         "original_filename": file.filename,
@@ -127,5 +258,20 @@ def store_pdf_data(file: UploadFile, file_path: str, content: bytes, page_count:
         "page_count": page_count,
         "size_kb": len(content) / 1024,
         "extracted_text": processed_text,
+        "content_hash": hashlib.sha256(content).hexdigest(),
+        "status": "ready",
+        "created_at": created_at,
+        "schema_version": CURRENT_SCHEMA_VERSION,
     }
+    if language:
+        data_store["language"] = language
+    # Layout mode stores its retrieval chunks, built from headings and tables
+    if chunks is not None:
+        data_store["extraction_mode"] = "layout"
+        data_store["chunks"] = chunks
+        if chunk_pages is not None:
+            data_store["chunk_pages"] = chunk_pages
+    # Expired records are removed by the expires_at TTL index, their files by the storage garbage collector
+    if settings.PDF_RETENTION_DAYS > 0:
+        data_store["expires_at"] = created_at + timedelta(days=settings.PDF_RETENTION_DAYS)
     return save_to_mongodb(data_store)
\ No newline at end of file
@@ -0,0 +1,328 @@
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+# Structural checks of an upload before it is saved and parsed. Only the header, the end of the file
+# and the few objects on the way to the page count are read: the cross-reference table (or stream)
+# the last startxref points to, its trailer, the catalog and the page tree root, and the object
+# stream holding them in PDF 1.5 files. The cost does not grow with the size of the file. Files that
+# cannot be PDFs (no header, no startxref, so pypdf fails on them too after scanning the whole file)
+# are rejected; anything the checks cannot follow, like a damaged xref that pypdf may still repair,
+# is left to the full parser with an unknown page count.
+
+# The header may follow up to 1 KB of other data, as readers accept
+HEADER_BYTES = 1024
+# startxref and the last trailer are at the end of the file, after at most some trailing garbage
+TAIL_BYTES = 16 * 1024
+# Longest catalog, page tree root or trailer read
+OBJECT_BYTES = 64 * 1024
+# Incremental updates chain their xref sections through /Prev; only this many are followed
+MAX_XREF_SECTIONS = 16
+# Largest decompressed cross-reference stream read, some 800,000 objects
+MAX_XREF_STREAM_BYTES = 8 * 1024 * 1024
+# Most of an object stream decompressed to find the catalog or page tree root in it
+MAX_OBJECT_STREAM_BYTES = 1024 * 1024
+
+_HEADER = re.compile(rb"%PDF-(\d\.\d)")
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_OBJECT = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\b")
+_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)\s*?[\r\n]+")
+_ENTRY = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_REFERENCE = rb"\s+(\d+)\s+(\d+)\s+R"
+_ROOT = re.compile(rb"/Root" + _REFERENCE)
+_PAGES = re.compile(rb"/Pages" + _REFERENCE)
+_COUNT = re.compile(rb"/Count\s+(\d+)")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_ENCRYPT = re.compile(rb"/Encrypt[\s/<\d]")
+_WIDTHS = re.compile(rb"/W\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s*\]")
+_INDEX = re.compile(rb"/Index\s*\[([\d\s]*)\]")
+_SIZE = re.compile(rb"/Size\s+(\d+)")
+_LENGTH = re.compile(rb"/Length\s+(\d+)\b(?!\s+\d+\s+R)")
+_LENGTH_REFERENCE = re.compile(rb"/Length" + _REFERENCE)
+_INTEGER = re.compile(rb"\s*(\d+)\s*$")
+_FILTER = re.compile(rb"/Filter\s*\[?\s*/(\w+)")
+_PREDICTOR = re.compile(rb"/Predictor\s+(\d+)")
+_COLUMNS = re.compile(rb"/Columns\s+(\d+)")
+_OBJECT_COUNT = re.compile(rb"/N\s+(\d+)")
+_FIRST = re.compile(rb"/First\s+(\d+)")
+
+
+class PdfValidationError(ValueError):
+    pass
+
+
+@dataclass
+class PdfInfo:
+    version: str
+    encrypted: bool
+    # None when the structure could not be followed to the page tree
+    page_count: Optional[int]
+
+
+class _Unreadable(Exception):
+    # The structure cannot be followed cheaply; the full parser decides
+    pass
+
+
+def inspect_pdf(content: bytes) -> PdfInfo:
+    """Check the structure of a PDF from a bounded number of bytes; raises PdfValidationError for files that are not PDFs."""
+    if not content:
+        raise PdfValidationError("The file is empty")
+    header = _HEADER.search(content, 0, HEADER_BYTES)
+    if header is None:
+        raise PdfValidationError("The file is not a PDF")
+    tail_start = max(0, len(content) - TAIL_BYTES)
+    startxrefs = list(_STARTXREF.finditer(content, tail_start))
+    if not startxrefs:
+        raise PdfValidationError("The PDF is truncated: its cross-reference table is missing")
+
+    version = header.group(1).decode("ascii")
+    try:
+        sections = _xref_sections(content, int(startxrefs[-1].group(1)))
+    except _Unreadable:
+        # The trailer is usually in the tail too
+        return PdfInfo(version, bool(_ENCRYPT.search(content, tail_start)), None)
+    encrypted = bool(_ENCRYPT.search(sections[0].trailer))
+    try:
+        page_count = _page_count(content, sections)
+    except _Unreadable:
+        page_count = None
+    return PdfInfo(version, encrypted, page_count)
+
+
+class _XrefSection:
+    __slots__ = ("trailer", "subsections", "rows", "widths")
+
+    def __init__(self, trailer: bytes, subsections: list, rows: bytes = None, widths: list = None):
+        self.trailer = trailer
+        # (first object, count, position of its first entry in the table or row in the stream)
+        self.subsections = subsections
+        # Decoded rows of a cross-reference stream and the widths of their three fields
+        self.rows = rows
+        self.widths = widths
+
+    def lookup(self, content: bytes, number: int):
+        # Offset of the object, or (object stream, index) for a compressed one; None if this section does not list it
+        for first, count, position in self.subsections:
+            if first <= number < first + count:
+                if self.rows is not None:
+                    return self._stream_lookup(position + number - first)
+                entry = _ENTRY.match(content, position + 20 * (number - first))
+                if entry is None:
+                    raise _Unreadable()
+                return int(entry.group(1)) if entry.group(3) == b"n" else None
+        return None
+
+    def _stream_lookup(self, row: int):
+        start = row * sum(self.widths)
+        if start + sum(self.widths) > len(self.rows):
+            raise _Unreadable()
+        fields = []
+        for width in self.widths:
+            fields.append(int.from_bytes(self.rows[start:start + width], "big"))
+            start += width
+        # A type field of zero width means type 1
+        kind = fields[0] if self.widths[0] else 1
+        if kind == 0:
+            return None
+        if kind == 2:
+            return fields[1], fields[2]
+        if kind != 1:
+            raise _Unreadable()
+        return fields[1]
+
+
+def _xref_sections(content: bytes, offset: int) -> list:
+    sections = []
+    seen = set()
+    while offset is not None and len(sections) < MAX_XREF_SECTIONS:
+        if offset in seen or offset >= len(content):
+            raise _Unreadable()
+        seen.add(offset)
+        start = offset
+        while start < len(content) and content[start] in b" \t\r\n\f\0":
+            start += 1
+        if content.startswith(b"xref", start):
+            section = _xref_table(content, start + 4)
+        else:
+            section = _xref_stream(content, offset)
+        sections.append(section)
+        previous = _PREV.search(section.trailer)
+        offset = int(previous.group(1)) if previous else None
+    if not sections:
+        raise _Unreadable()
+    return sections
+
+
+def _xref_table(content: bytes, position: int) -> _XrefSection:
+    # Entries are 20 bytes each, so subsections are skipped without reading them
+    subsections = []
+    while True:
+        subsection = _SUBSECTION.match(content, position)
+        if subsection is None:
+            break
+        first, count = int(subsection.group(1)), int(subsection.group(2))
+        subsections.append((first, count, subsection.end()))
+        position = subsection.end() + 20 * count
+    trailer = content.find(b"trailer", position, position + 64)
+    if trailer < 0:
+        raise _Unreadable()
+    return _XrefSection(_dictionary(content, trailer + 7), subsections)
+
+
+def _stream(content: bytes, offset: int, max_bytes: int, length: int = None, partial: bool = False) -> tuple:
+    # Dictionary and decoded data of the stream object at offset. Decompression stops after max_bytes;
+    # unless partial, a stream that does not fit is unreadable
+    if _OBJECT.match(content, offset) is None:
+        raise _Unreadable()
+    stream = content.find(b"stream", offset, offset + OBJECT_BYTES)
+    if stream < 0:
+        raise _Unreadable()
+    dictionary = content[offset:stream]
+    if length is None:
+        direct = _LENGTH.search(dictionary)
+        if direct is None:
+            raise _Unreadable()
+        length = int(direct.group(1))
+    start = stream + 6
+    start += 2 if content.startswith(b"\r\n", start) else 1
+    data = content[start:start + length]
+
+    filters = _FILTER.search(dictionary)
+    if filters is not None:
+        if filters.group(1) != b"FlateDecode":
+            raise _Unreadable()
+        try:
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(data, max_bytes)
+        except zlib.error:
+            raise _Unreadable()
+        if decompressor.unconsumed_tail and not partial:
+            raise _Unreadable()
+
+    predictor = _PREDICTOR.search(dictionary)
+    if predictor is not None and int(predictor.group(1)) >= 10:
+        columns = _COLUMNS.search(dictionary)
+        data = _png_unpredict(data, int(columns.group(1)) if columns else 1)
+    elif predictor is not None and int(predictor.group(1)) != 1:
+        raise _Unreadable()
+    return dictionary, data
+
+
+def _xref_stream(content: bytes, offset: int) -> _XrefSection:
+    dictionary, data = _stream(content, offset, MAX_XREF_STREAM_BYTES)
+    widths = _WIDTHS.search(dictionary)
+    if widths is None:
+        raise _Unreadable()
+    widths = [int(width) for width in widths.groups()]
+
+    index = _INDEX.search(dictionary)
+    if index is not None:
+        bounds = [int(value) for value in index.group(1).split()]
+    else:
+        size = _SIZE.search(dictionary)
+        if size is None:
+            raise _Unreadable()
+        bounds = [0, int(size.group(1))]
+    subsections = []
+    row = 0
+    for first, count in zip(bounds[::2], bounds[1::2]):
+        subsections.append((first, count, row))
+        row += count
+    return _XrefSection(dictionary, subsections, rows=data, widths=widths)
+
+
+def _png_unpredict(data: bytes, columns: int) -> bytes:
+    # Xref streams use the PNG "up" predictor (or none) on every row, after a filter type byte
+    # /Columns comes from the file: a row wider than the data is not allocated
+    if columns <= 0 or columns > len(data):
+        raise _Unreadable()
+    rows = []
+    previous = bytes(columns)
+    for start in range(0, len(data) - columns, columns + 1):
+        kind, row = data[start], data[start + 1:start + 1 + columns]
+        if kind == 2:
+            row = bytes((value + above) & 0xff for value, above in zip(row, previous))
+        elif kind != 0:
+            raise _Unreadable()
+        rows.append(row)
+        previous = row
+    return b"".join(rows)
+
+
+def _dictionary(content: bytes, position: int) -> bytes:
+    end = content.find(b"startxref", position, position + OBJECT_BYTES)
+    return content[position:end if end >= 0 else position + OBJECT_BYTES]
+
+
+def _locate(content: bytes, sections: list, number: int):
+    # The newest section listing the object wins
+    for section in sections:
+        location = section.lookup(content, number)
+        if location is not None:
+            return location
+    raise _Unreadable()
+
+
+def _read_object(content: bytes, sections: list, number: int, compressed: bool = True) -> bytes:
+    location = _locate(content, sections, number)
+    if isinstance(location, tuple):
+        if not compressed:
+            raise _Unreadable()
+        return _read_compressed_object(content, sections, number, location[0])
+    header = _OBJECT.match(content, location)
+    if header is None or int(header.group(1)) != number:
+        raise _Unreadable()
+    end = content.find(b"endobj", header.end(), header.end() + OBJECT_BYTES)
+    return content[header.end():end if end >= 0 else header.end() + OBJECT_BYTES]
+
+
+def _read_compressed_object(content: bytes, sections: list, number: int, stream_number: int) -> bytes:
+    # PDF 1.5 files keep most dictionaries in object streams: a header of object numbers and offsets,
+    # from /First on, then the objects. Only the start of the stream is decompressed
+    offset = _locate(content, sections, stream_number)
+    header = _OBJECT.match(content, offset) if isinstance(offset, int) else None
+    if header is None or int(header.group(1)) != stream_number:
+        raise _Unreadable()
+    length = None
+    stream = content.find(b"stream", offset, offset + OBJECT_BYTES)
+    reference = _LENGTH_REFERENCE.search(content, offset, stream) if stream >= 0 else None
+    if reference is not None:
+        # An object stream cannot hold its own length, so it is looked up uncompressed only
+        value = _INTEGER.match(_read_object(content, sections, int(reference.group(1)), compressed=False))
+        if value is None:
+            raise _Unreadable()
+        length = int(value.group(1))
+    dictionary, data = _stream(content, offset, MAX_OBJECT_STREAM_BYTES, length, partial=True)
+    count, first = _OBJECT_COUNT.search(dictionary), _FIRST.search(dictionary)
+    if count is None or first is None:
+        raise _Unreadable()
+    first = int(first.group(1))
+    try:
+        pairs = [int(value) for value in data[:first].split()]
+    except ValueError:
+        raise _Unreadable()
+    if len(pairs) != 2 * int(count.group(1)):
+        raise _Unreadable()
+    for index in range(0, len(pairs), 2):
+        if pairs[index] == number:
+            start = first + pairs[index + 1]
+            end = first + pairs[index + 3] if index + 3 < len(pairs) else len(data)
+            if start >= len(data) or end < start:
+                raise _Unreadable()
+            return data[start:min(end, start + OBJECT_BYTES)]
+    raise _Unreadable()
+
+
+def _page_count(content: bytes, sections: list) -> int:
+    root = next((_ROOT.search(section.trailer) for section in sections if _ROOT.search(section.trailer)), None)
+    if root is None:
+        raise _Unreadable()
+    pages = _PAGES.search(_read_object(content, sections, int(root.group(1))))
+    if pages is None:
+        raise _Unreadable()
+    count = _COUNT.search(_read_object(content, sections, int(pages.group(1))))
+    if count is None:
+        raise _Unreadable()
+    return int(count.group(1))
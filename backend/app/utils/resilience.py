@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.core.log_config import gemini_logger as logger
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit open, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class TransientError(Exception):
+    """Upstream failure that is worth retrying (timeouts, 5xx, rate limiting)."""
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class LatencyTracker:
+    # Sliding window of recent successful call latencies
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, fraction: float):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CircuitBreaker:
+    # closed -> open after failure_threshold consecutive failures; one trial call is let through after reset_timeout
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+            retry_after = max(1.0, self.reset_timeout - (self.clock() - self.opened_at))
+        raise CircuitOpenError(retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def release(self):
+        # The call ended without showing whether upstream is healthy (e.g. a rejected request): let another trial through
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive upstream failures")
+                self.opened_at = self.clock()
+
+
+class ResilientCaller:
+    """
+    Runs upstream calls with a deadline, retries transient errors with jittered exponential backoff,
+    optionally hedges a second attempt when the first is slower than the observed percentile, and
+    sheds load through a circuit breaker while upstream is failing.
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 hedging: bool = False, hedge_percentile: float = 0.95, breaker: CircuitBreaker = None,
+                 tracker: LatencyTracker = None, max_workers: int = 32, sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.tracker = tracker or LatencyTracker()
+        self.sleep = sleep
+        self.hedges = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+        self._random = random.Random()
+
+    def call(self, fn, deadline: Deadline):
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.allow()
+            try:
+                result = self._run_hedged(fn, deadline)
+            except TransientError as e:
+                self.breaker.record_failure()
+                backoff = self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                if attempt == self.max_attempts or backoff >= deadline.remaining():
+                    raise
+                logger.warning(f"Transient upstream error (attempt {attempt}/{self.max_attempts}), retrying in {backoff:.2f}s: {e}")
+                self.sleep(backoff)
+                continue
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                raise
+            except Exception:
+                # Errors that are not the upstream's health must still settle a half-open trial
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def _run_hedged(self, fn, deadline: Deadline):
+        if deadline.expired():
+            raise DeadlineExceeded()
+        started = time.monotonic()
+        pending = {self._executor.submit(fn, deadline)}
+
+        hedge_delay = self.tracker.percentile(self.hedge_percentile) if self.hedging else None
+        if hedge_delay is not None and hedge_delay < deadline.remaining():
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done:
+                # The first attempt is slower than usual: race a second one against it
+                self.hedges += 1
+                pending.add(self._executor.submit(fn, deadline))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    # The loser's result is discarded; it is cancelled if it has not started yet
+                    for loser in pending:
+                        loser.cancel()
+                    self.tracker.record(time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+            if not isinstance(error, TransientError):
+                raise error
+        if error is not None and not pending:
+            raise error
+        raise DeadlineExceeded()
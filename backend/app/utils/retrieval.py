@@ -0,0 +1,127 @@
+import bisect
+import math
+import re
+from collections import Counter
+from itertools import accumulate
+from app.core.config import settings
+from app.utils.language import NO_SPACE_SCRIPTS
+
+CHUNK_SIZE = settings.CHUNK_SIZE
+CHUNK_OVERLAP = settings.CHUNK_OVERLAP
+RETRIEVAL_TOP_K = settings.RETRIEVAL_TOP_K
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TERM_PATTERN = re.compile(r"\w+")
+# Text in scripts written without spaces is indexed by overlapping character pairs, and chunked by character
+_NO_SPACE_CHARACTER = re.compile(rf"[{NO_SPACE_SCRIPTS}]")
+_NO_SPACE_TERM_PATTERN = re.compile(rf"[{NO_SPACE_SCRIPTS}]+|[^\W{NO_SPACE_SCRIPTS}]+")
+_NO_SPACE_UNIT_PATTERN = re.compile(rf"[{NO_SPACE_SCRIPTS}]|[^\s{NO_SPACE_SCRIPTS}]+")
+
+# Questions that ask what the whole document is about
+_OVERVIEW_PATTERN = re.compile(
+    r"^\s*(what\s+is\s+(this|the)\s+(document|pdf|file|paper)\s+about"
+    r"|what\s+(is|are)\s+the\s+main\s+(topic|topics|idea|ideas|point|points)"
+    r"|(give\s+me\s+)?(an?\s+)?(overview|summary|tl;?dr)(\s+of\s+(this|the)\s+(document|pdf|file|paper))?\W*$"
+    r"|summari[sz]e\s+(this|the)\s+(document|pdf|file|paper))",
+    re.IGNORECASE,
+)
+
+
+def tokenize(text: str) -> list[str]:
+    if not _NO_SPACE_CHARACTER.search(text):
+        return [term.lower() for term in _TERM_PATTERN.findall(text)]
+    terms = []
+    for term in _NO_SPACE_TERM_PATTERN.findall(text):
+        if _NO_SPACE_CHARACTER.match(term):
+            terms.extend(term[i:i + 2] for i in range(max(1, len(term) - 1)))
+        else:
+            terms.append(term.lower())
+    return terms
+
+
+def is_overview_question(message) -> bool:
+    return isinstance(message, str) and bool(_OVERVIEW_PATTERN.search(message))
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    # Split text into overlapping windows of words
+    if _NO_SPACE_CHARACTER.search(text):
+        return _chunk_units(text, chunk_size, overlap)
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, chunk_size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_size]))
+        if start + chunk_size >= len(words):
+            break
+    return chunks
+
+
+def chunk_pages(texts: list[str], pages, count: int, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[int]:
+    # Page of each of the count chunks chunk_text makes of the texts joined, the page of their first word;
+    # texts[i] is on pages[i]
+    joined = " ".join(texts)
+    if _NO_SPACE_CHARACTER.search(joined):
+        units = [len(_NO_SPACE_UNIT_PATTERN.findall(text)) for text in texts]
+    else:
+        units = [len(text.split()) for text in texts]
+    starts = list(accumulate(units, initial=0))[:-1]
+    pages = list(pages)
+    step = max(1, chunk_size - overlap)
+    return [pages[bisect.bisect_right(starts, index * step) - 1] for index in range(count)]
+
+
+def _chunk_units(text: str, chunk_size: int, overlap: int) -> list[str]:
+    # Like chunk_text, counting every character of a script without spaces as a word
+    units = [match.span() for match in _NO_SPACE_UNIT_PATTERN.finditer(text)]
+    step = max(1, chunk_size - overlap)
+    chunks = []
+    for start in range(0, len(units), step):
+        end = min(start + chunk_size, len(units))
+        chunks.append(" ".join(text[units[start][0]:units[end - 1][1]].split()))
+        if end >= len(units):
+            break
+    return chunks
+
+
+def index_chunks(chunks: list[str]) -> list[Counter]:
+    # Term counts of every chunk; pass them to rank_chunks to rank several queries against the same chunks
+    return [Counter(tokenize(chunk)) for chunk in chunks]
+
+
+def rank_chunks(chunks: list[str], query: str, chunk_terms: list[Counter] = None) -> list[tuple[int, float]]:
+    # Score every chunk against the query with BM25, best first
+    query_terms = set(tokenize(query))
+    if not chunks or not query_terms:
+        return []
+
+    chunk_terms = chunk_terms if chunk_terms is not None else index_chunks(chunks)
+    avg_length = sum(sum(terms.values()) for terms in chunk_terms) / len(chunks) or 1
+    document_frequency = Counter(term for terms in chunk_terms for term in query_terms if term in terms)
+
+    scores = []
+    for index, terms in enumerate(chunk_terms):
+        length = sum(terms.values())
+        score = 0.0
+        for term in query_terms:
+            frequency = terms.get(term)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(chunks) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+        scores.append((index, score))
+    scores.sort(key=lambda item: item[1], reverse=True)
+    return scores
+
+
+def select_relevant_chunks(chunks: list[str], query: str, top_k: int = RETRIEVAL_TOP_K) -> list[str]:
+    # Return the top_k most relevant chunks, in document order
+    ranked = [index for index, score in rank_chunks(chunks, query) if score > 0][:top_k]
+    if not ranked:
+        ranked = list(range(min(top_k, len(chunks))))
+    return [chunks[index] for index in sorted(ranked)]
@@ -0,0 +1,111 @@
+import re
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from app.db.mongodb import get_database
+from app.core.log_config import session_logger as logger
+from app.core.config import settings
+from app.utils.text_processing import count_tokens
+
+SESSION_MAX_TURNS = settings.SESSION_MAX_TURNS
+SESSION_HISTORY_TOKENS = settings.SESSION_HISTORY_TOKENS
+SESSION_SUMMARY_TOKENS = settings.SESSION_SUMMARY_TOKENS
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _session_object_id(session_id: str) -> ObjectId:
+    try:
+        return ObjectId(session_id)
+    except (InvalidId, TypeError):
+        logger.error(f"Invalid session ID: {session_id}")
+        raise HTTPException(status_code=404, detail=f"Session with ID {session_id} not found")
+
+
+def create_session(pdf_id: str) -> str:
+    db = get_database()
+    try:
+        pdf_exists = db.pdfs.count_documents({"_id": ObjectId(pdf_id)}, limit=1) > 0
+    except (InvalidId, TypeError):
+        pdf_exists = False
+    if not pdf_exists:
+        raise HTTPException(status_code=404, detail=f"PDF with ID {pdf_id} not found")
+
+    now = datetime.now(timezone.utc)
+    result = db.chat_sessions.insert_one({
+        "pdf_id": pdf_id,
+        "summary": "",
+        "turns": [],
+        "created_at": now,
+        "updated_at": now,
+    })
+    logger.info(f"Created chat session {result.inserted_id} for PDF {pdf_id}")
+    return str(result.inserted_id)
+
+
+def load_session(session_id: str, pdf_id: str) -> dict:
+    # One round trip: the summary and the rolling window live in the same document
+    db = get_database()
+    session = db.chat_sessions.find_one({"_id": _session_object_id(session_id), "pdf_id": pdf_id})
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session with ID {session_id} not found")
+    return session
+
+
+def summarize_turns(summary: str, turns: list[dict], budget: int = SESSION_SUMMARY_TOKENS) -> str:
+    # Fold turns leaving the window into the summary: the question plus the first sentence of the answer.
+    # This is extractive on purpose, so compacting history never costs an extra LLM call.
+    lines = [line for line in summary.split("\n") if line]
+    for turn in turns:
+        first_sentence = _SENTENCE_END.split(turn["answer"].strip(), maxsplit=1)[0]
+        lines.append(f"Q: {turn['question']} A: {first_sentence}")
+
+    # Drop the oldest lines until the summary fits its budget
+    while lines and count_tokens("\n".join(lines)) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def format_history(session: dict, budget: int = SESSION_HISTORY_TOKENS) -> str:
+    # Render the summary and as many of the most recent turns as fit in the token budget
+    sections = []
+    used = 0
+    summary = session.get("summary") or ""
+    if summary:
+        used = count_tokens(summary)
+        sections.append(f"Summary of earlier conversation:\n{summary}")
+
+    recent = []
+    for turn in reversed(session.get("turns", [])):
+        rendered = f"User: {turn['question']}\nAssistant: {turn['answer']}"
+        tokens = count_tokens(rendered)
+        if used + tokens > budget:
+            break
+        recent.append(rendered)
+        used += tokens
+    if recent:
+        sections.append("Recent conversation:\n" + "\n".join(reversed(recent)))
+    return "\n\n".join(sections)
+
+
+def append_turn(session: dict, question: str, answer: str, max_turns: int = SESSION_MAX_TURNS) -> bool:
+    # Turns pushed out of the window by $slice are folded into the summary in the same update
+    turns = session.get("turns", [])
+    overflow = len(turns) + 1 - max_turns
+    update = {
+        "$push": {"turns": {"$each": [{"question": question, "answer": answer}], "$slice": -max_turns}},
+        "$set": {"updated_at": datetime.now(timezone.utc)},
+    }
+    if overflow > 0:
+        update["$set"]["summary"] = summarize_turns(session.get("summary") or "", turns[:overflow])
+
+    db = get_database()
+    result = db.chat_sessions.update_one({"_id": session["_id"]}, update)
+    return result.modified_count > 0
+
+
+def delete_sessions(pdf_id: str) -> int:
+    db = get_database()
+    result = db.chat_sessions.delete_many({"pdf_id": pdf_id})
+    return result.deleted_count
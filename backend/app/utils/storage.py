@@ -0,0 +1,285 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from app.core.config import settings
+from app.core.log_config import storage_logger as logger
+
+# Uploaded PDFs are written through a storage backend. A file is addressed by its name when it is
+# written and listed, and by its location (the file_path stored on the PDF record) when it is read
+# or deleted: a path for local storage, an s3:// URI for S3-compatible storage.
+
+
+def _read_file_range(pdf_file, start: int, end: int) -> bytes:
+    with pdf_file:
+        if start < 0:
+            pdf_file.seek(max(0, os.fstat(pdf_file.fileno()).st_size + start))
+            return pdf_file.read()
+        pdf_file.seek(start)
+        return pdf_file.read(end - start + 1)
+
+
+def scan_directory(directory: str, cursor: str, limit: int) -> tuple:
+    # Up to limit files of the directory after the cursor, the number of directory entries read before.
+    # Directory order is stable between runs, nothing is sorted; files added or removed in between shift
+    # the order and are caught up on the next pass
+    skip = int(cursor) if cursor else 0
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for position, entry in enumerate(entries):
+                if position < skip:
+                    continue
+                if len(files) == limit:
+                    return files, str(position)
+                if entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, entry.path, stat.st_size, stat.st_mtime))
+    except FileNotFoundError:
+        pass
+    return files, ""
+
+
+class StorageBackend:
+    root = ""
+
+    def exists(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def save(self, name: str, data: bytes) -> str:
+        raise NotImplementedError
+
+    def open(self, location: str):
+        # A binary file, opened for reading, that can be seeked, e.g. by pypdf
+        raise NotImplementedError
+
+    def read_range(self, location: str, start: int, end: int) -> bytes:
+        # Bytes start..end (inclusive, like an HTTP Range); a negative start reads the last -start bytes
+        raise NotImplementedError
+
+    def delete(self, location: str) -> bool:
+        raise NotImplementedError
+
+    def scan(self, cursor: str, limit: int) -> tuple:
+        # Up to limit files as (name, location, size, modified timestamp), and the cursor to continue
+        # from; an empty cursor starts over, and is returned at the end of the listing
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str = settings.PDF_UPLOAD_PATH):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.root, name))
+
+    def save(self, name: str, data: bytes) -> str:
+        file_path = os.path.join(self.root, name)
+        with open(file_path, "wb") as pdf_file:
+            pdf_file.write(data)
+        return file_path
+
+    def open(self, location: str):
+        return open(location, "rb")
+
+    def read_range(self, location: str, start: int, end: int) -> bytes:
+        return _read_file_range(open(location, "rb"), start, end)
+
+    def delete(self, location: str) -> bool:
+        try:
+            os.remove(location)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def scan(self, cursor: str, limit: int) -> tuple:
+        return scan_directory(self.root, cursor, limit)
+
+
+class ReadThroughCache:
+    # Local copies of remote files, evicted least recently used first once max_bytes is exceeded
+    def __init__(self, directory: str = settings.STORAGE_CACHE_DIR, max_bytes: int = settings.STORAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # Files cached by a previous run are reused, oldest first in eviction order
+        with os.scandir(directory) as entries:
+            cached = [entry for entry in entries if entry.is_file() and not entry.name.endswith(".tmp")]
+            for entry in sorted(cached, key=lambda entry: entry.stat().st_mtime):
+                self._entries[entry.name] = entry.stat().st_size
+                self._size += entry.stat().st_size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def open(self, key: str):
+        # The copy is opened under the lock, so a concurrent put cannot evict it in between; once open,
+        # it stays readable even if it is evicted
+        path = self._path(key)
+        with self._lock:
+            if os.path.basename(path) not in self._entries:
+                return None
+            try:
+                cache_file = open(path, "rb")
+            except FileNotFoundError:
+                # Removed behind our back: read from the backend again
+                self._size -= self._entries.pop(os.path.basename(path))
+                return None
+            self._entries.move_to_end(os.path.basename(path))
+        return cache_file
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self._path(key)
+        # Write to a temporary file first so readers never see a partial copy
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as cache_file:
+            cache_file.write(data)
+        os.replace(temporary_path, path)
+        with self._lock:
+            self._size += len(data) - self._entries.pop(os.path.basename(path), 0)
+            self._entries[os.path.basename(path)] = len(data)
+            self._evict(keep=os.path.basename(path))
+        return path
+
+    def discard(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            self._size -= self._entries.pop(os.path.basename(path), 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: str = None):
+        while self._size > self.max_bytes and self._entries:
+            name, size = next(iter(self._entries.items()))
+            if name == keep:
+                break
+            del self._entries[name]
+            self._size -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class S3Storage(StorageBackend):
+    def __init__(self, bucket: str = settings.S3_BUCKET, prefix: str = settings.S3_PREFIX, client=None,
+                 cache: ReadThroughCache = None, part_size: int = settings.S3_MULTIPART_CHUNK_BYTES):
+        if client is None:
+            # boto3 is optional: only S3 deployments need it
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("STORAGE_BACKEND=s3 requires the boto3 package")
+            client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL or None,
+                region_name=settings.S3_REGION or None,
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.root = f"s3://{bucket}/{prefix}"
+        self.cache = cache if cache is not None else ReadThroughCache()
+        # S3 requires parts of at least 5 MiB, except the last one
+        self.part_size = max(part_size, 5 * 1024 * 1024)
+
+    def _key(self, location: str) -> str:
+        if location.startswith("s3://"):
+            return location[len(f"s3://{self.bucket}/"):]
+        return self.prefix + location
+
+    def exists(self, name: str) -> bool:
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self._key(name), MaxKeys=1)
+        return any(item["Key"] == self._key(name) for item in response.get("Contents", []))
+
+    def save(self, name: str, data: bytes) -> str:
+        key = self._key(name)
+        if len(data) <= self.part_size:
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+        else:
+            self._multipart_upload(key, data)
+        # Write-through: the upload is parsed right after it is saved
+        self.cache.put(key, data)
+        logger.info(f"Stored {len(data)} bytes at s3://{self.bucket}/{key}")
+        return f"s3://{self.bucket}/{key}"
+
+    def _multipart_upload(self, key: str, data: bytes):
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)["UploadId"]
+        try:
+            parts = []
+            view = memoryview(data)
+            for number, offset in enumerate(range(0, len(data), self.part_size), start=1):
+                response = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                                                   Body=bytes(view[offset:offset + self.part_size]))
+                parts.append({"ETag": response["ETag"], "PartNumber": number})
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id,
+                                                  MultipartUpload={"Parts": parts})
+        except Exception:
+            # Incomplete uploads are billed until aborted
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+
+    def open(self, location: str):
+        key = self._key(location)
+        cache_file = self.cache.open(key)
+        if cache_file is not None:
+            return cache_file
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        self.cache.put(key, body)
+        # The downloaded copy is read from memory: it may already be evicted by a concurrent put
+        return io.BytesIO(body)
+
+    def read_range(self, location: str, start: int, end: int) -> bytes:
+        key = self._key(location)
+        cache_file = self.cache.open(key)
+        if cache_file is not None:
+            return _read_file_range(cache_file, start, end)
+        byte_range = f"bytes={start}" if start < 0 else f"bytes={start}-{end}"
+        return self.client.get_object(Bucket=self.bucket, Key=key, Range=byte_range)["Body"].read()
+
+    def delete(self, location: str) -> bool:
+        key = self._key(location)
+        self.cache.discard(key)
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def scan(self, cursor: str, limit: int) -> tuple:
+        # Keys are listed in order, so the last key returned is the cursor
+        files = []
+        while len(files) < limit:
+            response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self.prefix, StartAfter=cursor or self.prefix,
+                                                   MaxKeys=min(1000, limit - len(files)))
+            for item in response.get("Contents", []):
+                name = item["Key"][len(self.prefix):]
+                files.append((name, f"s3://{self.bucket}/{item['Key']}", item["Size"], item["LastModified"].timestamp()))
+                cursor = item["Key"]
+            if not response.get("IsTruncated"):
+                return files, ""
+        return files, cursor
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if settings.STORAGE_BACKEND == "s3":
+                    _storage = S3Storage()
+                elif settings.STORAGE_BACKEND == "local":
+                    _storage = LocalStorage()
+                else:
+                    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
+                logger.info(f"Using {settings.STORAGE_BACKEND} storage at {_storage.root}")
+    return _storage
@@ -0,0 +1,109 @@
+import threading
+import zlib
+from app.core.config import settings
+from app.core.log_config import data_logger as logger
+
+# zstandard is optional; without it the zlib codec from the standard library is used
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed values start with MAGIC and a codec byte. Anything else (a str, or raw PDF bytes
+# starting with %PDF) is stored as is, so records and files written before compression was
+# enabled are read unchanged.
+MAGIC = b"PCZ"
+CODEC_IDS = {"zlib": b"\x01", "zstd": b"\x02"}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+_local = threading.local()
+_dictionary = None
+_dictionary_lock = threading.Lock()
+
+
+def resolve_codec(name: str = None) -> str:
+    name = name or settings.STORAGE_CODEC
+    if name not in CODEC_IDS:
+        raise ValueError(f"Unknown storage codec: {name}")
+    if name == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to zlib")
+        return "zlib"
+    return name
+
+
+def get_dictionary():
+    # Trained dictionary shared by all workers, see train_dictionary()
+    global _dictionary
+    if _dictionary is None and settings.ZSTD_DICTIONARY_PATH and zstandard is not None:
+        with _dictionary_lock:
+            if _dictionary is None:
+                with open(settings.ZSTD_DICTIONARY_PATH, "rb") as dictionary_file:
+                    _dictionary = zstandard.ZstdCompressionDict(dictionary_file.read())
+                logger.info(f"Loaded zstd dictionary {_dictionary.dict_id()} from {settings.ZSTD_DICTIONARY_PATH}")
+    return _dictionary
+
+
+def train_dictionary(samples: list[bytes], size: int = 112640) -> bytes:
+    if zstandard is None:
+        raise RuntimeError("Training a dictionary requires the zstandard package")
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+def _zstd_compressor():
+    # zstd (de)compressor objects are not thread-safe, keep one per thread
+    if getattr(_local, "compressor", None) is None:
+        dictionary = get_dictionary()
+        _local.compressor = zstandard.ZstdCompressor(level=settings.STORAGE_COMPRESSION_LEVEL, dict_data=dictionary)
+        _local.decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return _local.compressor
+
+
+def _zstd_decompressor():
+    _zstd_compressor()
+    return _local.decompressor
+
+
+def compress(data: bytes, codec: str = None) -> bytes:
+    codec = resolve_codec(codec)
+    if codec == "zstd":
+        payload = _zstd_compressor().compress(data)
+    else:
+        payload = zlib.compress(data, min(settings.STORAGE_COMPRESSION_LEVEL, 9))
+    return MAGIC + CODEC_IDS[codec] + payload
+
+
+def decompress(data: bytes) -> bytes:
+    if not data.startswith(MAGIC):
+        return data
+    codec = CODEC_NAMES.get(data[len(MAGIC):len(MAGIC) + 1])
+    payload = data[len(MAGIC) + 1:]
+    if codec == "zlib":
+        return zlib.decompress(payload)
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Data was compressed with zstd, but zstandard is not installed")
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        dictionary = get_dictionary()
+        if dict_id and (dictionary is None or dictionary.dict_id() != dict_id):
+            raise RuntimeError(f"Data was compressed with zstd dictionary {dict_id}, which is not loaded")
+        return _zstd_decompressor().decompress(payload)
+    raise ValueError("Unknown codec in compressed data")
+
+
+def encode_text(text: str):
+    # Extracted text as stored in MongoDB: a str, or compressed bytes (BSON binary)
+    if not settings.COMPRESS_TEXT:
+        return text
+    return compress(text.encode("utf-8"))
+
+
+def decode_text(value) -> str:
+    if isinstance(value, str):
+        return value
+    return decompress(bytes(value)).decode("utf-8")
+
+
+def encode_file(content: bytes) -> bytes:
+    if not settings.COMPRESS_PDF_FILES:
+        return content
+    return compress(content)
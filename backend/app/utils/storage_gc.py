@@ -0,0 +1,129 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.core.config import settings
+from app.core.log_config import storage_logger as logger
+from app.db.mongodb import get_database
+from app.utils.chunk_store import chunk_stores, scan_index_files
+from app.utils.data_utils import find_stored_filenames, find_stored_ids
+from app.utils.storage import get_storage
+
+# One document holds the collector's lease and where its scans stopped
+STATE_ID = "storage_gc"
+
+
+# Reconciles the file storage against MongoDB: files without a PDF record (deleted or expired
+# records, failed uploads) are removed, and so are the retrieval indexes of PDFs without a record.
+# Each run checks at most max_files files of each kind, batch_size per MongoDB query, and the next
+# run resumes where the previous one stopped, from a cursor kept in MongoDB. Every worker starts a
+# collector, but only the one holding the lease runs; another takes over once it expires.
+class StorageCollector:
+    def __init__(self, storage=None,
+                 batch_size: int = settings.STORAGE_GC_BATCH_SIZE,
+                 max_files: int = settings.STORAGE_GC_MAX_FILES,
+                 grace_seconds: int = settings.STORAGE_GC_GRACE_SECONDS,
+                 lease_seconds: int = settings.STORAGE_GC_LEASE_SECONDS,
+                 clock=time.time):
+        self._storage = storage
+        self.batch_size = batch_size
+        self.max_files = max_files
+        self.grace_seconds = grace_seconds
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def storage(self):
+        return self._storage if self._storage is not None else get_storage()
+
+    def _acquire(self):
+        # The state document if this collector holds the lease (renewed on every run), None otherwise
+        now = self.clock()
+        try:
+            return get_database().gc_state.find_one_and_update(
+                {"_id": STATE_ID, "$or": [{"owner": self.owner}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"owner": self.owner, "expires_at": now + self.lease_seconds}},
+                upsert=True, return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # Held by another collector
+            return None
+
+    def _save_cursors(self, cursors: dict):
+        get_database().gc_state.update_one({"_id": STATE_ID, "owner": self.owner}, {"$set": {"cursors": cursors}})
+
+    def run_once(self) -> dict:
+        started = time.perf_counter()
+        stats = {"scanned": 0, "removed": 0, "bytes_freed": 0, "bytes_in_use": 0, "indexes_removed": 0}
+        state = self._acquire()
+        if state is None:
+            stats["skipped"] = True
+            return stats
+        cursors = state.get("cursors") or {}
+
+        files, cursors["files"] = self.storage.scan(cursors.get("files", ""), self.max_files)
+        files = [entry for entry in files if entry[0].endswith(".pdf")]
+        cutoff = self.clock() - self.grace_seconds
+        for offset in range(0, len(files), self.batch_size):
+            batch = files[offset:offset + self.batch_size]
+            stored = find_stored_filenames([name for name, _, _, _ in batch])
+            stats["scanned"] += len(batch)
+            for name, location, size, modified in batch:
+                # Young files may belong to an upload whose record is not written yet
+                if name in stored or modified > cutoff:
+                    stats["bytes_in_use"] += size
+                    continue
+                if self.storage.delete(location):
+                    stats["removed"] += 1
+                    stats["bytes_freed"] += size
+
+        # An index is only written for a loaded record, so it needs no grace period; records removed
+        # by the expires_at TTL index leave theirs behind
+        indexes, cursors["indexes"] = scan_index_files(cursors.get("indexes", ""), self.max_files)
+        for offset in range(0, len(indexes), self.batch_size):
+            batch = indexes[offset:offset + self.batch_size]
+            stored = find_stored_ids({pdf_id for _, pdf_id, _ in batch})
+            orphans = {}
+            for _, pdf_id, size in batch:
+                if pdf_id not in stored:
+                    orphans[pdf_id] = orphans.get(pdf_id, 0) + size
+            for pdf_id, size in orphans.items():
+                removed = chunk_stores.remove(pdf_id)
+                if removed:
+                    stats["indexes_removed"] += removed
+                    stats["bytes_freed"] += size
+
+        self._save_cursors(cursors)
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        logger.info(f"Storage GC run: {stats}")
+        return stats
+
+    def _loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Storage GC run failed: {str(e)}")
+
+    def start(self, interval: float = settings.STORAGE_GC_INTERVAL_SECONDS):
+        if self._thread is not None:
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="storage-gc", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+storage_collector = StorageCollector()
@@ -0,0 +1,74 @@
+import math
+from collections import Counter
+from app.core.config import settings
+from app.core.log_config import summary_logger as logger
+from app.utils.data_utils import update_mongodb
+from app.utils.gemini_utils import TokenBucket, generate_text
+from app.utils.language import DEFAULT_LANGUAGE, stop_words
+from app.utils.retrieval import chunk_text, tokenize
+
+SUMMARY_CHUNK_WORDS = settings.SUMMARY_CHUNK_WORDS
+SUMMARY_FAN_IN = settings.SUMMARY_FAN_IN
+OUTLINE_KEYWORDS = 8
+
+# Background summaries spend their own token budget, so ingest never starves chat (or the reverse)
+summary_token_bucket = TokenBucket(settings.SUMMARY_TOKEN_LIMIT_PER_MINUTE, settings.SUMMARY_TOKEN_LIMIT_PER_DAY)
+
+MAP_PROMPT = """
+Summarize the following part of a document in at most 5 sentences.
+Keep names, numbers and conclusions; do not add information that is not in the text.
+
+Text: {text}
+"""
+
+REDUCE_PROMPT = """
+The following are summaries of consecutive parts of one document.
+Combine them into a single summary of at most 8 sentences that describes what the document is about.
+
+Summaries:
+{summaries}
+"""
+
+
+def hierarchical_summary(text: str) -> str:
+    # Map: summarize each chunk. Reduce: combine SUMMARY_FAN_IN summaries at a time until one is left.
+    summaries = [generate_text(MAP_PROMPT.format(text=chunk), bucket=summary_token_bucket)
+                 for chunk in chunk_text(text, SUMMARY_CHUNK_WORDS, 0)]
+    while len(summaries) > 1:
+        groups = [summaries[i:i + SUMMARY_FAN_IN] for i in range(0, len(summaries), SUMMARY_FAN_IN)]
+        summaries = [generate_text(REDUCE_PROMPT.format(summaries="\n\n".join(group)), bucket=summary_token_bucket)
+                     for group in groups]
+    return summaries[0] if summaries else ""
+
+
+def keyword_outline(text: str, keywords_per_section: int = OUTLINE_KEYWORDS, language: str = DEFAULT_LANGUAGE) -> list[dict]:
+    # TF-IDF keywords for every section of the document, computed locally
+    excluded = stop_words(language)
+    sections = [Counter(term for term in tokenize(chunk) if len(term) > 2 and term not in excluded and not term.isdigit())
+                for chunk in chunk_text(text, SUMMARY_CHUNK_WORDS, 0)]
+    document_frequency = Counter(term for terms in sections for term in terms)
+    outline = []
+    for index, terms in enumerate(sections):
+        scores = {term: count * math.log(1 + len(sections) / document_frequency[term]) for term, count in terms.items()}
+        keywords = sorted(scores, key=lambda term: (-scores[term], term))[:keywords_per_section]
+        outline.append({"section": index + 1, "keywords": keywords})
+    return outline
+
+
+def precompute_summary(pdf_id: str, text: str, language: str = DEFAULT_LANGUAGE):
+    # Background ingest stage: store the summary and outline on the PDF record
+    logger.info(f"Precomputing summary for PDF {pdf_id}")
+    try:
+        update_mongodb(pdf_id, {"summary_status": "processing"})
+        summary = hierarchical_summary(text)
+        outline = keyword_outline(text, language=language)
+        update_mongodb(pdf_id, {"summary": summary, "outline": outline, "summary_status": "ready"})
+    except Exception as e:
+        logger.error(f"Error precomputing summary for PDF {pdf_id}: {getattr(e, 'detail', e)}")
+        try:
+            update_mongodb(pdf_id, {"summary_status": "failed"})
+        except Exception as update_error:
+            logger.error(f"Could not mark the summary of PDF {pdf_id} as failed: {update_error}")
+        return
+    logger.info(f"Stored summary for PDF {pdf_id}")
+
@@ -1,15 +1,24 @@
 import re
 import unicodedata
+from app.utils.language import NO_SPACE_SCRIPTS, folds_accents
+
+# Accents decomposed by NFKD
+_COMBINING_ACCENTS = re.compile(r'[\u0300-\u036f]')
+# Special characters; the vowel signs and marks of Indic, Thai and Lao, Arabic and Hebrew script are kept
+_SPECIAL_CHARACTERS = re.compile(r'[^\w\s\'\u0591-\u05c7\u064b-\u065f\u0670\u0900-\u0dff\u0e00-\u0eff]')
 
 def preprocess_text(text: str, nlp) -> str:
-    # Normalize unicode characters
-    text = unicodedata.normalize('NFKD', text)
+    # Normalize unicode characters; Latin script languages lose their accents ("ş" becomes "s")
+    if folds_accents(getattr(nlp, "lang", None)):
+        text = _COMBINING_ACCENTS.sub('', unicodedata.normalize('NFKD', text))
+    else:
+        text = unicodedata.normalize('NFKC', text)
     
     # Replace newlines and carriage returns with spaces
     text = re.sub(r'[\n\r]', ' ', text)
     
     # Remove special characters except apostrophes
-    text = re.sub(r'[^\w\s\']', ' ', text)
+    text = _SPECIAL_CHARACTERS.sub(' ', text)
     
     # Tokenize the text
     doc = nlp(text)
@@ -20,4 +29,18 @@ def preprocess_text(text: str, nlp) -> str:
     # Join tokens and remove extra whitespace
     processed_text = ' '.join(tokens)
     
-    return processed_text
\ No newline at end of file
+    return processed_text
+
+
+# Gemini's SentencePiece tokenizer is only reachable through the API, so tokens are counted locally:
+# words and punctuation are split like the model's pre-tokenizer, and long words count as several
+# subword pieces. This tracks the API's count closely enough for budgeting without a network call.
+# In scripts written without spaces, every character counts as a token.
+SUBWORD_CHARS = 4
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_NO_SPACE_TOKEN_PATTERN = re.compile(rf"[{NO_SPACE_SCRIPTS}]|[^\W{NO_SPACE_SCRIPTS}]+|[^\w\s]")
+_NO_SPACE_CHARACTER = re.compile(rf"[{NO_SPACE_SCRIPTS}]")
+
+def count_tokens(text: str) -> int:
+    pattern = _NO_SPACE_TOKEN_PATTERN if _NO_SPACE_CHARACTER.search(text) else _TOKEN_PATTERN
+    return sum((len(piece) + SUBWORD_CHARS - 1) // SUBWORD_CHARS for piece in pattern.findall(text))
@@ -0,0 +1,47 @@
+"""
+Request hot paths through the app: upload on /v1/pdf and questions on /v1/chat/{pdf_id}, with
+mongomock and the fake LLM provider answering without latency, so only the service's own cost is timed.
+"""
+import pytest
+from app.utils.gemini_utils import TokenBucket
+
+QUESTION = "What was the revenue margin of the North region compared to the forecast?"
+
+
+def upload(client, content: bytes, extraction_mode: str) -> str:
+    response = client.post("/v1/pdf", params={"extraction_mode": extraction_mode},
+                           files={"file": ("report.pdf", content, "application/pdf")})
+    assert response.status_code == 200, response.text
+    return response.json()["pdf_id"]
+
+
+def test_upload_pdf_layout(benchmark, rounds, client, pdf_content):
+    pdf_id = benchmark.pedantic(upload, args=(client, pdf_content, "layout"), rounds=rounds, warmup_rounds=1)
+    assert pdf_id
+
+
+def test_upload_pdf_plain(benchmark, rounds, client, pdf_content, nlp):
+    pdf_id = benchmark.pedantic(upload, args=(client, pdf_content, "plain"), rounds=rounds, warmup_rounds=1)
+    assert pdf_id
+
+
+def test_chat(benchmark, rounds, client, pdf_content):
+    pdf_id = upload(client, pdf_content, "layout")
+
+    def chat():
+        response = client.post(f"/v1/chat/{pdf_id}", json={"message": QUESTION})
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    assert benchmark.pedantic(chat, rounds=rounds * 2, warmup_rounds=1)
+
+
+@pytest.mark.parametrize("tokens", [1, 500])
+def test_token_bucket_consume(benchmark, tokens):
+    # A single call takes about a microsecond, too little to time reliably: rounds of 1000 calls are timed
+    bucket = TokenBucket(10 ** 12, 10 ** 12)
+
+    def consume():
+        return all(bucket.consume(tokens) for _ in range(1000))
+
+    assert benchmark(consume)
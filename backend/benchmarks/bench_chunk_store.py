@@ -0,0 +1,73 @@
+"""
+Retrieval index of a document: building, opening and ranking with the compact chunk store, against
+the list of chunks, and the memory both take per million tokens of the document.
+"""
+import tracemalloc
+from collections import Counter
+from app.utils.chunk_store import ChunkStore
+from app.utils.retrieval import chunk_text, rank_chunks, index_chunks, tokenize
+from app.utils.text_processing import count_tokens
+
+QUERY = "How is surplus energy stored and what does the report say about grid capacity?"
+
+
+def traced_bytes(function):
+    # Memory still allocated by the result of function, which is returned with it
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = function()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def chunk_dicts(chunks: list[str]) -> list[dict]:
+    return [{"text": chunk, "page": 0, "terms": Counter(tokenize(chunk))} for chunk in chunks]
+
+
+def test_build_chunk_store(benchmark, rounds, document_text):
+    chunks = chunk_text(document_text)
+    store = benchmark.pedantic(ChunkStore.build, args=(chunks,), rounds=rounds, warmup_rounds=1)
+    assert len(store) == len(chunks)
+
+
+def test_open_chunk_store(benchmark, rounds, document_text, tmp_path):
+    path = str(tmp_path / "document.idx")
+    ChunkStore.build(chunk_text(document_text)).write(path)
+    store = benchmark.pedantic(ChunkStore.open, args=(path,), rounds=rounds, warmup_rounds=1)
+    assert len(store)
+
+
+def test_rank_chunk_store(benchmark, rounds, document_text):
+    store = ChunkStore.build(chunk_text(document_text))
+    ranked = benchmark.pedantic(store.rank, args=(QUERY,), rounds=rounds, warmup_rounds=1)
+    assert ranked[0][1] > 0
+
+
+def test_rank_chunk_list(benchmark, rounds, document_text):
+    chunks = chunk_text(document_text)
+    chunk_terms = index_chunks(chunks)
+    ranked = benchmark.pedantic(rank_chunks, args=(chunks, QUERY, chunk_terms), rounds=rounds, warmup_rounds=1)
+    assert ranked[0][1] > 0
+
+
+def test_memory_per_million_tokens(benchmark, document_text, tmp_path):
+    # Heap memory of the index in each form, scaled to a million tokens of document text
+    scale = 10 ** 6 / count_tokens(document_text)
+    chunks = chunk_text(document_text)
+    path = str(tmp_path / "document.idx")
+    ChunkStore.build(chunks).write(path)
+
+    dicts, dicts_bytes = traced_bytes(lambda: chunk_dicts(chunks))
+    built, built_bytes = traced_bytes(lambda: ChunkStore.build(chunks))
+    opened, opened_bytes = benchmark.pedantic(traced_bytes, args=(lambda: ChunkStore.open(path),), rounds=1)
+    benchmark.extra_info.update(
+        chunk_dicts_bytes_per_million_tokens=round(dicts_bytes * scale),
+        chunk_store_bytes_per_million_tokens=round(built_bytes * scale),
+        # Opened stores are backed by the page cache, shared by every worker, and use almost no heap
+        mapped_store_heap_bytes_per_million_tokens=round(opened_bytes * scale),
+        mapped_store_file_bytes_per_million_tokens=round(opened.nbytes * scale),
+    )
+    assert built_bytes < dicts_bytes
+    assert len(opened) == len(dicts) == len(built)
@@ -0,0 +1,63 @@
+"""
+Ingest hot path: text extraction, preprocessing and the MongoDB round trip of a document.
+"""
+from app.utils.data_utils import save_to_mongodb, load_from_mongodb
+from app.utils.pdf_utils import extract_text_from_pdf, save_pdf_file
+from app.utils.pdf_cache import pdf_cache
+from app.utils.text_processing import preprocess_text
+
+
+def pdf_record(pages: int, text: str) -> dict:
+    return {
+        "filename": "bench.pdf",
+        "original_filename": "bench.pdf",
+        "file_path": "storage/pdfs/bench.pdf",
+        "page_count": pages,
+        "size_kb": len(text) / 1024,
+        "extracted_text": text,
+    }
+
+
+def test_extract_text_from_pdf(benchmark, pages, rounds, pdf_content):
+    file_path = save_pdf_file(pdf_content, f"bench-{pages}.pdf")
+    text, page_count = benchmark.pedantic(extract_text_from_pdf, args=(file_path, "bench.pdf"), rounds=rounds, warmup_rounds=1)
+    assert page_count == pages
+    assert text
+
+
+def test_extract_text_from_pdf_layout(benchmark, pages, rounds, pdf_content):
+    file_path = save_pdf_file(pdf_content, f"bench-{pages}.pdf")
+    text, page_count = benchmark.pedantic(extract_text_from_pdf, args=(file_path, "bench.pdf", "layout"),
+                                          rounds=rounds, warmup_rounds=1)
+    assert page_count == pages
+    assert text
+
+
+def test_preprocess_text(benchmark, rounds, document_text, nlp):
+    processed = benchmark.pedantic(preprocess_text, args=(document_text, nlp), rounds=rounds, warmup_rounds=1)
+    assert processed
+
+
+def test_save_to_mongodb(benchmark, pages, rounds, document_text, database):
+    # save_to_mongodb adds the _id to the document it inserts, so every round gets a fresh one
+    record = pdf_record(pages, document_text)
+    pdf_id = benchmark.pedantic(save_to_mongodb, setup=lambda: ((dict(record),), {}), rounds=rounds, warmup_rounds=1)
+    assert pdf_id
+
+
+def test_load_from_mongodb(benchmark, pages, rounds, document_text, database):
+    pdf_id = save_to_mongodb(pdf_record(pages, document_text))
+
+    def uncached():
+        # Every round misses the cache
+        pdf_cache.clear()
+        return (pdf_id,), {}
+
+    document = benchmark.pedantic(load_from_mongodb, setup=uncached, rounds=rounds, warmup_rounds=1)
+    assert document["extracted_text"] == document_text
+
+
+def test_load_from_mongodb_cached(benchmark, pages, rounds, document_text, database):
+    pdf_id = save_to_mongodb(pdf_record(pages, document_text))
+    document = benchmark.pedantic(load_from_mongodb, args=(pdf_id,), rounds=rounds, warmup_rounds=1)
+    assert document["extracted_text"] == document_text
@@ -0,0 +1,56 @@
+"""
+Upload pre-validation: the structural checks read the same few kilobytes whatever the size of the
+file, so rejecting a malformed upload costs the same for 1 and 1000 pages, while pypdf only fails
+after scanning the whole file. Compare the timings across the page counts.
+"""
+import io
+import pytest
+from pypdf import PdfReader
+from app.utils.pdf_validation import PdfValidationError, inspect_pdf
+
+
+def truncated(content: bytes) -> bytes:
+    # An upload cut off halfway: no cross-reference table, no trailer
+    return content[:len(content) // 2]
+
+
+def read_with_pypdf(content: bytes):
+    try:
+        return len(PdfReader(io.BytesIO(content)).pages)
+    except Exception:
+        return None
+
+
+def reject(content: bytes):
+    try:
+        inspect_pdf(content)
+    except PdfValidationError as e:
+        return e
+    return None
+
+
+def test_prevalidate_rejects_truncated_pdf(benchmark, pages, pdf_content):
+    content = truncated(pdf_content)
+    benchmark.extra_info["file_bytes"] = len(content)
+    error = benchmark.pedantic(reject, args=(content,), rounds=200, warmup_rounds=5)
+    assert error is not None
+
+
+def test_pypdf_rejects_truncated_pdf(benchmark, pages, rounds, pdf_content):
+    # What a malformed upload cost before pre-validation, without saving the file first
+    content = truncated(pdf_content)
+    benchmark.extra_info["file_bytes"] = len(content)
+    assert benchmark.pedantic(read_with_pypdf, args=(content,), rounds=rounds, warmup_rounds=1) is None
+
+
+def test_prevalidate_valid_pdf(benchmark, pages, pdf_content):
+    benchmark.extra_info["file_bytes"] = len(pdf_content)
+    info = benchmark.pedantic(inspect_pdf, args=(pdf_content,), rounds=200, warmup_rounds=5)
+    assert info.page_count == pages
+
+
+@pytest.mark.parametrize("garbage", [b"not a pdf " * 10 ** 3, b"not a pdf " * 10 ** 6], ids=["10KB", "10MB"])
+def test_prevalidate_rejects_non_pdf(benchmark, garbage):
+    benchmark.extra_info["file_bytes"] = len(garbage)
+    error = benchmark.pedantic(reject, args=(garbage,), rounds=200, warmup_rounds=5)
+    assert error is not None
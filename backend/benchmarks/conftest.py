@@ -0,0 +1,99 @@
+"""
+Fixtures of the benchmark suite: generated report PDFs, a mongomock database and a TestClient
+running the app with the fake LLM provider, so the suite needs no network, MongoDB or API key.
+"""
+import os
+import tempfile
+
+# Must run before the app is imported: settings are read at import time
+_scratch = tempfile.mkdtemp(prefix="pdfchatai-bench-")
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["FAKE_LLM_LATENCY_MS"] = "0"
+os.environ["RATE_LIMIT_ENABLED"] = "False"
+os.environ["TOKEN_LIMIT_PER_DAY"] = str(10 ** 12)
+os.environ["TOKEN_LIMIT_PER_MINUTE"] = str(10 ** 12)
+os.environ["MAX_PDF_SIZE"] = str(64 * 2 ** 20)
+os.environ["MAX_CHAR_LENGTH"] = str(10 ** 8)
+os.environ["MONGODB_BOOTSTRAP_ENABLED"] = "False"
+os.environ["STORAGE_GC_INTERVAL_SECONDS"] = "0"
+os.environ.setdefault("PDF_UPLOAD_PATH", os.path.join(_scratch, "pdfs"))
+os.environ.setdefault("LOG_DIR", os.path.join(_scratch, "logs"))
+os.environ.setdefault("CHUNK_INDEX_DIR", os.path.join(_scratch, "chunk_index"))
+
+import glob
+import mongomock
+import pytest
+
+PAGE_COUNTS = (1, 10, 100, 1000)
+
+
+def pytest_addoption(parser):
+    parser.addoption("--bench-pages", default=",".join(map(str, PAGE_COUNTS)),
+                     help="Comma-separated page counts of the generated PDFs")
+
+
+def pytest_configure(config):
+    # The first run only records the baseline: there is nothing to compare with yet
+    storage = config.getoption("benchmark_storage", "").replace("file://", "")
+    if config.getoption("benchmark_compare_fail", None) and not glob.glob(os.path.join(storage, "**", "*.json"), recursive=True):
+        config.option.benchmark_compare = False
+        config.option.benchmark_compare_fail = None
+
+
+def pytest_generate_tests(metafunc):
+    if "pages" in metafunc.fixturenames:
+        pages = [int(count) for count in metafunc.config.getoption("--bench-pages").split(",")]
+        metafunc.parametrize("pages", pages, ids=[f"{count}p" for count in pages])
+
+
+@pytest.fixture
+def rounds(pages) -> int:
+    # Keeps every benchmark within a few seconds: large documents get fewer rounds
+    return max(3, min(50, 500 // pages))
+
+
+_pdfs = {}
+
+
+@pytest.fixture
+def pdf_content(pages) -> bytes:
+    from loadtests.pdf_factory import make_report_pdf
+
+    if pages not in _pdfs:
+        _pdfs[pages] = make_report_pdf(pages)
+    return _pdfs[pages]
+
+
+@pytest.fixture
+def document_text(pages, pdf_content) -> str:
+    import io
+    from pypdf import PdfReader
+
+    return "".join(page.extract_text() for page in PdfReader(io.BytesIO(pdf_content)).pages)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    import app.utils.data_utils as data_utils
+    import app.utils.session_utils as session_utils
+
+    database = mongomock.MongoClient().pdfchatai
+    monkeypatch.setattr(data_utils, "get_database", lambda: database)
+    monkeypatch.setattr(session_utils, "get_database", lambda: database)
+    return database
+
+
+@pytest.fixture
+def nlp():
+    from app.utils.pdf_utils import get_nlp
+
+    return get_nlp()
+
+
+@pytest.fixture
+def client(database):
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    # Not entered as a context manager: the lifespan would start warmups and the storage collector
+    return TestClient(app)
@@ -0,0 +1,109 @@
+"""
+Compares answering a list of questions about one PDF with sequential /v1/chat requests against
+a single /v1/chat/{pdf_id}/batch request, in-process with mongomock and the fake provider:
+
+    python -m loadtests.bench_batch --questions 50
+
+Wall time and the tokens sent to and received from the provider are reported for both.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from loadtests.load_chat import configure_in_process_environment, seed_in_process_database
+
+TOPICS = ["solar panels", "sunlight", "electricity", "batteries", "surplus energy", "night",
+          "grid operators", "supply", "demand", "storage"]
+FORMS = ["What does the document say about {}?", "How are {} described?", "Why do {} matter?",
+         "Which figures are given for {}?", "What is the role of {}?"]
+
+
+def make_questions(count: int) -> list:
+    return [FORMS[(i // len(TOPICS)) % len(FORMS)].format(TOPICS[i % len(TOPICS)]) + f" (#{i})" for i in range(count)]
+
+
+class TokenMeter:
+    # Wraps the provider's generate to sum the tokens of every upstream call
+    def __init__(self, provider):
+        self.provider = provider
+        self.generate = provider.generate
+        self.reset()
+        provider.generate = self.metered
+
+    def reset(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def metered(self, prompt, timeout=None):
+        response = self.generate(prompt, timeout=timeout)
+        self.calls += 1
+        self.prompt_tokens += response.prompt_tokens
+        self.output_tokens += response.output_tokens
+        return response
+
+
+async def measure(meter: TokenMeter, run) -> dict:
+    meter.reset()
+    started = time.perf_counter()
+    failures = await run()
+    return {
+        "seconds": round(time.perf_counter() - started, 3),
+        "upstream_calls": meter.calls,
+        "prompt_tokens": meter.prompt_tokens,
+        "output_tokens": meter.output_tokens,
+        "total_tokens": meter.prompt_tokens + meter.output_tokens,
+        "failed_questions": failures,
+    }
+
+
+async def main(args):
+    import httpx
+
+    configure_in_process_environment(args.latency_ms)
+    os.environ.setdefault("CHAT_COALESCING_ENABLED", "False")
+    from app.main import app
+    from app.utils.llm_providers import get_llm_provider
+    from app.utils.pdf_cache import pdf_cache
+
+    pdf_id = seed_in_process_database(args.document_words)
+    meter = TokenMeter(get_llm_provider())
+    questions = make_questions(args.questions)
+
+    async def sequential():
+        failures = 0
+        for question in questions:
+            response = await client.post(f"/v1/chat/{pdf_id}", json={"message": question})
+            failures += response.status_code != 200
+        return failures
+
+    async def batch():
+        response = await client.post(f"/v1/chat/{pdf_id}/batch", json={"questions": questions})
+        response.raise_for_status()
+        return sum("answer" not in answer for answer in response.json()["answers"])
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout) as client:
+        pdf_cache.clear()
+        report = {"sequential": await measure(meter, sequential)}
+        pdf_cache.clear()
+        report["batch"] = await measure(meter, batch)
+
+    report["questions"] = args.questions
+    report["token_reduction"] = round(report["sequential"]["total_tokens"] / max(1, report["batch"]["total_tokens"]), 2)
+    report["speedup"] = round(report["sequential"]["seconds"] / max(1e-9, report["batch"]["seconds"]), 2)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=float(os.getenv("FAKE_LLM_LATENCY_MS", 200)),
+                        help="Median latency of the fake provider")
+    parser.add_argument("--document-words", type=int, default=20000)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--json", help="Write the report to this file")
+    asyncio.run(main(parser.parse_args()))
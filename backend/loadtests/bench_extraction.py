@@ -0,0 +1,72 @@
+"""
+Extraction cost of the plain and layout modes on generated report PDFs (headings, paragraphs, tables).
+
+Plain mode is timed as uploads run it (pypdf text extraction); layout mode adds pypdf's layout
+extraction, the layout parser and chunking:
+
+    python -m loadtests.bench_extraction --pages 50 --repeat 3
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+
+os.environ.setdefault("PDF_UPLOAD_PATH", "storage/pdfs")
+os.environ.setdefault("LOG_DIR", "logs")
+
+from pypdf import PdfReader
+from app.utils.layout_utils import PAGE_BREAK, parse_layout, layout_chunks
+from loadtests.pdf_factory import make_report_pdf
+
+
+def extract_plain(content: bytes) -> dict:
+    reader = PdfReader(io.BytesIO(content))
+    text = "".join(page.extract_text() for page in reader.pages)
+    return {"characters": len(text)}
+
+
+def extract_layout(content: bytes) -> dict:
+    reader = PdfReader(io.BytesIO(content))
+    text = PAGE_BREAK.join(page.extract_text(extraction_mode="layout") for page in reader.pages)
+    records = parse_layout(text)
+    return {
+        "characters": len(text),
+        "tables": sum(1 for record in records if record["type"] == "table"),
+        "headings": sum(1 for record in records if record["type"] == "heading"),
+        "chunks": len(layout_chunks(records)),
+    }
+
+
+def measure(mode: str, extract, content: bytes, pages: int, repeat: int) -> dict:
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        details = extract(content)
+        seconds.append(time.perf_counter() - started)
+    median = statistics.median(seconds)
+    return {"mode": mode, "pages": pages, "seconds": round(median, 3), "ms_per_page": round(median * 1000 / pages, 2), **details}
+
+
+def run(args) -> list[dict]:
+    content = make_report_pdf(args.pages, seed=args.seed)
+    plain = measure("plain", extract_plain, content, args.pages, args.repeat)
+    layout = measure("layout", extract_layout, content, args.pages, args.repeat)
+    layout["relative_cost"] = round(layout["seconds"] / plain["seconds"], 2)
+    return [plain, layout]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,65 @@
+"""
+Reproducible tail-latency benchmark for hedged upstream calls.
+
+The fake provider is seeded and given heavy latency jitter (log-normal sigma 1.0 by default).
+The same sequence of calls is run with hedging off and on, and the latency percentiles are compared:
+
+    python -m loadtests.bench_hedging --calls 400 --concurrency 8
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("PDF_UPLOAD_PATH", "storage/pdfs")
+os.environ.setdefault("LOG_DIR", "logs")
+
+from app.utils.llm_providers import FakeProvider
+from app.utils.resilience import ResilientCaller, LatencyTracker, Deadline
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(hedging: bool, args) -> dict:
+    provider = FakeProvider(latency_ms=args.latency_ms, latency_sigma=args.sigma, output_tokens=10, seed=args.seed)
+    caller = ResilientCaller(hedging=hedging, hedge_percentile=args.hedge_percentile,
+                             tracker=LatencyTracker(min_samples=20), max_workers=args.concurrency * 2)
+
+    def one_call(_):
+        started = time.perf_counter()
+        caller.call(lambda deadline: provider.generate("benchmark prompt", timeout=deadline.remaining()), Deadline(args.deadline))
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(one_call, range(args.calls)))
+    return {
+        "hedging": hedging,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "upstream_calls": provider.calls,
+        "hedges": caller.hedges,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Median upstream latency")
+    parser.add_argument("--sigma", type=float, default=1.0, help="Log-normal jitter of upstream latency")
+    parser.add_argument("--hedge-percentile", type=float, default=0.95)
+    parser.add_argument("--deadline", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = [run(False, args), run(True, args)]
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,83 @@
+"""
+Goodput under overload with and without admission control, in-process with mongomock and the
+fake provider. Many closed-loop clients send chats with a client-side deadline; a response only
+counts as goodput if it succeeds within the deadline. Clients told 503 wait for Retry-After:
+
+    python -m loadtests.bench_overload --clients 200 --seconds 10
+
+The chat limit starts far above what the upstream threads can serve, so shedding depends on the
+limit adapting to the observed latency.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from loadtests.load_chat import configure_in_process_environment, seed_in_process_database, percentile
+
+
+async def run(app, pdf_id: str, args) -> dict:
+    import httpx
+
+    latencies = []
+    statuses = {}
+    good = 0
+    stop_at = time.perf_counter() + args.seconds
+
+    async def client_loop(client, number):
+        nonlocal good
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            response = await client.post(f"/v1/chat/{pdf_id}", json={"message": f"How is surplus energy stored? #{number}-{started}"})
+            latency = time.perf_counter() - started
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code == 200:
+                latencies.append(latency)
+                good += latency <= args.deadline
+            elif response.status_code == 503:
+                await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=None) as client:
+        await asyncio.gather(*(client_loop(client, number) for number in range(args.clients)))
+    return {
+        "goodput_rps": round(good / args.seconds, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def main(args):
+    configure_in_process_environment(args.latency_ms)
+    os.environ["ADMISSION_CONTROL_ENABLED"] = "False"
+    os.environ.setdefault("CHAT_COALESCING_ENABLED", "False")
+    os.environ.setdefault("FAKE_LLM_LATENCY_SIGMA", "0.1")
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.upstream_threads)
+    from app.main import app
+    from app.core.admission import AdaptiveLimit, AdmissionMiddleware
+
+    pdf_id = seed_in_process_database(args.document_words)
+    report = {"without_admission": await run(app, pdf_id, args)}
+    limits = {"chat": AdaptiveLimit("chat", args.max_concurrency, args.target_seconds)}
+    report["with_admission"] = await run(AdmissionMiddleware(app, limits=limits, queue_seconds=args.queue_seconds), pdf_id, args)
+    report["with_admission"]["final_limit"] = limits["chat"].stats()["limit"]
+    report.update(clients=args.clients, deadline_seconds=args.deadline, upstream_latency_ms=args.latency_ms)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--deadline", type=float, default=2.0, help="Client deadline for a response to count as goodput")
+    parser.add_argument("--latency-ms", type=float, default=500, help="Median latency of the fake provider")
+    parser.add_argument("--upstream-threads", type=int, default=16, help="Concurrent upstream calls (LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--max-concurrency", type=int, default=256, help="Initial and highest chat limit")
+    parser.add_argument("--target-seconds", type=float, default=1.0, help="Chat latency target of the limit")
+    parser.add_argument("--queue-seconds", type=float, default=0.5)
+    parser.add_argument("--document-words", type=int, default=2000)
+    parser.add_argument("--json", help="Write the report to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,91 @@
+"""
+Compression ratio and decode cost of the storage codecs against the current (uncompressed) layout.
+
+The test.txt and test.pdf fixtures are scaled up into a seeded corpus of report-like documents
+with repeated boilerplate, as found in real uploads. Each document is compressed on its own, as
+it is stored. The zstd dictionary is trained on one part of the corpus and evaluated on the rest:
+
+    python -m loadtests.bench_storage_codec --documents 60 --pages 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+os.environ.setdefault("PDF_UPLOAD_PATH", "storage/pdfs")
+os.environ.setdefault("LOG_DIR", "logs")
+
+from app.core.config import settings
+import app.utils.storage_codec as storage_codec
+from loadtests.pdf_factory import make_document, make_text_pdf
+
+
+def reset_codec():
+    storage_codec._local = threading.local()
+    storage_codec._dictionary = None
+
+
+def measure(name: str, blobs: list[bytes], codec: str = None, level: int = 3, dictionary_path: str = "") -> dict:
+    reset_codec()
+    with patch.object(settings, "STORAGE_COMPRESSION_LEVEL", level), \
+         patch.object(settings, "ZSTD_DICTIONARY_PATH", dictionary_path):
+        stored = [storage_codec.compress(blob, codec) if codec else blob for blob in blobs]
+        decode_seconds = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for blob in stored:
+                storage_codec.decompress(blob)
+            decode_seconds.append(time.perf_counter() - started)
+    raw_bytes = sum(len(blob) for blob in blobs)
+    stored_bytes = sum(len(blob) for blob in stored)
+    decode = statistics.median(decode_seconds)
+    return {
+        "layout": name,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "ratio": round(raw_bytes / stored_bytes, 2),
+        "decode_ms_per_mb": round(decode * 1000 / (raw_bytes / 2 ** 20), 3),
+    }
+
+
+def run(args) -> dict:
+    rng = random.Random(args.seed)
+    documents = [make_document(rng, index, args.pages) for index in range(args.documents)]
+    training, evaluation = documents[:len(documents) // 2], documents[len(documents) // 2:]
+    texts = [document.encode() for document in evaluation]
+    pdfs = [make_text_pdf(document) for document in evaluation]
+
+    results = {"text": [measure("uncompressed (current)", texts), measure("zlib", texts, "zlib", level=6)],
+               "pdf": [measure("uncompressed (current)", pdfs), measure("zlib", pdfs, "zlib", level=6)]}
+    if storage_codec.zstandard is not None:
+        samples = [page.encode() for document in training for page in document.split("ACME Holdings")]
+        dictionary_path = Path(args.dictionary)
+        dictionary_path.write_bytes(storage_codec.train_dictionary(samples, size=args.dictionary_size))
+        for kind, blobs in (("text", texts), ("pdf", pdfs)):
+            results[kind].append(measure("zstd", blobs, "zstd", level=args.level))
+            results[kind].append(measure("zstd + dictionary", blobs, "zstd", level=args.level, dictionary_path=str(dictionary_path)))
+    reset_codec()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=60)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--level", type=int, default=3, help="zstd compression level")
+    parser.add_argument("--dictionary", default="/tmp/pdfchatai-bench.zstd", help="Where the trained dictionary is written")
+    parser.add_argument("--dictionary-size", type=int, default=112640)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
@@ -0,0 +1,140 @@
+"""
+Asyncio load test for /v1/chat against the local fake LLM provider.
+
+In-process mode (default) runs the app through httpx's ASGI transport with mongomock and the
+fake provider, so it needs no network, MongoDB or API key:
+
+    python -m loadtests.load_chat --requests 200 --concurrency 20
+
+Remote mode drives a running server (start it with LLM_PROVIDER=fake and RATE_LIMIT_ENABLED=False):
+
+    python -m loadtests.load_chat --url http://localhost:8000 --pdf-id <id>
+
+Latency percentiles, throughput and the service overhead (latency minus the fake provider's
+median latency) are printed and optionally written to JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+
+def configure_in_process_environment(latency_ms: float):
+    # Must run before the app is imported: settings are read at import time
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "False")
+    os.environ.setdefault("TOKEN_LIMIT_PER_DAY", str(10 ** 12))
+    os.environ.setdefault("TOKEN_LIMIT_PER_MINUTE", str(10 ** 12))
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(latency_ms)
+    os.environ.setdefault("PDF_UPLOAD_PATH", "storage/pdfs")
+    os.environ.setdefault("LOG_DIR", "logs")
+
+
+def seed_in_process_database(document_words: int) -> str:
+    # Point the data layer at mongomock and store one document to chat with
+    import mongomock
+    import app.utils.data_utils as data_utils
+    import app.utils.session_utils as session_utils
+
+    database = mongomock.MongoClient().pdfchatai
+    data_utils.get_database = lambda: database
+    session_utils.get_database = lambda: database
+    words = ("solar panels convert sunlight into electricity while batteries store the surplus energy "
+             "for use at night and grid operators balance supply and demand ").split()
+    text = " ".join(words[i % len(words)] for i in range(document_words))
+    return data_utils.save_to_mongodb({
+        "filename": "loadtest.pdf",
+        "original_filename": "loadtest.pdf",
+        "file_path": "storage/pdfs/loadtest.pdf",
+        "page_count": 1,
+        "size_kb": len(text) / 1024,
+        "extracted_text": text,
+    })
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_load(client, pdf_id: str, total: int, concurrency: int, question: str, unique_questions: int = 0) -> dict:
+    latencies = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            # With unique_questions, the same few questions are asked over and over
+            number = i % unique_questions if unique_questions else i
+            response = await client.post(f"/v1/chat/{pdf_id}", json={"message": f"{question} #{number}"})
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+async def main(args):
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        pdf_id = args.pdf_id
+    else:
+        configure_in_process_environment(args.latency_ms)
+        from app.main import app
+        pdf_id = seed_in_process_database(args.document_words)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout)
+
+    async with client:
+        report = await run_load(client, pdf_id, args.requests, args.concurrency, args.question, args.unique_questions)
+
+    report["mode"] = "remote" if args.url else "in-process"
+    if not args.url:
+        from app.utils.llm_providers import get_llm_provider
+        report["upstream_calls"] = get_llm_provider().calls
+    report["upstream_latency_ms"] = args.latency_ms
+    # What the service adds on top of the upstream call
+    report["overhead_p50_ms"] = round(report["latency_p50_ms"] - args.latency_ms, 1)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; omit to run in-process")
+    parser.add_argument("--pdf-id", help="PDF to chat with in remote mode")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=float(os.getenv("FAKE_LLM_LATENCY_MS", 200)),
+                        help="Median latency of the fake provider")
+    parser.add_argument("--document-words", type=int, default=5000)
+    parser.add_argument("--question", default="How is surplus energy stored?")
+    parser.add_argument("--unique-questions", type=int, default=0,
+                        help="Number of distinct questions, repeated across requests; 0 = every request differs")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--json", help="Write the report to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,39 @@
+"""
+Locust load test for a running server started with LLM_PROVIDER=fake and RATE_LIMIT_ENABLED=False:
+
+    LOADTEST_PDF_ID=<id> locust -f loadtests/locustfile.py --host http://localhost:8000
+
+Without LOADTEST_PDF_ID every user uploads LOADTEST_PDF_PATH once and chats with it.
+"""
+import os
+import random
+from locust import HttpUser, task, between
+
+PDF_ID = os.getenv("LOADTEST_PDF_ID")
+PDF_PATH = os.getenv("LOADTEST_PDF_PATH", "test.pdf")
+
+QUESTIONS = [
+    "What is the main topic of this document?",
+    "Which numbers are mentioned in the document?",
+    "Summarize the conclusion.",
+    "Who are the authors?",
+]
+
+
+class ChatUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.pdf_id = PDF_ID
+        if not self.pdf_id:
+            with open(PDF_PATH, "rb") as pdf_file:
+                response = self.client.post("/v1/pdf", files={"file": (os.path.basename(PDF_PATH), pdf_file, "application/pdf")})
+            self.pdf_id = response.json()["pdf_id"]
+
+    @task(10)
+    def chat(self):
+        self.client.post(f"/v1/chat/{self.pdf_id}", json={"message": random.choice(QUESTIONS)}, name="/v1/chat/[pdf_id]")
+
+    @task(1)
+    def health(self):
+        self.client.get("/health")
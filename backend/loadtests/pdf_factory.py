@@ -0,0 +1,100 @@
+"""
+Seeded generator of text PDFs for benchmarks: report-like pages with headings, paragraphs and tables.
+
+Content streams are written uncompressed with the standard Helvetica font, so the files need no
+dependency to build and pypdf extracts them with both the plain and the layout mode.
+"""
+import random
+from pathlib import Path
+
+FIXTURES = Path(__file__).resolve().parent.parent
+WORDS = ("revenue cost margin customer product market growth quarter forecast risk policy "
+         "contract service delivery employee budget account payment invoice report analysis "
+         "strategy investment operation compliance audit supplier region segment target").split()
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return f"The {' '.join(words)} increased by {rng.randint(1, 99)}.{rng.randint(0, 9)}% compared to {rng.randint(1990, 2024)}."
+
+
+def make_document(rng: random.Random, index: int, pages: int) -> str:
+    # Plain text of a report, one line per sentence, scaled up from the test.txt fixture
+    fixture = (FIXTURES / "test.txt").read_text().strip()
+    lines = []
+    for page in range(1, pages + 1):
+        lines.append(f"ACME Holdings - Annual Report {2000 + index % 20} - Page {page} of {pages}")
+        lines.append(f"Confidential. {fixture}. Prepared by the finance department.")
+        lines.extend(sentence(rng) for _ in range(12))
+    return "\n".join(lines)
+
+
+def text_page(lines: list[str], font_size: int = 9) -> list[tuple]:
+    # One (x, y, size, text) item per line, top to bottom
+    leading = font_size + 2
+    return [(40, PAGE_HEIGHT - 42 - number * leading, font_size, line) for number, line in enumerate(lines)]
+
+
+def report_page(rng: random.Random, page: int, tables: bool = True) -> list[tuple]:
+    # A heading, paragraphs, and a table whose cells are placed at fixed column positions
+    items = []
+    y = PAGE_HEIGHT - 60
+    items.append((40, y, 16, f"{page}. {rng.choice(WORDS).title()} {rng.choice(WORDS).title()} Review"))
+    y -= 30
+    for _ in range(2):
+        text = " ".join(sentence(rng) for _ in range(4)).split()
+        for start in range(0, len(text), 14):
+            items.append((40, y, 9, " ".join(text[start:start + 14])))
+            y -= 11
+        y -= 11
+    if tables:
+        columns = [40, 200, 320, 440]
+        items.extend((x, y, 9, header) for x, header in zip(columns, ["Region", "Revenue", "Cost", "Margin"]))
+        y -= 13
+        for _ in range(rng.randint(4, 10)):
+            revenue, cost = rng.randint(100, 999), rng.randint(10, 99)
+            row = [rng.choice(["North", "South", "East", "West", "Central"]), f"{revenue}.{rng.randint(0, 9)}",
+                   f"{cost}.{rng.randint(0, 9)}", f"{100 * (revenue - cost) / revenue:.1f}%"]
+            items.extend((x, y, 9, cell) for x, cell in zip(columns, row))
+            y -= 13
+    return items
+
+
+def build_pdf(pages: list[list[tuple]]) -> bytes:
+    header = (FIXTURES / "test.pdf").read_bytes().split(b"\n", 1)[0]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for items in pages:
+        operations = " ".join(f"BT /F1 {size} Tf {x} {y} Td ({_escape(text)}) Tj ET" for x, y, size, text in items)
+        stream = operations.encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                       % (PAGE_WIDTH, PAGE_HEIGHT, len(objects)))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    output = bytearray(header + b"\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def make_text_pdf(text: str, lines_per_page: int = 60) -> bytes:
+    lines = text.split("\n")
+    return build_pdf([text_page(lines[start:start + lines_per_page]) for start in range(0, len(lines), lines_per_page)])
+
+
+def make_report_pdf(pages: int, seed: int = 42, tables: bool = True) -> bytes:
+    rng = random.Random(seed)
+    return build_pdf([report_page(rng, page, tables) for page in range(1, pages + 1)])
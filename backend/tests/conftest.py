@@ -4,6 +4,8 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.main import app
 from app.core.config import settings
+from app.utils.pdf_cache import pdf_cache
+from app.utils import chunk_store
 
 # Use an in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -11,6 +13,16 @@ SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@pytest.fixture(autouse=True)
+def clear_pdf_cache(tmp_path, monkeypatch):
+    # Tests reuse PDF ids with different mocked documents
+    monkeypatch.setattr(chunk_store, "CHUNK_INDEX_DIR", str(tmp_path / "chunk_index"))
+    pdf_cache.clear()
+    chunk_store.chunk_stores.clear()
+    yield
+    pdf_cache.clear()
+    chunk_store.chunk_stores.clear()
+
 @pytest.fixture(scope="function")
 def test_db():
     # Create tables
@@ -0,0 +1,118 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.core.admission import AdaptiveLimit, AdmissionMiddleware, route_class
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_route_class():
+    assert route_class("GET", "/health") is None
+    assert route_class("GET", "/ready") is None
+    assert route_class("POST", "/v1/pdf") == "upload"
+    assert route_class("POST", "/v1/chat/abc/batch") == "chat"
+    assert route_class("GET", "/v1/pdf/abc") == "read"
+    assert route_class("DELETE", "/v1/pdf/abc") == "read"
+
+
+def test_limit_grows_by_slow_start_then_additively():
+    limit = AdaptiveLimit("chat", max_limit=100, target_seconds=1.0, clock=Clock())
+    assert limit.current() == 4
+    for _ in range(6):
+        limit.observe(0.1)
+    assert limit.limit == 10
+    limit.observe(1.1)
+    assert limit.limit == pytest.approx(9.0)
+    limit.observe(0.1)
+    assert limit.limit == pytest.approx(9.0 + 1 / 9.0)
+
+
+def test_limit_decreases_once_per_period_in_proportion_to_the_overshoot():
+    clock = Clock()
+    limit = AdaptiveLimit("chat", max_limit=10, target_seconds=1.0, clock=clock)
+    limit.limit = 10.0
+    # A burst of slow requests counts as one overload signal
+    for _ in range(5):
+        limit.observe(1.25)
+    assert limit.limit == pytest.approx(8.0)
+    clock.now = 1.5
+    limit.observe(10.0)
+    assert limit.limit == pytest.approx(4.0)
+    for _ in range(100):
+        limit.observe(0.1)
+    assert limit.limit == 10
+
+
+def test_limit_never_drops_below_the_minimum():
+    clock = Clock()
+    limit = AdaptiveLimit("upload", max_limit=2, target_seconds=1.0, clock=clock)
+    for step in range(20):
+        clock.now = step * 2
+        limit.observe(5.0)
+    assert limit.current() == 1
+
+
+async def test_queued_requests_get_freed_slots_in_order():
+    limit = AdaptiveLimit("chat", max_limit=1, target_seconds=1.0)
+    assert await limit.acquire(1.0)
+    first = asyncio.ensure_future(limit.acquire(5.0))
+    second = asyncio.ensure_future(limit.acquire(5.0))
+    await asyncio.sleep(0)
+    limit.release(0.1)
+    assert await first
+    assert not second.done()
+    limit.release(0.1)
+    assert await second
+    assert limit.in_flight == 1
+
+
+async def test_requests_that_would_wait_too_long_are_shed_at_once():
+    limit = AdaptiveLimit("chat", max_limit=1, target_seconds=5.0)
+    limit.observe(4.5)
+    assert await limit.acquire(1.0)
+    # The expected wait (one request of about 5 s) is longer than the queue time
+    assert not await limit.acquire(1.0)
+    assert limit.shed == 1
+    assert limit.retry_after() == 5
+
+
+async def test_requests_waiting_past_the_queue_time_are_shed():
+    limit = AdaptiveLimit("chat", max_limit=1, target_seconds=0.01)
+    assert await limit.acquire(0.05)
+    assert not await limit.acquire(0.05)
+    assert limit.in_flight == 1 and limit.stats()["queued"] == 0
+
+
+async def test_middleware_sheds_overload_with_retry_after_and_keeps_health_open():
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.post("/v1/chat/{pdf_id}")
+    async def chat(pdf_id: str):
+        await release.wait()
+        return {"response": "ok"}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    limits = {"chat": AdaptiveLimit("chat", max_limit=2, target_seconds=10.0)}
+    transport = httpx.ASGITransport(app=AdmissionMiddleware(app, limits=limits, queue_seconds=1.0))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        admitted = [asyncio.ensure_future(client.post("/v1/chat/pdf")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        shed = await client.post("/v1/chat/pdf")
+        assert shed.status_code == 503
+        assert int(shed.headers["Retry-After"]) >= 1
+        assert (await client.get("/health")).status_code == 200
+        release.set()
+        assert [response.status_code for response in await asyncio.gather(*admitted)] == [200, 200]
+    assert limits["chat"].stats()["in_flight"] == 0
+    assert limits["chat"].shed == 1
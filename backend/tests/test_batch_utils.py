@@ -0,0 +1,75 @@
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+import app.utils.batch_utils as batch_utils
+from app.utils.batch_utils import chat_batch, group_questions, split_answers, answer_group
+from app.utils.resilience import Deadline
+
+
+def test_group_questions_by_shared_chunks():
+    retrieved = [{0, 1, 2}, {1, 2, 3}, {7, 8}, {0, 1}, {8, 9}]
+    assert group_questions(retrieved, max_questions=10, min_overlap=0.5) == [[0, 1, 3], [2, 4]]
+
+
+def test_group_questions_respects_the_group_size():
+    retrieved = [{0}] * 5
+    assert group_questions(retrieved, max_questions=2, min_overlap=0.5) == [[0, 1], [2, 3], [4]]
+
+
+def test_split_answers():
+    response = "Answer 1: Solar panels.\n**Answer 2:** Batteries store\nthe surplus.\nAnswer 7: out of range"
+    assert split_answers(response, 3) == {1: "Solar panels.", 2: "Batteries store\nthe surplus."}
+    assert split_answers("An unlabeled answer", 1) == {1: "An unlabeled answer"}
+
+
+def test_missing_answers_are_asked_separately():
+    with patch.object(batch_utils, "generate_text", return_value="Answer 2: second") as generate_text, \
+         patch.object(batch_utils, "chat_with_gemini", return_value="first") as chat_with_gemini:
+        assert answer_group(["q1", "q2"], "context", Deadline(10)) == ["first", "second"]
+    assert "Question 1: q1" in generate_text.call_args[0][0]
+    chat_with_gemini.assert_called_once()
+    assert chat_with_gemini.call_args[0][0] == "q1"
+
+
+async def test_chat_batch_loads_once_and_groups_questions():
+    document = {"extracted_text": "Solar panels convert sunlight. Batteries store energy.", "summary": "About energy."}
+    prompts = []
+
+    def generate(prompt, deadline=None):
+        prompts.append(prompt)
+        return "\n".join(f"Answer {number}: answer {number}" for number in range(1, prompt.count("Question ") + 1))
+
+    with patch.object(batch_utils, "load_pdf", return_value=document) as load_pdf, \
+         patch.object(batch_utils, "generate_text", side_effect=generate), \
+         patch.object(batch_utils, "BATCH_GROUP_MAX_QUESTIONS", 2):
+        result = await chat_batch("pdf-1", ["How is energy stored?", "What do panels convert?", "Summarize this document", "Why?"])
+
+    load_pdf.assert_called_once_with("pdf-1")
+    # The overview question is answered from the summary, the others two per prompt
+    assert len(prompts) == result["groups"] == 2
+    answers = result["answers"]
+    assert [answer["question"] for answer in answers][0] == "How is energy stored?"
+    assert answers[2]["answer"].startswith("About energy.")
+    assert [answers[index]["answer"] for index in (0, 1, 3)] == ["answer 1", "answer 2", "answer 1"]
+
+
+async def test_chat_batch_reports_failed_groups_per_question():
+    document = {"extracted_text": "Solar panels convert sunlight."}
+    with patch.object(batch_utils, "load_pdf", return_value=document), \
+         patch.object(batch_utils, "generate_text", side_effect=HTTPException(status_code=504, detail="Deadline exceeded")):
+        result = await chat_batch("pdf-1", ["What do panels convert?"])
+    assert result["answers"] == [{"question": "What do panels convert?", "error": {"status_code": 504, "detail": "Deadline exceeded"}}]
+
+
+@pytest.mark.parametrize("questions", [[], ["ok", "  "], ["q"] * 51])
+async def test_chat_batch_rejects_invalid_batches(questions):
+    with pytest.raises(HTTPException) as exc_info:
+        await chat_batch("pdf-1", questions)
+    assert exc_info.value.status_code == 400
+
+
+async def test_chat_batch_pdf_not_found():
+    with patch.object(batch_utils, "load_pdf", return_value=None):
+        with pytest.raises(HTTPException) as exc_info:
+            await chat_batch("missing", ["question"])
+    assert exc_info.value.status_code == 404
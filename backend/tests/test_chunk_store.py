@@ -0,0 +1,103 @@
+import os
+import pytest
+from app.utils import chunk_store
+from app.utils.chunk_store import ChunkStore, chunk_store_for, chunk_stores
+from app.utils.retrieval import chunk_text, rank_chunks, select_relevant_chunks
+
+CHUNKS = [
+    "the cat sat on the mat",
+    "dogs chase cats around the garden",
+    "quarterly revenue grew by ten percent",
+    "revenue in the north region fell",
+    "東京都庁 in Tokyo, café crème",
+    "",
+]
+QUERIES = ["How much did revenue grow?", "cat mat", "東京 café", "nothing matches", ""]
+
+
+def test_rank_matches_rank_chunks():
+    store = ChunkStore.build(CHUNKS)
+    for query in QUERIES:
+        assert store.rank(query) == rank_chunks(CHUNKS, query)
+        assert store.select(query, top_k=2) == select_relevant_chunks(CHUNKS, query, top_k=2)
+
+
+def test_store_is_a_sequence_of_chunks():
+    store = ChunkStore.build(CHUNKS, pages=[1, 1, 2, 2, 3, 3])
+    assert len(store) == len(CHUNKS)
+    assert list(store) == CHUNKS
+    assert store[-2] == CHUNKS[-2]
+    assert store.page(4) == 3
+    assert ChunkStore.build(CHUNKS).page(4) == 0
+
+
+def test_postings_are_delta_encoded():
+    chunks = ["alpha" if index % 100 == 0 else "beta" for index in range(401)]
+    chunks[400] = "alpha alpha"
+    store = ChunkStore.build(chunks)
+    assert store.postings_of("alpha") == [(0, 1), (100, 1), (200, 1), (300, 1), (400, 2)]
+    assert store.postings_of("gamma") == []
+    # Gaps between the chunks holding a term stay small, so the postings fit in bytes past chunk 255
+    assert store.postings.itemsize == 1
+    assert max(store.postings) == 100
+
+
+def test_written_store_is_memory_mapped(tmp_path):
+    path = str(tmp_path / "document.idx")
+    built = ChunkStore.build(CHUNKS, pages=[1, 1, 2, 2, 3, 3])
+    built.write(path)
+    opened = ChunkStore.open(path)
+    assert isinstance(opened.text, memoryview) and opened.text.readonly
+    assert list(opened) == CHUNKS
+    assert opened.page(2) == 2
+    assert opened.nbytes == built.nbytes
+    for query in QUERIES:
+        assert opened.rank(query) == built.rank(query)
+
+
+def test_open_rejects_other_files(tmp_path):
+    path = tmp_path / "document.idx"
+    path.write_bytes(b"%PDF-1.7" + b"\0" * 200)
+    with pytest.raises(ValueError):
+        ChunkStore.open(str(path))
+
+
+def test_chunk_store_for_reuses_the_index_file():
+    text = " ".join(f"word{i}" for i in range(1000))
+    document = {"_id": "pdf1", "version": 0, "extracted_text": text}
+    store = chunk_store_for(document)
+    assert list(store) == chunk_text(text)
+    assert chunk_store_for(document) is store
+    assert len(os.listdir(chunk_store.CHUNK_INDEX_DIR)) == 1
+
+    # A new version of the record with the same text opens the file instead of rebuilding
+    builds = chunk_stores.builds
+    chunk_stores.clear()
+    assert list(chunk_store_for(dict(document, version=1))) == chunk_text(text)
+    assert chunk_stores.builds == builds
+
+    # Changed text gets a new index, and the old file is removed
+    chunk_store_for(dict(document, version=2, extracted_text="other text"))
+    assert len(os.listdir(chunk_store.CHUNK_INDEX_DIR)) == 1
+
+    assert chunk_stores.remove("pdf1") == 1
+    assert os.listdir(chunk_store.CHUNK_INDEX_DIR) == []
+
+
+def test_chunk_store_for_uses_stored_chunks():
+    document = {"_id": "pdf2", "extracted_text": "ignored", "chunks": ["| a | b |", "| c | d |"]}
+    assert list(chunk_store_for(document)) == ["| a | b |", "| c | d |"]
+
+
+def test_chunk_store_for_records_the_page_of_each_chunk():
+    pages = [" ".join(f"page{number}word{i}" for i in range(300)) for number in (1, 2, 3)]
+    document = {"_id": "pdf3", "extracted_text": "\f".join(pages), "page_count": 3}
+    store = chunk_store_for(document)
+    assert [store.page(index) for index in range(len(store))] == [1, 1, 2, 2, 3, 3]
+    for index in range(len(store)):
+        assert store[index].startswith(f"page{store.page(index)}")
+
+    # Stored layout chunks come with their pages
+    document = {"_id": "pdf4", "extracted_text": "ignored", "chunks": ["| a |", "| b |"], "chunk_pages": [2, 5]}
+    store = chunk_store_for(document)
+    assert [store.page(0), store.page(1)] == [2, 5]
@@ -0,0 +1,79 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import patch
+from app.utils.coalescing import SingleFlight, normalize_message
+from app.utils.gemini_utils import chat_with_pdf
+
+
+def test_normalize_message():
+    assert normalize_message("  What is  the TOTAL?\n") == normalize_message("what is the total?")
+
+
+async def test_concurrent_calls_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    results = await asyncio.gather(*(flight.do("key", call) for _ in range(10)), flight.do("other", call))
+    assert results == ["answer"] * 11
+    assert len(calls) == 2
+    assert flight.started == 2 and flight.coalesced == 9
+    assert flight.in_flight() == 0
+
+
+async def test_finished_calls_are_not_cached():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return len(calls)
+
+    assert await flight.do("key", call) == 1
+    assert await flight.do("key", call) == 2
+
+
+async def test_exceptions_reach_every_caller():
+    flight = SingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    results = await asyncio.gather(*(flight.do("key", call) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    first = asyncio.ensure_future(flight.do("key", call))
+    second = asyncio.ensure_future(flight.do("key", call))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "answer"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_identical_questions_share_one_upstream_call():
+    def slow_chat(message, text, deadline=None):
+        time.sleep(0.05)
+        return "Shared answer"
+
+    with patch("app.utils.gemini_utils.load_from_mongodb", return_value={"extracted_text": "Revenue grew by 5%."}) as mock_load, \
+         patch("app.utils.gemini_utils.chat_with_gemini", side_effect=slow_chat) as mock_chat:
+        questions = ["How much did revenue grow?", "how much did  revenue grow?", "What about costs?"]
+        results = await asyncio.gather(*(chat_with_pdf("pdf_id", question) for question in questions * 3))
+    assert all(result.status_code == 200 for result in results)
+    assert mock_chat.call_count == 2
+    assert mock_load.call_count == 1
@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import Mock, patch
+from fastapi import HTTPException
+from app.utils.context_packing import pack_context, prompt_token_budget, SEGMENT_SEPARATOR
+from app.utils.text_processing import count_tokens
+
+INSTRUCTIONS = "Answer the question using the document."
+
+
+def test_pack_context_fits_whole_document():
+    # A document that fits is sent unchanged
+    packed = pack_context("a short document", "question", [INSTRUCTIONS], budget=1000)
+    assert packed.text == "a short document"
+    assert packed.truncated is False
+    assert packed.tokens == count_tokens("a short document")
+
+
+def test_pack_context_keeps_relevant_chunks_in_order():
+    # Only the chunks about the question survive, in their original order
+    chunks = ["alpha " * 20, "solar panels efficiency " * 7, "beta " * 20, "solar storage batteries " * 7, "gamma " * 20]
+    document = " ".join(chunks)
+    with patch("app.utils.context_packing.chunk_text", return_value=[chunk.strip() for chunk in chunks]):
+        packed = pack_context(document, "solar", [INSTRUCTIONS], budget=count_tokens(INSTRUCTIONS) + 110)
+    assert packed.truncated is True
+    assert packed.text.split(SEGMENT_SEPARATOR) == [chunks[1].strip(), chunks[3].strip()]
+    assert packed.tokens <= 110
+
+
+def test_pack_context_uses_stored_chunks():
+    # Layout-mode documents pass their own chunks, so a table is packed whole or not at all
+    table = "| Region | Revenue |\n| --- | --- |\n| North | 120.5 |"
+    chunks = ["intro " * 40, table, "outro " * 40]
+    packed = pack_context(" ".join(chunks), "revenue north", [INSTRUCTIONS], budget=count_tokens(INSTRUCTIONS) + 40, chunks=chunks)
+    assert packed.text == table
+
+
+def test_pack_context_loads_chunks_only_when_the_document_overflows():
+    chunks = ["intro " * 40, "| North | 120.5 |", "outro " * 40]
+    load = Mock(return_value=chunks)
+    pack_context("a short document", "question", [INSTRUCTIONS], budget=1000, chunks=load)
+    load.assert_not_called()
+    packed = pack_context(" ".join(chunks), "north", [INSTRUCTIONS], budget=count_tokens(INSTRUCTIONS) + 40, chunks=load)
+    load.assert_called_once_with()
+    assert packed.text == chunks[1]
+
+
+def test_pack_context_prefers_summary():
+    # The precomputed summary is packed before any chunk
+    document = "word " * 500
+    packed = pack_context(document, "question", [INSTRUCTIONS], summary="A short summary.",
+                          budget=count_tokens(INSTRUCTIONS) + 20)
+    assert packed.text == "Document Summary: A short summary."
+
+
+def test_pack_context_rejects_oversized_prompt():
+    # The question alone does not fit: fail fast instead of upstream
+    with pytest.raises(HTTPException) as exc_info:
+        pack_context("document", "question " * 100, [INSTRUCTIONS, "question " * 100], budget=50)
+    assert exc_info.value.status_code == 400
+
+
+def test_prompt_token_budget_reserves_output():
+    with patch("app.utils.context_packing.MODEL_CONTEXT_TOKENS", 10000), \
+         patch("app.utils.context_packing.OUTPUT_TOKEN_RESERVE", 1000), \
+         patch("app.utils.context_packing.PROMPT_TOKEN_BUDGET", 0):
+        assert prompt_token_budget() == 9000
+        with patch("app.utils.context_packing.PROMPT_TOKEN_BUDGET", 5000):
+            assert prompt_token_budget() == 5000
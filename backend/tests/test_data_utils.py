@@ -1,13 +1,22 @@
 # Import necessary testing and mocking utilities
+import mongomock
 import pytest
 from unittest.mock import patch, Mock
 from fastapi import HTTPException
+from datetime import datetime
 from bson import ObjectId
 from app.utils.data_utils import (
     generate_unique_filename,
     save_to_mongodb,
     load_from_mongodb,
-    update_mongodb
+    update_mongodb,
+    list_pdfs,
+    get_pdf_metadata,
+    delete_from_mongodb,
+    find_stored_filenames,
+    find_stored_ids,
+    PDF_LIST_PROJECTION,
+    PDF_METADATA_PROJECTION
 )
 
 # Fixture to create a mock database instance for testing
@@ -100,11 +109,123 @@ def test_update_mongodb(mock_db):
         assert result == True
         mock_collection.update_one.assert_called_once_with(
             {"_id": ObjectId('123456789012345678901234')},
-            {"$set": {"filename": "updated.pdf"}}
+            {"$set": {"filename": "updated.pdf"}, "$inc": {"version": 1}}
         )
 
         # Scenario 2: Test unsuccessful update
         # Should return False when no document is modified
         mock_collection.update_one.return_value.modified_count = 0
         result = update_mongodb('123456789012345678901234', {"filename": "not_updated.pdf"})
-        assert result == False
\ No newline at end of file
+        assert result == False
+
+
+def test_save_to_mongodb_rejects_invalid_metadata(mock_db):
+    """Test that metadata not matching the PDFMetadata schema is never inserted"""
+    with patch('app.utils.data_utils.get_database', return_value=mock_db):
+        mock_collection = Mock()
+        mock_db.pdfs = mock_collection
+        data = {
+            "filename": "test.pdf",
+            "original_filename": "original.pdf",
+            "file_path": "/path/to/test.pdf",
+            "page_count": "many",
+            "size_kb": 1024,
+            "extracted_text": "Sample text",
+        }
+
+        with pytest.raises(HTTPException) as exc_info:
+            save_to_mongodb(data)
+        assert exc_info.value.status_code == 500
+        mock_collection.insert_one.assert_not_called()
+
+
+def test_save_to_mongodb_stores_the_detected_language():
+    """Test that the language detected at upload survives the round trip through MongoDB"""
+    with patch('app.utils.data_utils.get_database', return_value=mongomock.MongoClient().pdfchatai):
+        pdf_id = save_to_mongodb({
+            "filename": "rapport.pdf",
+            "original_filename": "rapport.pdf",
+            "file_path": "/path/to/rapport.pdf",
+            "page_count": 1,
+            "size_kb": 12,
+            "extracted_text": "Le chiffre d'affaires a augmenté.",
+            "language": "fr",
+        })
+        assert load_from_mongodb(pdf_id)["language"] == "fr"
+
+
+def test_list_pdfs_paginates_by_id(mock_db):
+    """Test keyset pagination of the PDF listing"""
+    with patch('app.utils.data_utils.get_database', return_value=mock_db):
+        ids = [ObjectId() for _ in range(3)]
+        mock_db.pdfs.find.return_value.sort.return_value.limit.return_value = iter(
+            [{"_id": object_id, "filename": f"{index}.pdf", "created_at": datetime(2024, 1, 1)} for index, object_id in enumerate(ids)]
+        )
+
+        # Scenario 1: More documents than the page size, so a cursor is returned
+        result = list_pdfs(limit=2)
+        mock_db.pdfs.find.assert_called_once_with({}, PDF_LIST_PROJECTION)
+        mock_db.pdfs.find.return_value.sort.assert_called_once_with("_id", 1)
+        mock_db.pdfs.find.return_value.sort.return_value.limit.assert_called_once_with(3)
+        assert [item["pdf_id"] for item in result["items"]] == [str(ids[0]), str(ids[1])]
+        assert result["items"][0]["created_at"] == "2024-01-01T00:00:00"
+        assert result["next_cursor"] == str(ids[1])
+
+        # Scenario 2: The cursor continues after the given ID; the last page has no cursor
+        mock_db.pdfs.find.return_value.sort.return_value.limit.return_value = iter([{"_id": ids[2]}])
+        result = list_pdfs(cursor=str(ids[1]), limit=2)
+        assert mock_db.pdfs.find.call_args[0][0] == {"_id": {"$gt": ids[1]}}
+        assert result == {"items": [{"pdf_id": str(ids[2])}], "next_cursor": None}
+
+        # Scenario 3: Invalid cursor
+        with pytest.raises(HTTPException) as exc_info:
+            list_pdfs(cursor="invalid")
+        assert exc_info.value.status_code == 400
+
+def test_get_pdf_metadata(mock_db):
+    """Test loading PDF metadata without the extracted text"""
+    with patch('app.utils.data_utils.get_database', return_value=mock_db):
+        object_id = ObjectId('123456789012345678901234')
+
+        # Scenario 1: Existing PDF
+        mock_db.pdfs.find_one.return_value = {"_id": object_id, "filename": "test.pdf", "page_count": 5}
+        result = get_pdf_metadata(str(object_id))
+        mock_db.pdfs.find_one.assert_called_once_with({"_id": object_id}, PDF_METADATA_PROJECTION)
+        assert result == {"pdf_id": str(object_id), "filename": "test.pdf", "page_count": 5}
+
+        # Scenario 2: Missing PDF
+        mock_db.pdfs.find_one.return_value = None
+        with pytest.raises(HTTPException) as exc_info:
+            get_pdf_metadata(str(object_id))
+        assert exc_info.value.status_code == 404
+
+        # Scenario 3: Invalid ID
+        with pytest.raises(HTTPException) as exc_info:
+            get_pdf_metadata("invalid")
+        assert exc_info.value.status_code == 404
+
+def test_delete_from_mongodb(mock_db):
+    """Test deleting a PDF record and returning its file path"""
+    with patch('app.utils.data_utils.get_database', return_value=mock_db):
+        mock_db.pdfs.find_one_and_delete.return_value = {"_id": ObjectId('123456789012345678901234'), "file_path": "/path/to/test.pdf"}
+        assert delete_from_mongodb('123456789012345678901234')["file_path"] == "/path/to/test.pdf"
+        assert mock_db.pdfs.find_one_and_delete.call_args[0][0] == {"_id": ObjectId('123456789012345678901234')}
+
+        # Invalid IDs match no record
+        assert delete_from_mongodb("invalid") is None
+
+def test_find_stored_filenames(mock_db):
+    """Test looking up which files still have a PDF record"""
+    with patch('app.utils.data_utils.get_database', return_value=mock_db):
+        mock_db.pdfs.find.return_value = [{"filename": "a.pdf"}]
+        assert find_stored_filenames(["a.pdf", "b.pdf"]) == {"a.pdf"}
+        mock_db.pdfs.find.assert_called_once_with({"filename": {"$in": ["a.pdf", "b.pdf"]}}, {"filename": 1, "_id": 0})
+
+
+def test_find_stored_ids(mock_db):
+    """Test looking up which PDF ids still have a record, ignoring ids that cannot be ones"""
+    pdf_id = "123456789012345678901234"
+    with patch('app.utils.data_utils.get_database', return_value=mock_db):
+        mock_db.pdfs.find.return_value = [{"_id": ObjectId(pdf_id)}]
+        assert find_stored_ids([pdf_id, "not-an-id"]) == {pdf_id}
+        mock_db.pdfs.find.assert_called_once_with({"_id": {"$in": [ObjectId(pdf_id)]}}, {"_id": 1})
@@ -72,3 +72,41 @@ async def test_chat_with_pdf_not_found():
         # Check error response
         assert exc_info.value.status_code == 404
         assert "PDF with ID non_existent_pdf_id not found" in str(exc_info.value.detail)
+
+# Test chatting inside a session: history and relevant chunks are sent, and the turn is stored
+@pytest.mark.asyncio
+async def test_chat_with_pdf_in_session():
+    session = {"_id": "session", "summary": "", "turns": [{"question": "What about cats?", "answer": "Cats sleep."}]}
+    with patch("app.utils.gemini_utils.load_from_mongodb") as mock_load, \
+         patch("app.utils.gemini_utils.load_session", return_value=session) as mock_session, \
+         patch("app.utils.gemini_utils.append_turn") as mock_append, \
+         patch("app.utils.gemini_utils.chat_with_gemini") as mock_chat:
+        mock_load.return_value = {"extracted_text": "Cats sleep a lot. Dogs bark."}
+        mock_chat.return_value = "They sleep sixteen hours."
+
+        result = await chat_with_pdf("test_pdf_id", "How long?", "session_id")
+
+        assert result.status_code == 200
+        assert result.body == b'{"response":"They sleep sixteen hours.","session_id":"session_id"}'
+        mock_session.assert_called_once_with("session_id", "test_pdf_id")
+        message, context, history = mock_chat.call_args[0]
+        assert message == "How long?"
+        assert "Cats sleep" in context
+        assert "User: What about cats?" in history
+        mock_append.assert_called_once_with(session, "How long?", "They sleep sixteen hours.")
+
+# Test that overview questions are answered from the precomputed summary without calling Gemini
+@pytest.mark.asyncio
+async def test_chat_with_pdf_overview_from_summary():
+    with patch("app.utils.gemini_utils.load_from_mongodb") as mock_load, \
+         patch("app.utils.gemini_utils.chat_with_gemini") as mock_chat:
+        mock_load.return_value = {
+            "extracted_text": "Test extracted text",
+            "summary": "A report on solar energy.",
+            "outline": [{"section": 1, "keywords": ["solar", "panels", "grid", "storage"]}],
+        }
+
+        result = await chat_with_pdf("test_pdf_id", "What is this document about?")
+
+        assert result.body == b'{"response":"A report on solar energy.\\n\\nKey topics: solar, panels, grid"}'
+        mock_chat.assert_not_called()
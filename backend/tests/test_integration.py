@@ -70,4 +70,37 @@ def test_rate_limiting():
     
     response = client.get("/health")
     assert response.status_code == 429
-    assert "Rate limit exceeded" in response.text
\ No newline at end of file
+    assert "Rate limit exceeded" in response.text
+
+def test_list_and_get_pdfs():
+    """
+    Test the listing and metadata endpoints.
+    The listing validates its page size; metadata of an unknown PDF returns 404.
+    """
+    page = {"items": [{"pdf_id": "123456789012345678901234", "filename": "test.pdf"}], "next_cursor": None}
+    with patch("app.main.list_pdfs", return_value=page) as mock_list:
+        response = client.get("/v1/pdfs?limit=5")
+        assert response.status_code == 200
+        assert response.json() == page
+        mock_list.assert_called_once_with(None, 5)
+
+    assert client.get("/v1/pdfs?limit=0").status_code == 422
+
+    with patch("app.main.get_pdf_metadata", return_value=page["items"][0]):
+        response = client.get("/v1/pdf/123456789012345678901234")
+        assert response.status_code == 200
+        assert response.json()["filename"] == "test.pdf"
+
+
+def test_delete_pdf():
+    """
+    Test the deletion endpoint for an existing and an unknown PDF.
+    """
+    with patch("app.main.delete_pdf", return_value={"pdf_id": "123456789012345678901234", "deleted": True}):
+        response = client.delete("/v1/pdf/123456789012345678901234")
+        assert response.status_code == 200
+        assert response.json()["deleted"] is True
+
+    with patch("app.utils.pdf_utils.delete_from_mongodb", return_value=None):
+        response = client.delete("/v1/pdf/123456789012345678901234")
+        assert response.status_code == 404
@@ -0,0 +1,68 @@
+import pytest
+from unittest.mock import Mock, patch
+from app.utils.language import detect_language, folds_accents
+from app.utils.nlp_pool import PipelinePool, parse_models
+
+
+@pytest.mark.parametrize("text, language", [
+    ("The report covers the results of the year and the plans for the next one.", "en"),
+    ("Bu belge, şirketin yıllık raporunu ve bir sonraki yıl için planlarını içermektedir.", "tr"),
+    ("Das ist ein Bericht über die Ergebnisse des Jahres und die Pläne für das nächste Jahr.", "de"),
+    ("Этот документ содержит годовой отчет компании и ее планы на следующий год.", "ru"),
+    ("本文件包含公司的年度报告和明年的计划。", "zh"),
+    ("この文書には会社の年次報告書と来年の計画が含まれています。", "ja"),
+    ("이 문서에는 회사의 연례 보고서와 내년 계획이 포함되어 있습니다.", "ko"),
+])
+def test_detect_language(text, language):
+    assert detect_language(text) == language
+
+
+def test_detect_language_falls_back_to_the_default():
+    assert detect_language("Raw text") == "en"
+    assert detect_language("12 34", default="tr") == "tr"
+
+
+def test_folds_accents_for_latin_script_only():
+    assert folds_accents("tr") and folds_accents("en")
+    assert not folds_accents("hi") and not folds_accents("xx")
+
+
+def test_parse_models_skips_malformed_entries():
+    assert parse_models("en:en_core_web_sm, broken ,de:de_core_news_sm") == {"en": "en_core_web_sm", "de": "de_core_news_sm"}
+
+
+def test_pool_loads_each_language_once_and_evicts_least_recently_used():
+    pool = PipelinePool({"en": "en_core_web_sm"}, max_pipelines=2, max_bytes=10 ** 9)
+    with patch("app.utils.nlp_pool.spacy.load", return_value=Mock()) as load, \
+         patch("app.utils.nlp_pool.spacy.blank", side_effect=lambda language: Mock(lang=language)) as blank, \
+         patch("app.utils.nlp_pool.package_size", return_value=1000):
+        english = pool.get("en")
+        assert pool.get("en") is english
+        pool.get("tr")
+        pool.get("en")
+        pool.get("de")
+    load.assert_called_once_with("en_core_web_sm")
+    assert [call.args[0] for call in blank.call_args_list] == ["tr", "de"]
+    assert pool.stats()["languages"] == ["en", "de"]
+    assert pool.evictions == 1
+
+
+def test_pool_stays_within_its_memory_cap():
+    pool = PipelinePool({}, max_pipelines=10, max_bytes=20 * 1024 * 1024)
+    with patch("app.utils.nlp_pool.spacy.blank", side_effect=lambda language: Mock(lang=language)):
+        for language in ["en", "tr", "de", "fr"]:
+            pool.get(language)
+    assert pool.stats()["languages"] == ["de", "fr"]
+    assert pool.bytes <= pool.max_bytes
+
+
+def test_pool_falls_back_to_the_multi_language_tokenizer():
+    pool = PipelinePool({}, max_pipelines=2, max_bytes=10 ** 9)
+
+    def blank(language):
+        if language == "th":
+            raise ImportError("The Thai tokenizer requires the PyThaiNLP library")
+        return Mock(lang=language)
+
+    with patch("app.utils.nlp_pool.spacy.blank", side_effect=blank):
+        assert pool.get("th").lang == "xx"
@@ -0,0 +1,82 @@
+from app.utils.layout_utils import (
+    PAGE_BREAK,
+    parse_layout,
+    records_to_markdown,
+    layout_chunks,
+    layout_chunks_and_pages,
+    is_heading
+)
+from app.utils.pdf_utils import extract_text_from_pdf
+from loadtests.pdf_factory import make_report_pdf
+
+PAGE = """
+    1. Financial Results
+
+    Revenue grew in every region this year, driven by new
+    customers in the north.
+
+    Region          Revenue        Margin
+    North           120.5          12.1%
+    South           98.0           9.4%
+
+    Total    218.5
+"""
+
+
+def test_is_heading():
+    assert is_heading("1. Financial Results")
+    assert is_heading("RISK FACTORS")
+    assert is_heading("Outlook For The Next Year")
+    assert not is_heading("Revenue grew in every region this year.")
+    assert not is_heading("Region          Revenue")
+
+
+def test_parse_layout():
+    records = parse_layout(PAGE + PAGE_BREAK + "SECOND PAGE")
+    assert [(record["type"], record["page"]) for record in records] == [
+        ("heading", 1), ("text", 1), ("table", 1), ("text", 1), ("heading", 2)
+    ]
+    assert records[1]["text"] == "Revenue grew in every region this year, driven by new customers in the north."
+    assert records[2]["text"] == (
+        "| Region | Revenue | Margin |\n"
+        "| --- | --- | --- |\n"
+        "| North | 120.5 | 12.1% |\n"
+        "| South | 98.0 | 9.4% |"
+    )
+    # A single columnar line is kept as text
+    assert records[3]["text"] == "Total 218.5"
+
+
+def test_records_to_markdown():
+    markdown = records_to_markdown(parse_layout(PAGE))
+    assert markdown.startswith("## 1. Financial Results\n\nRevenue grew")
+    assert "| North | 120.5 | 12.1% |" in markdown
+
+
+def test_layout_chunks_index_tables_separately():
+    rows = "\n".join(f"    Item {index}      {index * 10}" for index in range(5))
+    records = parse_layout("    Price List\n\n    Intro text before the table.\n\n    Name        Price\n" + rows)
+    chunks = layout_chunks(records, rows_per_chunk=2)
+    assert chunks[0] == "## Price List\nIntro text before the table."
+    # Every table chunk repeats the section heading and the table header
+    assert len(chunks) == 4
+    for chunk in chunks[1:]:
+        assert chunk.startswith("## Price List\n| Name | Price |\n| --- | --- |\n")
+    assert chunks[-1].endswith("| Item 4 | 40 |")
+
+
+def test_layout_extraction_of_generated_pdf(tmp_path):
+    pdf_path = tmp_path / "report.pdf"
+    pdf_path.write_bytes(make_report_pdf(pages=2, seed=1))
+    text, page_count = extract_text_from_pdf(str(pdf_path), "report.pdf", extraction_mode="layout")
+    assert page_count == 2
+    records = parse_layout(text)
+    assert [record["type"] for record in records].count("table") == 2
+    assert {record["page"] for record in records} == {1, 2}
+    assert records[0]["type"] == "heading" and records[0]["text"].startswith("1. ")
+
+    # Every chunk knows the page it starts on
+    chunks, pages = layout_chunks_and_pages(records)
+    assert len(pages) == len(chunks)
+    assert pages[0] == 1 and pages[-1] == 2
+    assert pages == sorted(pages)
@@ -0,0 +1,72 @@
+import pytest
+from unittest.mock import patch, Mock
+from app.utils.llm_providers import FakeProvider, LLMProvider, get_llm_provider, register_provider
+from app.utils.gemini_utils import GeminiProvider, generate_text
+
+
+def make_fake(**kwargs):
+    # Record sleeps instead of sleeping
+    sleeps = []
+    provider = FakeProvider(sleep=sleeps.append, **kwargs)
+    return provider, sleeps
+
+
+def test_fake_provider_is_deterministic():
+    # The same seed gives the same latencies and answers
+    first, first_sleeps = make_fake(seed=7)
+    second, second_sleeps = make_fake(seed=7)
+    assert [first.generate("What is it?").text for _ in range(3)] == [second.generate("What is it?").text for _ in range(3)]
+    assert first_sleeps == second_sleeps
+    assert first.calls == 3
+
+
+def test_fake_provider_latency_and_usage_distribution():
+    provider, sleeps = make_fake(latency_ms=100, latency_sigma=0.5, output_tokens=50, output_tokens_sigma=0.3, seed=1)
+    responses = [provider.generate("prompt text") for _ in range(200)]
+    median_latency = sorted(sleeps)[len(sleeps) // 2]
+    median_tokens = sorted(response.output_tokens for response in responses)[len(responses) // 2]
+    assert 0.08 < median_latency < 0.12
+    assert 40 < median_tokens < 60
+    assert all(len(response.text.split()) == response.output_tokens for response in responses)
+    assert responses[0].prompt_tokens == 3
+
+
+def test_fake_provider_without_latency():
+    provider, sleeps = make_fake(latency_ms=0)
+    provider.generate("prompt")
+    assert sleeps == [0.0]
+
+
+def test_fake_provider_stream():
+    provider, sleeps = make_fake(output_tokens=45, output_tokens_sigma=0, stream_chunk_tokens=20, seed=3)
+    chunks = list(provider.stream("a streamed prompt"))
+    assert len(chunks) == 3
+    assert len("".join(chunks).split()) == 45
+    assert len(sleeps) == 4  # time to first token plus one pause per chunk
+
+
+def test_get_llm_provider_registry():
+    factory = Mock(return_value=Mock(spec=LLMProvider))
+    register_provider("custom-test", factory)
+    assert get_llm_provider("custom-test") is get_llm_provider("custom-test")
+    factory.assert_called_once()
+    with pytest.raises(ValueError):
+        get_llm_provider("missing")
+
+
+def test_gemini_provider_uses_reported_usage():
+    with patch("app.utils.gemini_utils.genai") as mock_genai:
+        response = mock_genai.GenerativeModel.return_value.generate_content.return_value
+        response.text = "Gemini answer"
+        response.usage_metadata.prompt_token_count = 120
+        response.usage_metadata.candidates_token_count = 3
+        result = GeminiProvider().generate("prompt")
+    assert (result.text, result.prompt_tokens, result.output_tokens) == ("Gemini answer", 120, 3)
+
+
+def test_generate_text_with_fake_provider():
+    # The fake backend needs no API key
+    provider, _ = make_fake(output_tokens=5, output_tokens_sigma=0)
+    with patch("app.utils.gemini_utils.get_llm_provider", return_value=provider), \
+         patch("app.utils.gemini_utils.GEMINI_API_KEY", None):
+        assert len(generate_text("one two three").split()) == 5
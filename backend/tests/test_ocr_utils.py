@@ -0,0 +1,109 @@
+import shutil
+import threading
+import pytest
+from concurrent.futures import Future
+from unittest.mock import Mock, MagicMock, patch, mock_open
+from fastapi import HTTPException
+from app.core.config import settings
+import app.utils.ocr_utils as ocr_utils
+from app.utils.ocr_utils import ocr_pages, ocr_images, page_hash
+from app.utils.pdf_utils import extract_text_from_pdf
+
+
+class InlinePool:
+    # Runs submitted work synchronously, in place of the OCR process pool
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args)
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@pytest.fixture
+def mock_db():
+    db = MagicMock()
+    db.ocr_cache.find.return_value = []
+    with patch("app.utils.ocr_utils.get_database", return_value=db):
+        yield db
+
+
+@pytest.fixture
+def pool():
+    pool = InlinePool()
+    with patch("app.utils.ocr_utils.get_ocr_pool", return_value=pool), \
+         patch("app.utils.ocr_utils.ocr_images", side_effect=lambda images, language: f"text of {len(images)} images"):
+        yield pool
+
+
+def test_ocr_pages_and_cache(mock_db, pool):
+    result = ocr_pages({0: [b"scan-1"], 2: [b"scan-2", b"scan-3"], 3: []}, "scan.pdf")
+    assert result == {0: "text of 1 images", 2: "text of 2 images"}
+    assert len(pool.submitted) == 2
+    assert mock_db.ocr_cache.update_one.call_count == 2
+    # Every slot is back once the pages are done
+    assert ocr_utils._slots._value == settings.OCR_MAX_QUEUED_PAGES
+
+
+def test_cached_pages_are_not_recognized_again(mock_db, pool):
+    digest = page_hash([b"scan-1"], settings.OCR_LANGUAGE)
+    mock_db.ocr_cache.find.return_value = [{"_id": digest, "text": "cached text"}]
+    assert ocr_pages({0: [b"scan-1"]}, "scan.pdf") == {0: "cached text"}
+    assert pool.submitted == []
+    mock_db.ocr_cache.update_one.assert_not_called()
+
+
+def test_page_hash_depends_on_content_and_language():
+    assert page_hash([b"a"], "eng") == page_hash([b"a"], "eng")
+    assert page_hash([b"a"], "eng") != page_hash([b"a"], "deu")
+    assert page_hash([b"ab"], "eng") != page_hash([b"a", b"b"], "eng")
+
+
+def test_ocr_sheds_load_when_capacity_is_exhausted(mock_db, pool):
+    with patch("app.utils.ocr_utils._slots", threading.BoundedSemaphore(1)) as slots:
+        with pytest.raises(HTTPException) as exc_info:
+            ocr_pages({0: [b"scan-1"], 1: [b"scan-2"]}, "scan.pdf")
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {"Retry-After": str(settings.OCR_RETRY_AFTER_SECONDS)}
+        assert pool.submitted == []
+        assert slots._value == 1
+
+
+def test_ocr_timeout_fails_with_504(mock_db):
+    # The pool never gets to the pages
+    pool = Mock()
+    pool.submit.side_effect = lambda fn, *args: Future()
+    with patch("app.utils.ocr_utils.get_ocr_pool", return_value=pool), \
+         patch.object(settings, "OCR_PAGE_TIMEOUT_SECONDS", 0.01):
+        with pytest.raises(HTTPException) as exc_info:
+            ocr_pages({0: [b"scan-1"], 1: [b"scan-2"]}, "scan.pdf")
+    assert exc_info.value.status_code == 504
+    mock_db.ocr_cache.update_one.assert_not_called()
+    # The pages are cancelled, which gives their slots back
+    assert ocr_utils._slots._value == settings.OCR_MAX_QUEUED_PAGES
+
+
+@patch("app.utils.pdf_utils.PdfReader")
+def test_extract_text_falls_back_to_ocr(mock_pdf_reader, mock_db, pool):
+    scanned = Mock(extract_text=lambda: "", images=[Mock(data=b"scan")])
+    mock_pdf_reader.return_value.pages = [Mock(extract_text=lambda: "Page 1 text"), scanned]
+    with patch("builtins.open", mock_open(read_data=b"%PDF-1.5")), patch.object(settings, "OCR_ENABLED", True):
+        extracted_text, page_count = extract_text_from_pdf("/path/to/scan.pdf", "scan.pdf")
+    assert extracted_text == "Page 1 text\ftext of 1 images"
+    assert page_count == 2
+
+
+@pytest.mark.skipif(shutil.which("tesseract") is None, reason="tesseract is not installed")
+def test_ocr_images_with_tesseract():
+    Image = pytest.importorskip("PIL.Image")
+    ImageDraw = pytest.importorskip("PIL.ImageDraw")
+    pytest.importorskip("pytesseract")
+    import io
+
+    image = Image.new("L", (600, 120), 255)
+    ImageDraw.Draw(image).text((20, 40), "INVOICE 2024", fill=0)
+    buffer = io.BytesIO()
+    image.resize((1800, 360)).save(buffer, format="PNG")
+    assert "INVOICE" in ocr_images([buffer.getvalue()], "eng").upper()
@@ -0,0 +1,115 @@
+import mongomock
+import pytest
+from unittest.mock import patch
+from app.utils.pdf_cache import ByteLRUCache, document_size, pdf_cache
+from app.utils.data_utils import save_to_mongodb, load_from_mongodb, update_mongodb, delete_from_mongodb
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = ByteLRUCache(max_bytes=300, revalidate_seconds=60)
+    cache.put("a", "A", 0, 100)
+    cache.put("b", "B", 0, 100)
+    cache.put("c", "C", 0, 100)
+    cache.get("a")
+    cache.put("d", "D", 0, 150)
+    assert cache.get("b") == (None, False)
+    assert cache.get("c") == (None, False)
+    assert cache.get("a") == ("A", True)
+    assert cache.bytes == 250
+    assert cache.stats()["evictions"] == 2
+
+
+def test_values_larger_than_the_cache_are_not_kept():
+    cache = ByteLRUCache(max_bytes=100, revalidate_seconds=60)
+    cache.put("a", "A", 0, 50)
+    cache.put("a", "A2", 1, 500)
+    assert cache.get("a") == (None, False)
+    assert cache.bytes == 0
+
+
+def test_entries_go_stale_after_the_revalidation_period():
+    clock = Clock()
+    cache = ByteLRUCache(max_bytes=1000, revalidate_seconds=5, clock=clock)
+    cache.put("a", "A", 3, 10)
+    clock.now = 6
+    assert cache.get("a") == ("A", False)
+    cache.revalidated("a")
+    assert cache.get("a") == ("A", True)
+    assert cache.version("a") == 3
+
+
+def test_values_read_before_an_invalidation_are_not_cached():
+    cache = ByteLRUCache(max_bytes=1000, revalidate_seconds=5)
+    generation = cache.generation
+    cache.invalidate("a")
+    cache.put("a", "outdated", 0, 10, generation)
+    assert cache.get("a") == (None, False)
+
+
+def test_document_size_counts_text_and_chunks():
+    small = document_size({"extracted_text": "x"})
+    large = document_size({"extracted_text": "x" * 10000, "chunks": ["y" * 5000, "z" * 5000], "page_count": 3})
+    assert large - small > 20000
+
+
+@pytest.fixture
+def database():
+    database = mongomock.MongoClient().pdfchatai
+    with patch("app.utils.data_utils.get_database", return_value=database):
+        yield database
+
+
+def save_document(text="Revenue grew by 5%."):
+    return save_to_mongodb({"filename": "a.pdf", "original_filename": "a.pdf", "file_path": "a.pdf",
+                            "page_count": 1, "size_kb": 1.0, "extracted_text": text})
+
+
+def test_hot_documents_skip_the_database(database):
+    pdf_id = save_document()
+    assert load_from_mongodb(pdf_id)["extracted_text"] == "Revenue grew by 5%."
+    with patch.object(database.pdfs, "find_one", side_effect=AssertionError("database read")):
+        document = load_from_mongodb(pdf_id)
+    assert document["extracted_text"] == "Revenue grew by 5%."
+    # Callers get their own copy
+    document["extracted_text"] = "changed"
+    assert load_from_mongodb(pdf_id)["extracted_text"] == "Revenue grew by 5%."
+
+
+def test_updates_invalidate_the_cached_document(database):
+    pdf_id = save_document()
+    load_from_mongodb(pdf_id)
+    update_mongodb(pdf_id, {"summary": "A revenue report."})
+    document = load_from_mongodb(pdf_id)
+    assert document["summary"] == "A revenue report."
+    assert document["version"] == 1
+
+
+def test_updates_by_other_workers_are_seen_after_revalidation(database):
+    clock = Clock()
+    with patch.object(pdf_cache, "clock", clock):
+        pdf_id = save_document()
+        load_from_mongodb(pdf_id)
+        # Another worker updates the record: this process's cache is not told
+        database.pdfs.update_one({}, {"$set": {"summary": "Updated"}, "$inc": {"version": 1}})
+        assert "summary" not in load_from_mongodb(pdf_id)
+        clock.now += pdf_cache.revalidate_seconds + 1
+        assert load_from_mongodb(pdf_id)["summary"] == "Updated"
+        # Unchanged documents are revalidated with the version only
+        clock.now += pdf_cache.revalidate_seconds + 1
+        assert load_from_mongodb(pdf_id)["summary"] == "Updated"
+        assert pdf_cache.stats()["revalidations"] == 1
+
+
+def test_deleted_documents_are_not_served(database):
+    pdf_id = save_document()
+    load_from_mongodb(pdf_id)
+    delete_from_mongodb(pdf_id)
+    assert load_from_mongodb(pdf_id) is None
@@ -1,6 +1,8 @@
 import pytest
 from fastapi import UploadFile, HTTPException
-from unittest.mock import Mock, patch, mock_open
+from unittest.mock import Mock, patch, mock_open, ANY
+import hashlib
+import threading
 from app.utils.pdf_utils import (
     upload_pdf,
     validate_pdf_file,
@@ -8,9 +10,20 @@ from app.utils.pdf_utils import (
     save_pdf_file,
     extract_text_from_pdf,
     preprocess_extracted_text,
-    store_pdf_data
+    store_pdf_data,
+    delete_pdf
 )
 from app.core.config import settings
+from app.utils.summary_utils import precompute_summary
+from loadtests.pdf_factory import make_text_pdf
+import app.utils.pdf_utils as pdf_utils
+
+@pytest.fixture(autouse=True)
+def reset_nlp_cache():
+    # spaCy pipelines are cached per process; start each test without them
+    pdf_utils.nlp_pool.clear()
+    yield
+    pdf_utils.nlp_pool.clear()
 
 @pytest.fixture
 def mock_pdf_file():
@@ -19,8 +32,8 @@ def mock_pdf_file():
 
 @pytest.fixture
 def mock_content():
-    # Creates mock PDF binary content for testing
-    return b"Mock PDF content"
+    # Creates mock PDF binary content for testing; uploads check its structure before anything else
+    return make_text_pdf("Mock PDF content")
 
 @pytest.mark.asyncio
 async def test_upload_pdf_success(mock_pdf_file, mock_content):
@@ -39,6 +52,73 @@ async def test_upload_pdf_success(mock_pdf_file, mock_content):
         result = await upload_pdf(mock_pdf_file)
         assert result == {"pdf_id": "pdf_id_123"}
 
+@pytest.mark.asyncio
+async def test_upload_pdf_blocks_no_event_loop(mock_pdf_file, mock_content):
+    # Storage, parsing, spaCy and MongoDB calls all run in the threadpool
+    mock_pdf_file.read.return_value = mock_content
+    loop_thread = threading.current_thread()
+    threads = []
+
+    def record(value):
+        return lambda *args, **kwargs: threads.append(threading.current_thread()) or value
+
+    with patch("app.utils.pdf_utils.save_pdf_file", side_effect=record("/path/to/saved/file.pdf")), \
+         patch("app.utils.pdf_utils.extract_text_from_pdf", side_effect=record(("Extracted text", 1))), \
+         patch("app.utils.pdf_utils.preprocess_extracted_text", side_effect=record("Processed text")), \
+         patch("app.utils.pdf_utils.store_pdf_data", side_effect=record("pdf_id_123")):
+        assert await upload_pdf(mock_pdf_file) == {"pdf_id": "pdf_id_123"}
+    assert len(threads) == 4 and loop_thread not in threads
+
+@pytest.mark.asyncio
+async def test_upload_pdf_schedules_summary(mock_pdf_file, mock_content):
+    # Tests that the summary stage is scheduled in the background when enabled
+    mock_pdf_file.read.return_value = mock_content
+    background_tasks = Mock()
+    with patch("app.utils.pdf_utils.save_pdf_file", return_value="/path/to/saved/file.pdf"), \
+         patch("app.utils.pdf_utils.extract_text_from_pdf", return_value=("Extracted text", 1)), \
+         patch("app.utils.pdf_utils.preprocess_extracted_text", return_value="Processed text"), \
+         patch("app.utils.pdf_utils.store_pdf_data", return_value="pdf_id_123"), \
+         patch.object(settings, "SUMMARY_PRECOMPUTE_ENABLED", True):
+        result = await upload_pdf(mock_pdf_file, background_tasks)
+    assert result == {"pdf_id": "pdf_id_123"}
+    background_tasks.add_task.assert_called_once_with(precompute_summary, "pdf_id_123", "Processed text", "en")
+
+@pytest.mark.asyncio
+async def test_upload_pdf_removes_file_on_failure(mock_pdf_file, mock_content):
+    # Tests that a file saved before a failed processing step does not stay on disk
+    mock_pdf_file.read.return_value = mock_content
+    with patch("app.utils.pdf_utils.save_pdf_file", return_value="/path/to/saved/file.pdf"), \
+         patch("app.utils.pdf_utils.extract_text_from_pdf", side_effect=HTTPException(status_code=400, detail="No text")), \
+         patch("app.utils.pdf_utils.os.remove") as mock_remove:
+        with pytest.raises(HTTPException) as exc_info:
+            await upload_pdf(mock_pdf_file)
+    assert exc_info.value.status_code == 400
+    mock_remove.assert_called_once_with("/path/to/saved/file.pdf")
+
+@pytest.mark.asyncio
+async def test_upload_pdf_layout_mode(mock_pdf_file, mock_content):
+    # Tests that layout mode keeps tables as Markdown and stores its own chunks
+    mock_pdf_file.read.return_value = mock_content
+    layout_text = "  Quarterly Results\n\n  Region     Revenue\n  North      120.5\n  South      98.0\n"
+    with patch("app.utils.pdf_utils.save_pdf_file", return_value="/path/to/saved/file.pdf"), \
+         patch("app.utils.pdf_utils.extract_text_from_pdf", return_value=(layout_text, 1)) as mock_extract, \
+         patch("app.utils.pdf_utils.preprocess_extracted_text") as mock_preprocess, \
+         patch("app.utils.pdf_utils.store_pdf_data", return_value="pdf_id_123") as mock_store:
+        result = await upload_pdf(mock_pdf_file, extraction_mode="layout")
+    assert result == {"pdf_id": "pdf_id_123"}
+    mock_extract.assert_called_once_with("/path/to/saved/file.pdf", "test.pdf", "layout")
+    mock_preprocess.assert_not_called()
+    processed_text, chunks = mock_store.call_args[0][4:]
+    assert "| North | 120.5 |" in processed_text
+    assert chunks == ["## Quarterly Results\n| Region | Revenue |\n| --- | --- |\n| North | 120.5 |\n| South | 98.0 |"]
+
+@pytest.mark.asyncio
+async def test_upload_pdf_invalid_extraction_mode(mock_pdf_file):
+    # Tests rejection of an unknown extraction mode
+    with pytest.raises(HTTPException) as exc_info:
+        await upload_pdf(mock_pdf_file, extraction_mode="ocr")
+    assert exc_info.value.status_code == 400
+
 @pytest.mark.asyncio
 async def test_upload_pdf_invalid_file(mock_pdf_file):
     # Tests rejection of non-PDF file upload
@@ -91,16 +171,16 @@ def test_save_pdf_file(mock_content):
 def test_extract_text_from_pdf_success(mock_pdf_reader):
     # Tests successful text extraction from PDF with multiple pages
     mock_pdf_reader.return_value.pages = [Mock(extract_text=lambda: "Page 1 text"), Mock(extract_text=lambda: "Page 2 text")]
-    with patch("builtins.open", mock_open()):
+    with patch("builtins.open", mock_open(read_data=b"%PDF-1.5")):
         extracted_text, page_count = extract_text_from_pdf("/path/to/test.pdf", "test.pdf")
-    assert extracted_text == "Page 1 textPage 2 text"
+    assert extracted_text == "Page 1 text\fPage 2 text"
     assert page_count == 2
 
 @patch("app.utils.pdf_utils.PdfReader")
 def test_extract_text_from_pdf_no_text(mock_pdf_reader):
     # Tests handling of PDF with no extractable text
     mock_pdf_reader.return_value.pages = [Mock(extract_text=lambda: "")]
-    with patch("builtins.open", mock_open()):
+    with patch("builtins.open", mock_open(read_data=b"%PDF-1.5")):
         with pytest.raises(HTTPException) as exc_info:
             extract_text_from_pdf("/testfiles/empty.pdf", "empty.pdf")
     assert exc_info.value.status_code == 400
@@ -114,14 +194,14 @@ def test_extract_text_from_pdf_multiple_pages(mock_pdf_reader):
         Mock(extract_text=lambda: "Page 2 text"),
         Mock(extract_text=lambda: "Page 3 text")
     ]
-    with patch("builtins.open", mock_open()):
+    with patch("builtins.open", mock_open(read_data=b"%PDF-1.5")):
         extracted_text, page_count = extract_text_from_pdf("/path/to/test.pdf", "test.pdf")
-    assert extracted_text == "Page 1 textPage 2 textPage 3 text"
+    assert extracted_text == "Page 1 text\fPage 2 text\fPage 3 text"
     assert page_count == 3
 
 def test_preprocess_extracted_text():
     # Tests text preprocessing with spaCy
-    with patch("app.utils.pdf_utils.spacy.load") as mock_load, \
+    with patch("app.utils.nlp_pool.spacy.load") as mock_load, \
          patch("app.utils.pdf_utils.preprocess_text") as mock_preprocess:
         mock_nlp = Mock()
         mock_load.return_value = mock_nlp
@@ -134,7 +214,7 @@ def test_preprocess_extracted_text():
 
 def test_preprocess_extracted_text_empty():
     # Tests preprocessing of empty text
-    with patch("app.utils.pdf_utils.spacy.load") as mock_load, \
+    with patch("app.utils.nlp_pool.spacy.load") as mock_load, \
          patch("app.utils.pdf_utils.preprocess_text") as mock_preprocess:
         mock_nlp = Mock()
         mock_load.return_value = mock_nlp
@@ -159,6 +239,10 @@ def test_store_pdf_data():
             "page_count": 2,
             "size_kb": len(b"content") / 1024,
             "extracted_text": "Processed text",
+            "content_hash": hashlib.sha256(b"content").hexdigest(),
+            "status": "ready",
+            "created_at": ANY,
+            "schema_version": 1,
         })
 
 def test_store_pdf_data_large_file():
@@ -176,4 +260,83 @@ def test_store_pdf_data_large_file():
             "page_count": 100,
             "size_kb": len(large_content) / 1024,
             "extracted_text": "Large processed text",
+            "content_hash": hashlib.sha256(large_content).hexdigest(),
+            "status": "ready",
+            "created_at": ANY,
+            "schema_version": 1,
         })
+
+
+def test_store_pdf_data_with_retention():
+    # Tests that uploads get an expiry date when a retention policy is set
+    mock_file = Mock(spec=UploadFile, filename="original.pdf")
+    with patch("app.utils.pdf_utils.save_to_mongodb") as mock_save, \
+         patch.object(settings, "PDF_RETENTION_DAYS", 30):
+        store_pdf_data(mock_file, "/path/to/file.pdf", b"content", 2, "Processed text")
+    data = mock_save.call_args[0][0]
+    assert (data["expires_at"] - data["created_at"]).days == 30
+
+def test_preprocess_extracted_text_uses_the_pipeline_of_the_language():
+    # Tests that Turkish text gets a Turkish tokenizer and keeps its letters whole
+    text = "Bu rapor, şirketin bu yıl için planlarını ve bütçesini içermektedir."
+    with patch("app.utils.nlp_pool.spacy.load") as mock_load:
+        result = preprocess_extracted_text(text, "rapor.pdf")
+    mock_load.assert_not_called()
+    assert pdf_utils.nlp_pool.stats()["languages"] == ["tr"]
+    assert "sirketin" in result.split()
+
+@pytest.mark.asyncio
+async def test_upload_pdf_stores_the_detected_language(mock_pdf_file, mock_content):
+    # Tests that the language detected at ingest is stored with the PDF
+    mock_pdf_file.read.return_value = mock_content
+    with patch("app.utils.pdf_utils.save_pdf_file", return_value="/path/to/saved/file.pdf"), \
+         patch("app.utils.pdf_utils.extract_text_from_pdf", return_value=("Das ist der Bericht über das Jahr und die Pläne.", 1)), \
+         patch("app.utils.pdf_utils.preprocess_extracted_text", return_value="Processed text") as mock_preprocess, \
+         patch("app.utils.pdf_utils.store_pdf_data", return_value="pdf_id_123") as mock_store:
+        await upload_pdf(mock_pdf_file)
+    assert mock_preprocess.call_args[0][2] == "de"
+    assert mock_store.call_args[1]["language"] == "de"
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content, detail", [
+    (b"Mock PDF content", "not a PDF"),
+    (make_text_pdf("Mock PDF content")[:200], "truncated"),
+    (make_text_pdf("\n".join(["Mock PDF content"] * 130), lines_per_page=1), "130 pages"),
+])
+async def test_upload_pdf_rejects_before_saving(mock_pdf_file, content, detail):
+    # Tests that malformed and oversized PDFs are rejected before they are saved or parsed
+    mock_pdf_file.read.return_value = content
+    with patch("app.utils.pdf_utils.save_pdf_file") as mock_save, \
+         patch("app.utils.pdf_utils.extract_text_from_pdf") as mock_extract, \
+         patch.object(pdf_utils, "MAX_PDF_PAGES", 100):
+        with pytest.raises(HTTPException) as exc_info:
+            await upload_pdf(mock_pdf_file)
+    assert exc_info.value.status_code == 400
+    assert detail in exc_info.value.detail
+    mock_save.assert_not_called()
+    mock_extract.assert_not_called()
+
+def test_delete_pdf():
+    # Tests deleting the record, the file and the chat sessions of a PDF
+    with patch("app.utils.pdf_utils.delete_from_mongodb", return_value={"file_path": "/path/to/file.pdf"}), \
+         patch("app.utils.pdf_utils.delete_sessions", return_value=2) as mock_sessions, \
+         patch("app.utils.pdf_utils.os.remove", side_effect=FileNotFoundError) as mock_remove:
+        assert delete_pdf("pdf_id_123") == {"pdf_id": "pdf_id_123", "deleted": True}
+    mock_remove.assert_called_once_with("/path/to/file.pdf")
+    mock_sessions.assert_called_once_with("pdf_id_123")
+
+    with patch("app.utils.pdf_utils.delete_from_mongodb", return_value=None):
+        with pytest.raises(HTTPException) as exc_info:
+            delete_pdf("missing")
+    assert exc_info.value.status_code == 404
+
+def test_store_pdf_data_layout_chunks():
+    # Tests that layout-mode chunks are stored with the document
+    mock_file = Mock(spec=UploadFile, filename="original.pdf")
+    with patch("app.utils.pdf_utils.save_to_mongodb") as mock_save:
+        store_pdf_data(mock_file, "/path/to/file.pdf", b"content", 2, "Processed text", ["chunk 1", "chunk 2"],
+                       chunk_pages=[1, 2])
+    data = mock_save.call_args[0][0]
+    assert data["extraction_mode"] == "layout"
+    assert data["chunks"] == ["chunk 1", "chunk 2"]
+    assert data["chunk_pages"] == [1, 2]
@@ -0,0 +1,176 @@
+import io
+import random
+import re
+import zlib
+import pytest
+from unittest.mock import patch
+from pypdf import PdfReader, PdfWriter
+from app.utils.pdf_validation import PdfValidationError, inspect_pdf, TAIL_BYTES
+from loadtests.pdf_factory import make_report_pdf
+
+
+def rewritten(content: bytes, encrypt: str = None) -> bytes:
+    writer = PdfWriter(clone_from=io.BytesIO(content))
+    if encrypt is not None:
+        writer.encrypt(encrypt)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def incremental_update(content: bytes) -> bytes:
+    # pypdf appends the new page with a cross-reference stream pointing back to the original table
+    writer = PdfWriter(io.BytesIO(content), incremental=True)
+    writer.add_blank_page(100, 100)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def with_xref_stream(content: bytes, compressed: set = frozenset()) -> bytes:
+    # Replaces the classic table with a Flate-compressed stream using the PNG "up" predictor, as
+    # PDF 1.5 writers do; the objects in `compressed` are moved into a Flate-compressed object stream
+    table = content.rindex(b"\nxref\n") + 1
+    objects = {int(match.group(1)): match for match in re.finditer(rb"(?ms)^(\d+) 0 obj\b(.*?)endobj\n", content[:table])}
+    body = content[:min(match.start() for match in objects.values())]
+    entries = {}
+    for number, match in objects.items():
+        if number not in compressed:
+            entries[number] = (1, len(body), 0)
+            body += match.group(0)
+    size = max(objects) + 1
+    if compressed:
+        stream_number, size = size, size + 1
+        members, header = b"", b""
+        for index, number in enumerate(sorted(compressed)):
+            entries[number] = (2, stream_number, index)
+            header += b"%d %d " % (number, len(members))
+            members += objects[number].group(2).strip() + b"\n"
+        data = zlib.compress(header + members)
+        entries[stream_number] = (1, len(body), 0)
+        body += (b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n%s\n"
+                 b"endstream\nendobj\n") % (stream_number, len(compressed), len(header), len(data), data)
+    entries[size] = (1, len(body), 0)
+    size += 1
+    rows = [bytes([0]) + (0).to_bytes(4, "big") + (65535).to_bytes(2, "big")]
+    for number in range(1, size):
+        kind, field, index = entries[number]
+        rows.append(bytes([kind]) + field.to_bytes(4, "big") + index.to_bytes(2, "big"))
+    previous, predicted = bytes(7), b""
+    for row in rows:
+        predicted += bytes([2]) + bytes((value - above) & 0xff for value, above in zip(row, previous))
+        previous = row
+    stream = zlib.compress(predicted)
+    return body + (b"%d 0 obj\n<< /Type /XRef /Size %d /Root 1 0 R /W [1 4 2] /Filter /FlateDecode "
+                   b"/DecodeParms << /Columns 7 /Predictor 12 >> /Length %d >>\nstream\n%s\nendstream\nendobj\n"
+                   b"startxref\n%d\n%%%%EOF\n") % (size - 1, size, len(stream), stream, len(body))
+
+
+def pypdf_pages(content: bytes):
+    # Pages pypdf finds, None if it cannot read the file
+    try:
+        return len(PdfReader(io.BytesIO(content)).pages)
+    except Exception:
+        return None
+
+
+def pypdf_page_tree_count(content: bytes):
+    # /Count of the page tree root as pypdf reads it, None if it cannot
+    try:
+        return int(PdfReader(io.BytesIO(content)).trailer["/Root"]["/Pages"]["/Count"])
+    except Exception:
+        return None
+
+
+REPORT = make_report_pdf(3)
+VALID = {
+    "generated": REPORT,
+    "rewritten": rewritten(REPORT),
+    "incremental_update": incremental_update(REPORT),
+    "xref_stream": with_xref_stream(REPORT),
+    "object_stream": with_xref_stream(REPORT, compressed={1, 2, 3}),
+    "trailing_garbage": REPORT + b"\n" * 100 + b"garbage",
+    "many_pages": make_report_pdf(40, tables=False),
+}
+# Crafted to make the checks themselves expensive; the full parser decides about them
+HOSTILE = {
+    "huge_columns": with_xref_stream(REPORT).replace(b"/Columns 7", b"/Columns 99999999999999"),
+    "zero_columns": with_xref_stream(REPORT).replace(b"/Columns 7", b"/Columns 0"),
+}
+MALFORMED = {
+    "empty": b"",
+    "text": b"Quarterly report\n" * 100,
+    "png": b"\x89PNG\r\n\x1a\n" + bytes(2000),
+    "header_only": b"%PDF-1.7\n",
+    "truncated": REPORT[:len(REPORT) // 2],
+    "truncated_large": make_report_pdf(40, tables=False)[:-TAIL_BYTES - 100],
+}
+
+
+@pytest.mark.parametrize("name", VALID)
+def test_valid_pdfs_report_the_page_count_of_pypdf(name):
+    info = inspect_pdf(VALID[name])
+    assert not info.encrypted
+    assert info.page_count == pypdf_pages(VALID[name])
+
+
+@pytest.mark.parametrize("name", MALFORMED)
+def test_malformed_files_are_rejected_like_pypdf_does(name):
+    with pytest.raises(PdfValidationError):
+        inspect_pdf(MALFORMED[name])
+    # Nothing rejected here would have been readable by the full parser
+    assert not pypdf_pages(MALFORMED[name])
+
+
+def test_encrypted_pdf_is_detected():
+    assert inspect_pdf(rewritten(REPORT, encrypt="secret")).encrypted
+
+
+def test_object_stream_is_only_decompressed_up_to_the_objects_read():
+    # The catalog and page tree root come first, before the font and the pages
+    content = with_xref_stream(REPORT, compressed={1, 2, 3, 5, 7, 9})
+    with patch("app.utils.pdf_validation.MAX_OBJECT_STREAM_BYTES", 200):
+        assert inspect_pdf(content).page_count == 3
+    # A page tree root past the decompressed part is left to the full parser
+    with patch("app.utils.pdf_validation.MAX_OBJECT_STREAM_BYTES", 64):
+        assert inspect_pdf(content).page_count is None
+
+
+def test_unfollowable_structure_leaves_the_page_count_unknown():
+    # A startxref pointing nowhere, which pypdf repairs by scanning the file, needs the full parser
+    broken = re.sub(rb"startxref\n\d+", b"startxref\n999999", REPORT)
+    assert inspect_pdf(broken).page_count is None
+    assert pypdf_pages(broken) == 3
+
+
+@pytest.mark.parametrize("name", HOSTILE)
+def test_hostile_xref_streams_leave_the_page_count_unknown(name):
+    assert inspect_pdf(HOSTILE[name]).page_count is None
+
+
+def test_fuzzed_pdfs_never_fail_the_checks_themselves():
+    # Random truncations, byte flips and insertions: the checks either describe the file or reject
+    # it, never raise anything else, and a page count they find is the page tree's as pypdf reads it
+    # (pypdf may still drop damaged pages when it extracts them)
+    rng = random.Random(20)
+    for _ in range(300):
+        content = bytearray(rng.choice(list(VALID.values()) + list(HOSTILE.values())))
+        mutation = rng.choice(("truncate", "flip", "insert", "delete"))
+        position = rng.randrange(len(content))
+        if mutation == "truncate":
+            del content[position:]
+        elif mutation == "flip":
+            for offset in range(rng.randint(1, 8)):
+                if position + offset < len(content):
+                    content[position + offset] = rng.randrange(256)
+        elif mutation == "insert":
+            content[position:position] = bytes(rng.randrange(256) for _ in range(rng.randint(1, 64)))
+        else:
+            del content[position:position + rng.randint(1, 64)]
+        try:
+            info = inspect_pdf(bytes(content))
+        except PdfValidationError:
+            continue
+        if info.page_count is not None and not info.encrypted:
+            count = pypdf_page_tree_count(bytes(content))
+            assert count is None or count == info.page_count, mutation
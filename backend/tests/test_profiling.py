@@ -0,0 +1,85 @@
+import os
+import pstats
+import random
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.config import settings
+from app.core.profiling import ProfilingMiddleware, prune_profiles
+from app.main import app as main_app
+
+
+def make_client(directory, sample_rate=0.0, max_files=100):
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        return {"total": sum(range(1000))}
+
+    app.add_middleware(ProfilingMiddleware, sample_rate=sample_rate, profiler="cprofile",
+                       directory=str(directory), max_files=max_files, rng=random.Random(1))
+    return TestClient(app)
+
+
+def test_profiles_requests_with_the_admin_token(tmp_path):
+    client = make_client(tmp_path)
+    with patch.object(settings, "PROFILE_ADMIN_TOKEN", "secret"):
+        response = client.get("/work", headers={"X-Profile-Token": "secret", "X-Request-ID": "req-1"})
+    assert response.status_code == 200
+    assert response.headers["X-Profile-Id"] == "req-1"
+    stats = pstats.Stats(str(tmp_path / "req-1.prof"))
+    assert stats.total_calls > 0
+
+
+def test_accepts_the_token_as_query_parameter(tmp_path):
+    client = make_client(tmp_path)
+    with patch.object(settings, "PROFILE_ADMIN_TOKEN", "secret"):
+        response = client.get("/work", params={"profile_token": "secret"})
+    assert os.listdir(tmp_path) == [response.headers["X-Profile-Id"] + ".prof"]
+
+
+def test_ignores_wrong_or_disabled_tokens(tmp_path):
+    client = make_client(tmp_path)
+    with patch.object(settings, "PROFILE_ADMIN_TOKEN", "secret"):
+        response = client.get("/work", headers={"X-Profile-Token": "guess"})
+    assert "X-Profile-Id" not in response.headers
+    with patch.object(settings, "PROFILE_ADMIN_TOKEN", ""):
+        response = client.get("/work", headers={"X-Profile-Token": ""})
+    assert "X-Profile-Id" not in response.headers
+    assert os.listdir(tmp_path) == []
+
+
+def test_samples_requests_without_a_token(tmp_path):
+    client = make_client(tmp_path, sample_rate=0.5)
+    profiled = sum("X-Profile-Id" in client.get("/work").headers for _ in range(40))
+    assert 5 < profiled < 35
+    assert len(os.listdir(tmp_path)) == profiled
+
+
+def test_unsafe_request_ids_are_replaced(tmp_path):
+    client = make_client(tmp_path, sample_rate=1.0)
+    response = client.get("/work", headers={"X-Request-ID": "../../etc/passwd"})
+    profile_id = response.headers["X-Profile-Id"]
+    assert "/" not in profile_id
+    assert os.listdir(tmp_path) == [profile_id + ".prof"]
+
+
+def test_prune_keeps_the_newest_profiles(tmp_path):
+    for index in range(5):
+        path = tmp_path / f"{index}.prof"
+        path.write_bytes(b"")
+        os.utime(path, (index, index))
+    prune_profiles(str(tmp_path), 2)
+    assert sorted(os.listdir(tmp_path)) == ["3.prof", "4.prof"]
+
+
+def test_download_endpoint(tmp_path):
+    (tmp_path / "req-1.prof").write_bytes(b"profile data")
+    client = TestClient(main_app)
+    with patch.object(settings, "PROFILE_ADMIN_TOKEN", "secret"), patch.object(settings, "PROFILE_DIR", str(tmp_path)):
+        response = client.get("/v1/profiles/req-1", headers={"X-Profile-Token": "secret"})
+        assert response.status_code == 200
+        assert response.content == b"profile data"
+        assert client.get("/v1/profiles/req-1", headers={"X-Profile-Token": "guess"}).status_code == 403
+        assert client.get("/v1/profiles/req-1").status_code == 403
+        assert client.get("/v1/profiles/missing", headers={"X-Profile-Token": "secret"}).status_code == 404
@@ -0,0 +1,104 @@
+import time
+from unittest.mock import Mock, patch
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from limits import parse
+from limits.storage import MemoryStorage
+from limits.strategies import FixedWindowRateLimiter
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+import app.core.rate_limiting as rate_limiting
+from app.core.rate_limiting import LeasedStorage, parse_api_keys, route_limit, scale_limits
+
+
+class CountingStorage(MemoryStorage):
+    # Stands in for the shared MongoDB/Redis storage, counting round trips
+    def __init__(self):
+        super().__init__()
+        self.round_trips = 0
+
+    def incr(self, *args, **kwargs):
+        self.round_trips += 1
+        return super().incr(*args, **kwargs)
+
+    def get_expiry(self, key):
+        self.round_trips += 1
+        return super().get_expiry(key)
+
+
+def test_leases_hits_instead_of_a_round_trip_per_request():
+    shared = CountingStorage()
+    limiter = FixedWindowRateLimiter(LeasedStorage("leased+memory://", lease_fraction=0.2, backing=shared))
+    item = parse("20/minute")
+    assert all(limiter.hit(item, "client") for _ in range(20))
+    assert shared.round_trips == 5
+    assert not limiter.hit(item, "client")
+    # Once the limit is spent, rejections are local too
+    round_trips = shared.round_trips
+    assert not any(limiter.hit(item, "client") for _ in range(10))
+    assert shared.round_trips == round_trips
+
+
+def test_workers_sharing_the_storage_never_exceed_the_limit():
+    shared = CountingStorage()
+    workers = [FixedWindowRateLimiter(LeasedStorage("leased+memory://", lease_fraction=0.1, backing=shared)) for _ in range(3)]
+    item = parse("30/minute")
+    admitted = sum(worker.hit(item, "client") for _ in range(20) for worker in workers)
+    assert admitted == 30
+    assert shared.get(item.key_for("client")) >= 30
+
+
+def test_limits_reset_with_the_window():
+    shared = CountingStorage()
+    limiter = FixedWindowRateLimiter(LeasedStorage("leased+memory://", lease_fraction=0.5, backing=shared))
+    item = parse("2/second")
+    assert limiter.hit(item, "client") and limiter.hit(item, "client")
+    assert not limiter.hit(item, "client")
+    time.sleep(1.1)
+    assert limiter.hit(item, "client")
+
+
+def test_expired_leases_are_dropped():
+    # One lease per client and route: clients that never come back must not pile up
+    clock = Mock(return_value=1000.0)
+    storage = LeasedStorage("leased+memory://", lease_fraction=0.1, backing=CountingStorage(), clock=clock)
+    limiter = FixedWindowRateLimiter(storage)
+    item = parse("60/minute")
+    for client in range(1000):
+        limiter.hit(item, f"10.0.{client // 256}.{client % 256}")
+    assert len(storage._leases) == 1000
+    clock.return_value += rate_limiting.LEASE_SWEEP_SECONDS + 61
+    limiter.hit(item, "10.1.0.1")
+    assert list(storage._leases) == [item.key_for("10.1.0.1")]
+
+
+def test_parse_api_keys_skips_malformed_entries():
+    keys = parse_api_keys("k1:partner:10, broken ,k2:internal:2.5")
+    assert keys == {"k1": ("partner", 10.0), "k2": ("internal", 2.5)}
+
+
+def test_scale_limits():
+    assert scale_limits("5/minute", 10) == "50/1 minute"
+    assert scale_limits("5/minute;100/day", 0.5) == "2/1 minute;50/1 day"
+
+
+def test_limits_per_api_key_and_per_ip():
+    with patch.object(rate_limiting, "API_KEYS", {"secret": ("partner", 2.0)}), \
+         patch.object(rate_limiting, "_MULTIPLIERS", {"key:partner": 2.0}):
+        app = FastAPI()
+        limiter = Limiter(key_func=rate_limiting.rate_limit_key, storage_uri="leased+memory://")
+        app.state.limiter = limiter
+        app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+        @app.get("/ping")
+        @limiter.limit(route_limit("2/minute"))
+        async def ping(request: Request):
+            return {"ok": True}
+
+        client = TestClient(app)
+        assert [client.get("/ping").status_code for _ in range(3)] == [200, 200, 429]
+        # The API key is counted separately from the IP, with its limit scaled
+        statuses = [client.get("/ping", headers={"X-API-Key": "secret"}).status_code for _ in range(5)]
+        assert statuses == [200, 200, 200, 200, 429]
+        # Unknown keys are limited by IP
+        assert client.get("/ping", headers={"X-API-Key": "guess"}).status_code == 429
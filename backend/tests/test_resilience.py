@@ -0,0 +1,140 @@
+import threading
+import time
+import pytest
+from unittest.mock import Mock, patch
+from fastapi import HTTPException
+from app.utils.resilience import (
+    ResilientCaller,
+    CircuitBreaker,
+    LatencyTracker,
+    Deadline,
+    DeadlineExceeded,
+    CircuitOpenError,
+    TransientError
+)
+from app.utils.gemini_utils import generate_text
+
+
+def make_caller(**kwargs):
+    kwargs.setdefault("sleep", lambda seconds: None)
+    kwargs.setdefault("backoff_base", 0.01)
+    return ResilientCaller(**kwargs)
+
+
+def test_retries_transient_errors():
+    # Two transient failures, then success
+    fn = Mock(side_effect=[TransientError("503"), TransientError("503"), "answer"])
+    caller = make_caller(max_attempts=3)
+    assert caller.call(fn, Deadline(5)) == "answer"
+    assert fn.call_count == 3
+
+
+def test_gives_up_after_max_attempts():
+    fn = Mock(side_effect=TransientError("503"))
+    caller = make_caller(max_attempts=2)
+    with pytest.raises(TransientError):
+        caller.call(fn, Deadline(5))
+    assert fn.call_count == 2
+
+
+def test_non_transient_errors_are_not_retried():
+    fn = Mock(side_effect=ValueError("bad request"))
+    caller = make_caller(max_attempts=3)
+    with pytest.raises(ValueError):
+        caller.call(fn, Deadline(5))
+    assert fn.call_count == 1
+
+
+def test_deadline_exceeded():
+    caller = make_caller()
+    with pytest.raises(DeadlineExceeded):
+        caller.call(lambda deadline: time.sleep(0.5), Deadline(0.05))
+
+
+def test_hedged_request_wins_over_slow_first_attempt():
+    # The first attempt hangs; the hedge sent after the p95 delay answers
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record(0.02)
+    release = threading.Event()
+    calls = []
+
+    def fn(deadline):
+        calls.append(deadline)
+        if len(calls) == 1:
+            release.wait(2)
+            return "slow"
+        return "fast"
+
+    caller = make_caller(hedging=True, tracker=tracker)
+    started = time.monotonic()
+    assert caller.call(fn, Deadline(5)) == "fast"
+    assert time.monotonic() - started < 1
+    assert caller.hedges == 1
+    release.set()
+
+
+def test_circuit_breaker_opens_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as exc_info:
+        breaker.allow()
+    assert exc_info.value.retry_after == 10
+
+    # After the reset timeout a single trial call is allowed
+    now[0] = 10
+    breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_non_transient_error_during_trial_lets_the_next_trial_through():
+    # A rejected request says nothing about upstream health, but must not leave the trial in flight
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+    breaker.record_failure()
+    now[0] = 10
+    caller = make_caller(max_attempts=3, breaker=breaker)
+    with pytest.raises(ValueError):
+        caller.call(Mock(side_effect=ValueError("blocked answer")), Deadline(5))
+    assert breaker.state == "half-open"
+    assert not breaker.trial_in_flight
+    assert caller.call(Mock(return_value="answer"), Deadline(5)) == "answer"
+    assert breaker.state == "closed"
+
+
+def test_open_circuit_sheds_calls_without_calling_upstream():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    caller = make_caller(max_attempts=1, breaker=breaker)
+    fn = Mock(side_effect=TransientError("503"))
+    with pytest.raises(TransientError):
+        caller.call(fn, Deadline(5))
+    with pytest.raises(CircuitOpenError):
+        caller.call(fn, Deadline(5))
+    assert fn.call_count == 1
+
+
+def test_generate_text_maps_errors_to_http_status():
+    provider = Mock(requires_api_key=False)
+    with patch("app.utils.gemini_utils.get_llm_provider", return_value=provider), \
+         patch("app.utils.gemini_utils.resilient_caller") as mock_caller:
+        mock_caller.call.side_effect = DeadlineExceeded()
+        with pytest.raises(HTTPException) as exc_info:
+            generate_text("prompt")
+        assert exc_info.value.status_code == 504
+
+        mock_caller.call.side_effect = CircuitOpenError(12)
+        with pytest.raises(HTTPException) as exc_info:
+            generate_text("prompt")
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers == {"Retry-After": "12"}
+
+        mock_caller.call.side_effect = TransientError("503")
+        with pytest.raises(HTTPException) as exc_info:
+            generate_text("prompt")
+        assert exc_info.value.status_code == 503
@@ -0,0 +1,58 @@
+from app.utils.retrieval import tokenize, chunk_text, chunk_pages, rank_chunks, select_relevant_chunks
+
+
+def test_tokenize():
+    # Terms are lowercased words without punctuation
+    assert tokenize("Hello, World! 42 apples.") == ["hello", "world", "42", "apples"]
+
+
+def test_chunk_text_overlap():
+    # Consecutive chunks share `overlap` words and cover the whole text
+    text = " ".join(str(i) for i in range(10))
+    chunks = chunk_text(text, chunk_size=4, overlap=1)
+    assert chunks == ["0 1 2 3", "3 4 5 6", "6 7 8 9"]
+
+
+def test_chunk_text_empty():
+    assert chunk_text("   ") == []
+
+
+def test_rank_chunks_prefers_matching_chunk():
+    chunks = ["the cat sat on the mat", "dogs chase cats", "quarterly revenue grew by ten percent"]
+    ranked = rank_chunks(chunks, "How much did revenue grow?")
+    assert ranked[0][0] == 2
+    assert ranked[0][1] > 0
+
+
+def test_select_relevant_chunks_keeps_document_order():
+    chunks = ["alpha beta", "gamma delta", "beta gamma", "epsilon"]
+    assert select_relevant_chunks(chunks, "beta gamma delta", top_k=2) == ["gamma delta", "beta gamma"]
+    assert select_relevant_chunks(chunks, "epsilon", top_k=1) == ["epsilon"]
+
+
+def test_select_relevant_chunks_without_match_falls_back_to_first_chunks():
+    chunks = ["alpha", "beta", "gamma"]
+    assert select_relevant_chunks(chunks, "zeta", top_k=2) == ["alpha", "beta"]
+
+
+def test_tokenize_scripts_without_spaces():
+    # Chinese and Japanese text is indexed by overlapping character pairs
+    assert tokenize("東京都庁 in Tokyo") == ["東京", "京都", "都庁", "in", "tokyo"]
+
+
+def test_chunk_text_counts_characters_of_scripts_without_spaces():
+    assert chunk_text("本文件包含公司的年度报告", chunk_size=4, overlap=1) == ["本文件包", "包含公司", "司的年度", "度报告"]
+
+
+def test_rank_chunks_chinese():
+    chunks = ["公司的年度报告", "明年的计划", "天气很好"]
+    assert rank_chunks(chunks, "年度报告是什么")[0][0] == 0
+
+
+def test_chunk_pages_gives_the_page_of_the_first_word():
+    texts = [" ".join(["one"] * 30), " ".join(["two"] * 30), " ".join(["three"] * 30)]
+    chunks = chunk_text(" ".join(texts), chunk_size=20, overlap=5)
+    pages = chunk_pages(texts, [1, 2, 3], len(chunks), chunk_size=20, overlap=5)
+    assert len(pages) == len(chunks)
+    for chunk, page in zip(chunks, pages):
+        assert chunk.split()[0] == ["one", "two", "three"][page - 1]
@@ -0,0 +1,109 @@
+import pytest
+from unittest.mock import patch, Mock, ANY
+from fastapi import HTTPException
+from bson import ObjectId
+from app.utils.session_utils import (
+    create_session,
+    load_session,
+    summarize_turns,
+    format_history,
+    append_turn
+)
+
+SESSION_ID = '123456789012345678901234'
+PDF_ID = 'abcdefabcdefabcdefabcdef'
+
+# Fixture to create a mock database instance for testing
+@pytest.fixture
+def mock_db():
+    return Mock()
+
+def make_turns(count):
+    return [{"question": f"Question {i}?", "answer": f"Answer {i}. More details {i}."} for i in range(count)]
+
+def test_create_session(mock_db):
+    """Test creating a session for an existing PDF"""
+    with patch('app.utils.session_utils.get_database', return_value=mock_db):
+        mock_db.pdfs.count_documents.return_value = 1
+        mock_db.chat_sessions.insert_one.return_value.inserted_id = ObjectId(SESSION_ID)
+
+        assert create_session(PDF_ID) == SESSION_ID
+        mock_db.chat_sessions.insert_one.assert_called_once_with({
+            "pdf_id": PDF_ID,
+            "summary": "",
+            "turns": [],
+            "created_at": ANY,
+            "updated_at": ANY,
+        })
+
+def test_create_session_unknown_pdf(mock_db):
+    """Test that sessions can only be created for existing PDFs"""
+    with patch('app.utils.session_utils.get_database', return_value=mock_db):
+        mock_db.pdfs.count_documents.return_value = 0
+        with pytest.raises(HTTPException) as exc_info:
+            create_session(PDF_ID)
+        assert exc_info.value.status_code == 404
+
+        # Invalid IDs never reach the sessions collection
+        with pytest.raises(HTTPException) as exc_info:
+            create_session("invalid")
+        assert exc_info.value.status_code == 404
+        mock_db.chat_sessions.insert_one.assert_not_called()
+
+def test_load_session(mock_db):
+    """Test loading a session scoped to its PDF"""
+    with patch('app.utils.session_utils.get_database', return_value=mock_db):
+        session = {"_id": ObjectId(SESSION_ID), "pdf_id": PDF_ID, "turns": []}
+        mock_db.chat_sessions.find_one.return_value = session
+        assert load_session(SESSION_ID, PDF_ID) == session
+        mock_db.chat_sessions.find_one.assert_called_once_with({"_id": ObjectId(SESSION_ID), "pdf_id": PDF_ID})
+
+        mock_db.chat_sessions.find_one.return_value = None
+        with pytest.raises(HTTPException) as exc_info:
+            load_session(SESSION_ID, PDF_ID)
+        assert exc_info.value.status_code == 404
+
+        with pytest.raises(HTTPException) as exc_info:
+            load_session("invalid", PDF_ID)
+        assert exc_info.value.status_code == 404
+
+def test_append_turn_within_window(mock_db):
+    """Test that appending inside the window is a single $push/$slice update"""
+    with patch('app.utils.session_utils.get_database', return_value=mock_db):
+        session = {"_id": ObjectId(SESSION_ID), "summary": "", "turns": make_turns(2)}
+        mock_db.chat_sessions.update_one.return_value.modified_count = 1
+
+        assert append_turn(session, "New question?", "New answer.", max_turns=5) == True
+        mock_db.chat_sessions.update_one.assert_called_once_with(
+            {"_id": ObjectId(SESSION_ID)},
+            {
+                "$push": {"turns": {"$each": [{"question": "New question?", "answer": "New answer."}], "$slice": -5}},
+                "$set": {"updated_at": ANY},
+            }
+        )
+
+def test_append_turn_folds_overflow_into_summary(mock_db):
+    """Test that turns leaving the window are summarized in the same update"""
+    with patch('app.utils.session_utils.get_database', return_value=mock_db):
+        session = {"_id": ObjectId(SESSION_ID), "summary": "", "turns": make_turns(3)}
+        mock_db.chat_sessions.update_one.return_value.modified_count = 1
+        append_turn(session, "New question?", "New answer.", max_turns=3)
+
+        update = mock_db.chat_sessions.update_one.call_args[0][1]
+        assert update["$push"]["turns"]["$slice"] == -3
+        assert update["$set"]["summary"] == "Q: Question 0? A: Answer 0."
+
+def test_summarize_turns_respects_budget():
+    """Test that the summary keeps the newest lines within its token budget"""
+    summary = summarize_turns("", make_turns(10), budget=24)
+    assert summary == "Q: Question 8? A: Answer 8.\nQ: Question 9? A: Answer 9."
+
+def test_format_history():
+    """Test rendering the summary and the most recent turns within the budget"""
+    session = {"summary": "Q: Old? A: Old answer.", "turns": make_turns(3)}
+    history = format_history(session, budget=30)
+    assert history.startswith("Summary of earlier conversation:\nQ: Old? A: Old answer.")
+    assert "Question 2?" in history
+    assert "Question 0?" not in history
+
+    assert format_history({"summary": "", "turns": []}) == ""
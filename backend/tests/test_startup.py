@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import Mock
+from app.core.lazy import lazy_import, LazyModule
+from app.core.warmup import WarmupRegistry
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported by the background warmup, never by `import app.main`
+HEAVY_MODULES = ["spacy", "google.generativeai", "pypdf"]
+
+# Upper bound for the cumulative import time of app.main (seconds)
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "1.5"))
+
+
+def run_importtime(module):
+    # Run `python -X importtime` in a fresh interpreter and parse its report
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+    )
+    assert result.returncode == 0, result.stderr
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "").split("|")]
+        timings[name] = int(cumulative_us)
+    return timings
+
+
+@pytest.fixture(scope="module")
+def app_import_timings():
+    return run_importtime("app.main")
+
+
+def test_app_import_does_not_load_heavy_modules(app_import_timings):
+    # Heavy SDKs and NLP models are deferred to the warmup thread
+    for module in HEAVY_MODULES:
+        assert module not in app_import_timings, f"{module} was imported eagerly"
+
+
+def test_app_import_time_within_budget(app_import_timings):
+    # Benchmark: cumulative import time of app.main stays under the budget
+    cumulative_seconds = app_import_timings["app.main"] / 1_000_000
+    assert cumulative_seconds < IMPORT_TIME_BUDGET, f"app.main import time: {cumulative_seconds:.3f}s"
+
+
+def test_lazy_import_shares_proxy_and_defers_loading():
+    proxy = lazy_import("colorsys")
+    assert isinstance(proxy, LazyModule)
+    assert proxy is lazy_import("colorsys")
+    assert proxy.rgb_to_hsv(0, 0, 0) == (0.0, 0.0, 0.0)
+    assert proxy.loaded
+
+
+def test_warmup_registry_reports_readiness():
+    registry = WarmupRegistry()
+    initializer = Mock()
+    registry.register("component", initializer)
+    assert not registry.is_ready()
+    assert registry.status() == {"component": {"state": "pending"}}
+
+    registry.start().join(timeout=5)
+    initializer.assert_called_once()
+    assert registry.is_ready()
+    assert registry.status()["component"]["state"] == "ready"
+
+
+def test_warmup_registry_records_failures():
+    registry = WarmupRegistry()
+    registry.register("broken", Mock(side_effect=RuntimeError("boom")))
+    registry.run()
+    assert not registry.is_ready()
+    assert registry.status()["broken"] == {"state": "failed", "error": "boom"}
+
+
+def test_warmup_registry_retries_failed_components_with_backoff():
+    delays = []
+    registry = WarmupRegistry(retry_seconds=1.0, max_retry_seconds=3.0, sleep=delays.append)
+    ready = Mock()
+    flaky = Mock(side_effect=[RuntimeError("down"), RuntimeError("down"), RuntimeError("down"), None])
+    registry.register("ready", ready)
+    registry.register("flaky", flaky)
+    registry.start().join(timeout=5)
+    assert registry.is_ready()
+    assert flaky.call_count == 4
+    # Components that warmed up are not initialized again
+    ready.assert_called_once()
+    assert delays == [1.0, 2.0, 3.0]
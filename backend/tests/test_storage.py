@@ -0,0 +1,131 @@
+import os
+import pytest
+from datetime import datetime
+from unittest.mock import MagicMock
+from app.utils.storage import LocalStorage, ReadThroughCache, S3Storage
+
+CONTENT = b"%PDF-1.5\n...some pdf content...\n%%EOF\n"
+
+
+def test_local_storage(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    location = storage.save("test.pdf", CONTENT)
+    assert location == os.path.join(str(tmp_path), "test.pdf")
+    assert storage.exists("test.pdf")
+    with storage.open(location) as pdf_file:
+        assert pdf_file.read() == CONTENT
+    assert storage.read_range(location, 0, 7) == b"%PDF-1.5"
+    assert storage.read_range(location, -6, -1) == b"%%EOF\n"
+    files, cursor = storage.scan("", 10)
+    assert [entry[:3] for entry in files] == [("test.pdf", location, len(CONTENT))] and cursor == ""
+    assert storage.delete(location) and not storage.delete(location)
+
+
+def test_read_through_cache_evicts_least_recently_used(tmp_path):
+    cache = ReadThroughCache(str(tmp_path), max_bytes=10)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.open("a").close()
+    cache.put("c", b"cccc")
+    assert cache.open("b") is None
+    with cache.open("a") as a, cache.open("c") as c:
+        assert a.read() == b"aaaa" and c.read() == b"cccc"
+
+    # A new cache picks up the files left by the previous one
+    with ReadThroughCache(str(tmp_path), max_bytes=10).open("c") as c:
+        assert c.read() == b"cccc"
+
+
+def test_read_through_cache_copy_stays_readable_once_opened(tmp_path):
+    cache = ReadThroughCache(str(tmp_path), max_bytes=4)
+    cache.put("a", b"aaaa")
+    with cache.open("a") as cache_file:
+        # A concurrent put evicts the copy being read
+        cache.put("b", b"bbbb")
+        assert cache.open("a") is None
+        assert cache_file.read() == b"aaaa"
+
+
+def test_s3_storage_downloads_again_a_copy_removed_from_the_cache(tmp_path):
+    client = MagicMock()
+    client.get_object.return_value = {"Body": MagicMock(read=lambda: CONTENT)}
+    storage = S3Storage("bucket", "pdfs/", client=client, cache=ReadThroughCache(str(tmp_path)))
+    storage.cache.put("pdfs/test.pdf", CONTENT)
+    os.remove(storage.cache._path("pdfs/test.pdf"))
+
+    with storage.open("s3://bucket/pdfs/test.pdf") as pdf_file:
+        assert pdf_file.read() == CONTENT
+    client.get_object.assert_called_once_with(Bucket="bucket", Key="pdfs/test.pdf")
+    # The downloaded copy is cached again
+    with storage.cache.open("pdfs/test.pdf") as cache_file:
+        assert cache_file.read() == CONTENT
+
+
+def test_multipart_upload_is_aborted_on_failure(tmp_path):
+    client = MagicMock()
+    client.create_multipart_upload.return_value = {"UploadId": "upload-1"}
+    client.upload_part.side_effect = [{"ETag": "etag-1"}, ConnectionError("reset")]
+    storage = S3Storage("bucket", "pdfs/", client=client, cache=ReadThroughCache(str(tmp_path)))
+    storage.part_size = 4
+
+    with pytest.raises(ConnectionError):
+        storage.save("test.pdf", b"0123456789")
+    client.abort_multipart_upload.assert_called_once_with(Bucket="bucket", Key="pdfs/test.pdf", UploadId="upload-1")
+    client.complete_multipart_upload.assert_not_called()
+
+
+def test_s3_scan_resumes_after_the_last_key(tmp_path):
+    keys = [f"pdfs/{index}.pdf" for index in range(5)]
+
+    def list_objects_v2(Bucket, Prefix, StartAfter, MaxKeys):
+        following = [key for key in keys if key > StartAfter]
+        return {"Contents": [{"Key": key, "Size": 1, "LastModified": datetime(2024, 1, 1)} for key in following[:MaxKeys]],
+                "IsTruncated": len(following) > MaxKeys}
+
+    client = MagicMock(list_objects_v2=MagicMock(side_effect=list_objects_v2))
+    storage = S3Storage("bucket", "pdfs/", client=client, cache=ReadThroughCache(str(tmp_path)))
+    files, cursor = storage.scan("", 3)
+    assert [name for name, _, _, _ in files] == ["0.pdf", "1.pdf", "2.pdf"] and cursor == "pdfs/2.pdf"
+    files, cursor = storage.scan(cursor, 3)
+    assert [location for _, location, _, _ in files] == ["s3://bucket/pdfs/3.pdf", "s3://bucket/pdfs/4.pdf"]
+    assert cursor == ""
+
+
+@pytest.fixture
+def s3_client():
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1", aws_access_key_id="test", aws_secret_access_key="test")
+        client.create_bucket(Bucket="pdfs")
+        yield client
+
+
+def test_s3_storage(s3_client, tmp_path):
+    storage = S3Storage("pdfs", "uploads/", client=s3_client, cache=ReadThroughCache(str(tmp_path / "cache")))
+    storage.part_size = 5 * 1024 * 1024
+    large = CONTENT + b"0" * (11 * 1024 * 1024)
+
+    location = storage.save("test.pdf", CONTENT)
+    assert location == "s3://pdfs/uploads/test.pdf"
+    assert storage.save("large.pdf", large) == "s3://pdfs/uploads/large.pdf"
+    assert s3_client.head_object(Bucket="pdfs", Key="uploads/large.pdf")["ContentLength"] == len(large)
+    assert storage.exists("test.pdf") and not storage.exists("test")
+
+    # Ranged reads go to S3 when the file is not cached
+    storage.cache.discard("uploads/test.pdf")
+    assert storage.read_range(location, 0, 7) == b"%PDF-1.5"
+    assert storage.read_range(location, -6, -1) == b"%%EOF\n"
+    # The first full read fills the cache
+    with storage.open(location) as pdf_file:
+        assert pdf_file.read() == CONTENT
+    with storage.cache.open("uploads/test.pdf") as cache_file:
+        assert cache_file.read() == CONTENT
+
+    # Listed in key order, resuming after the cursor
+    files, cursor = storage.scan("", 1)
+    assert [name for name, _, _, _ in files] == ["large.pdf"] and cursor == "uploads/large.pdf"
+    files, cursor = storage.scan(cursor, 10)
+    assert [name for name, _, _, _ in files] == ["test.pdf"] and cursor == ""
+    storage.delete(location)
+    assert not storage.exists("test.pdf") and storage.cache.open("uploads/test.pdf") is None
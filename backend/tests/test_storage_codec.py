@@ -0,0 +1,91 @@
+import threading
+import pytest
+from unittest.mock import patch, mock_open
+from app.core.config import settings
+import app.utils.storage_codec as storage_codec
+from app.utils.storage_codec import (
+    MAGIC,
+    compress,
+    decompress,
+    encode_text,
+    decode_text,
+    encode_file,
+    resolve_codec,
+    train_dictionary
+)
+from app.utils.pdf_utils import open_pdf_file
+
+TEXT = "The quarterly report covers revenue, costs and the outlook for the next year. " * 50
+
+
+@pytest.fixture(autouse=True)
+def reset_codec_state():
+    # Compressors and the dictionary are cached per process; start each test without them
+    storage_codec._local = threading.local()
+    storage_codec._dictionary = None
+    yield
+    storage_codec._local = threading.local()
+    storage_codec._dictionary = None
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_round_trip(codec):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    data = compress(TEXT.encode(), codec)
+    assert data.startswith(MAGIC + storage_codec.CODEC_IDS[codec])
+    assert len(data) < len(TEXT) / 10
+    assert decompress(data) == TEXT.encode()
+
+
+def test_uncompressed_values_pass_through():
+    # Records and files written before compression was enabled are read unchanged
+    assert decode_text("plain text") == "plain text"
+    assert decompress(b"%PDF-1.5 raw bytes") == b"%PDF-1.5 raw bytes"
+
+
+def test_text_is_compressed_only_when_enabled():
+    assert encode_text(TEXT) == TEXT
+    with patch.object(settings, "COMPRESS_TEXT", True), patch.object(settings, "STORAGE_CODEC", "zlib"):
+        encoded = encode_text(TEXT)
+    assert isinstance(encoded, bytes)
+    assert decode_text(encoded) == TEXT
+
+
+def test_zstd_falls_back_to_zlib_without_zstandard():
+    with patch("app.utils.storage_codec.zstandard", None):
+        assert resolve_codec("zstd") == "zlib"
+    with pytest.raises(ValueError):
+        resolve_codec("lz4")
+
+
+def test_dictionary_compression(tmp_path):
+    pytest.importorskip("zstandard")
+    samples = [f"Invoice {index}: total due {index * 7} EUR, payable within 30 days. Thank you for your business.".encode() * 3
+               for index in range(500)]
+    dictionary_path = tmp_path / "dictionary.zstd"
+    dictionary_path.write_bytes(train_dictionary(samples, size=4096))
+    sample = b"Invoice 9001: total due 63007 EUR, payable within 30 days. Thank you for your business."
+    plain = compress(sample, "zstd")
+
+    storage_codec._local = threading.local()
+    with patch.object(settings, "ZSTD_DICTIONARY_PATH", str(dictionary_path)):
+        data = compress(sample, "zstd")
+        assert decompress(data) == sample
+    assert len(data) < len(plain)
+
+    # Decoding without the dictionary fails loudly instead of returning garbage
+    storage_codec._local = threading.local()
+    storage_codec._dictionary = None
+    with pytest.raises(RuntimeError):
+        decompress(data)
+
+
+def test_compressed_pdf_file_is_read_transparently():
+    content = b"%PDF-1.5\n...some pdf content..."
+    with patch.object(settings, "COMPRESS_PDF_FILES", True), patch.object(settings, "STORAGE_CODEC", "zlib"):
+        stored = encode_file(content)
+    with patch("builtins.open", mock_open(read_data=stored)):
+        assert open_pdf_file("/path/to/file.pdf").read() == content
+    with patch("builtins.open", mock_open(read_data=content)):
+        assert open_pdf_file("/path/to/file.pdf").read() == content
@@ -0,0 +1,85 @@
+import os
+import time
+import mongomock
+import pytest
+from unittest.mock import patch
+from app.utils.storage_gc import StorageCollector
+from app.utils.storage import LocalStorage
+
+
+def make_files(directory, names, age=0):
+    mtime = time.time() - age
+    for name in names:
+        path = directory / name
+        path.write_bytes(b"%PDF-1.4")
+        os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture(autouse=True)
+def database():
+    # Holds the collector's lease and cursors
+    database = mongomock.MongoClient().pdfchatai
+    with patch("app.utils.storage_gc.get_database", return_value=database):
+        yield database
+
+
+def test_removes_files_without_records(tmp_path):
+    make_files(tmp_path, ["kept.pdf", "orphan.pdf"], age=7200)
+    (tmp_path / "notes.txt").write_text("not a PDF")
+    collector = StorageCollector(storage=LocalStorage(str(tmp_path)), batch_size=10, max_files=100, grace_seconds=3600)
+    with patch("app.utils.storage_gc.find_stored_filenames", return_value={"kept.pdf"}):
+        stats = collector.run_once()
+    assert sorted(os.listdir(tmp_path)) == ["kept.pdf", "notes.txt"]
+    assert stats["scanned"] == 2 and stats["removed"] == 1 and stats["bytes_freed"] == 8
+
+
+def test_keeps_young_files(tmp_path):
+    # A file written moments ago may belong to an upload whose record is not saved yet
+    make_files(tmp_path, ["uploading.pdf"])
+    collector = StorageCollector(storage=LocalStorage(str(tmp_path)), grace_seconds=3600)
+    with patch("app.utils.storage_gc.find_stored_filenames", return_value=set()):
+        assert collector.run_once()["removed"] == 0
+    assert os.listdir(tmp_path) == ["uploading.pdf"]
+
+
+def test_batches_queries_and_resumes_between_runs(tmp_path):
+    names = [f"{index:02d}.pdf" for index in range(10)]
+    make_files(tmp_path, names, age=7200)
+    collector = StorageCollector(storage=LocalStorage(str(tmp_path)), batch_size=3, max_files=6, grace_seconds=0)
+    with patch("app.utils.storage_gc.find_stored_filenames", side_effect=lambda batch: set(batch)) as mock_find:
+        assert collector.run_once()["scanned"] == 6
+        assert [len(call.args[0]) for call in mock_find.call_args_list] == [3, 3]
+        # The second run picks up the remaining files, the third starts over
+        assert collector.run_once()["scanned"] == 4
+        assert sorted(name for call in mock_find.call_args_list for name in call.args[0]) == names
+        assert collector.run_once()["scanned"] == 6
+        assert mock_find.call_args_list[-2].args[0] == mock_find.call_args_list[0].args[0]
+
+
+def test_one_collector_runs_and_another_resumes_after_its_lease(tmp_path):
+    make_files(tmp_path, [f"{index:02d}.pdf" for index in range(10)], age=7200)
+    clock = [1000.0]
+    first, second = [StorageCollector(storage=LocalStorage(str(tmp_path)), max_files=6, grace_seconds=0,
+                                      lease_seconds=600, clock=lambda: clock[0]) for _ in range(2)]
+    with patch("app.utils.storage_gc.find_stored_filenames", side_effect=lambda batch: set(batch)):
+        assert first.run_once()["scanned"] == 6
+        assert second.run_once() == {"scanned": 0, "removed": 0, "bytes_freed": 0, "bytes_in_use": 0,
+                                     "indexes_removed": 0, "skipped": True}
+        # The first collector stopped; the second takes over where it left off
+        clock[0] += 601
+        assert second.run_once()["scanned"] == 4
+        assert first.run_once()["skipped"]
+
+
+def test_removes_indexes_of_pdfs_without_records(tmp_path):
+    index_dir = tmp_path / "chunk_index"
+    index_dir.mkdir()
+    kept, expired = "652f0c0a9d1e4b2a3c4d5e6f", "652f0c0a9d1e4b2a3c4d5e70"
+    for name in [f"{kept}-0123456789abcdef.idx", f"{expired}-0123456789abcdef.idx"]:
+        (index_dir / name).write_bytes(b"PCIX")
+    collector = StorageCollector(storage=LocalStorage(str(tmp_path / "pdfs")))
+    with patch("app.utils.storage_gc.find_stored_ids", return_value={kept}) as mock_find:
+        stats = collector.run_once()
+    mock_find.assert_called_once_with({kept, expired})
+    assert os.listdir(index_dir) == [f"{kept}-0123456789abcdef.idx"]
+    assert stats["indexes_removed"] == 1 and stats["bytes_freed"] == 4
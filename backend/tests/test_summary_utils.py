@@ -0,0 +1,64 @@
+import pytest
+from unittest.mock import patch, call
+from fastapi import HTTPException
+from app.utils.summary_utils import hierarchical_summary, keyword_outline, precompute_summary, summary_token_bucket
+
+
+def test_hierarchical_summary_map_reduce():
+    # 7 chunks are mapped, then reduced in groups of 3 -> 3 -> 1
+    text = " ".join(f"word{i}" for i in range(70))
+    with patch("app.utils.summary_utils.SUMMARY_CHUNK_WORDS", 10), \
+         patch("app.utils.summary_utils.SUMMARY_FAN_IN", 3), \
+         patch("app.utils.summary_utils.generate_text", side_effect=lambda prompt, bucket: "partial") as mock_generate:
+        assert hierarchical_summary(text) == "partial"
+    assert mock_generate.call_count == 7 + 3 + 1
+    # Summaries are charged to their own token bucket, never to the chat one
+    assert all(kwargs == {"bucket": summary_token_bucket} for _, kwargs in mock_generate.call_args_list)
+
+
+def test_hierarchical_summary_single_chunk():
+    with patch("app.utils.summary_utils.generate_text", return_value="Short summary") as mock_generate:
+        assert hierarchical_summary("a short document") == "Short summary"
+    mock_generate.assert_called_once()
+
+
+def test_keyword_outline():
+    text = "revenue revenue growth market " * 5 + "employees hiring employees office " * 5
+    with patch("app.utils.summary_utils.SUMMARY_CHUNK_WORDS", 20):
+        outline = keyword_outline(text, keywords_per_section=2)
+    assert outline == [
+        {"section": 1, "keywords": ["revenue", "growth"]},
+        {"section": 2, "keywords": ["employees", "hiring"]},
+    ]
+
+
+def test_keyword_outline_uses_the_stop_words_of_the_language():
+    text = "der umsatz und der gewinn wuchsen " * 5
+    assert keyword_outline(text, keywords_per_section=2, language="de") == [{"section": 1, "keywords": ["gewinn", "umsatz"]}]
+
+
+def test_precompute_summary_stores_artifacts():
+    with patch("app.utils.summary_utils.hierarchical_summary", return_value="Summary"), \
+         patch("app.utils.summary_utils.keyword_outline", return_value=[{"section": 1, "keywords": ["topic"]}]), \
+         patch("app.utils.summary_utils.update_mongodb") as mock_update:
+        precompute_summary("pdf_id_123", "text")
+    assert mock_update.call_args_list == [
+        call("pdf_id_123", {"summary_status": "processing"}),
+        call("pdf_id_123", {"summary": "Summary", "outline": [{"section": 1, "keywords": ["topic"]}], "summary_status": "ready"}),
+    ]
+
+
+def test_precompute_summary_failure_marks_status():
+    with patch("app.utils.summary_utils.hierarchical_summary", side_effect=HTTPException(status_code=429, detail="Token limit exceeded")), \
+         patch("app.utils.summary_utils.update_mongodb") as mock_update:
+        precompute_summary("pdf_id_123", "text")
+    mock_update.assert_called_with("pdf_id_123", {"summary_status": "failed"})
+
+
+def test_precompute_summary_failed_store_marks_status():
+    # A failure storing the result must not leave the record "processing"
+    with patch("app.utils.summary_utils.hierarchical_summary", return_value="Summary"), \
+         patch("app.utils.summary_utils.keyword_outline", return_value=[]), \
+         patch("app.utils.summary_utils.update_mongodb", side_effect=[True, Exception("write failed"), True]) as mock_update:
+        precompute_summary("pdf_id_123", "text")
+    mock_update.assert_called_with("pdf_id_123", {"summary_status": "failed"})
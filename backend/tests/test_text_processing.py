@@ -1,5 +1,5 @@
 import pytest
-from app.utils.text_processing import preprocess_text
+from app.utils.text_processing import preprocess_text, count_tokens
 import spacy
 
 @pytest.fixture(scope="module")
@@ -91,3 +91,12 @@ def test_preprocess_text_newlines(nlp):
     text = "This has\nnewlines\nand\rcarriage returns."
     result = preprocess_text(text, nlp)
     assert result == "this has newlines and carriage returns"
+
+def test_count_tokens():
+    """
+    Tests the local token estimate.
+    Words and punctuation are separate tokens and long words count as several subword pieces.
+    """
+    assert count_tokens("") == 0
+    assert count_tokens("Hello, world!") == 6
+    assert count_tokens("internationalization") == 5